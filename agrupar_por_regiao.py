@@ -1,5 +1,4 @@
 import pandas as pd
-from sklearn.cluster import KMeans, DBSCAN
 import numpy as np
 
 def agrupar_por_regiao(pedidos_df, metodo='kmeans', n_clusters=3, eps=0.01, min_samples=2):
@@ -28,6 +27,8 @@ def agrupar_por_regiao(pedidos_df, metodo='kmeans', n_clusters=3, eps=0.01, min_
         pedidos_df['Regiao'] = []
         return pedidos_df
 
+    from sklearn.cluster import KMeans, DBSCAN
+
     coords = pedidos_df[required_columns].values
 
     if metodo == 'kmeans':
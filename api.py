@@ -1,108 +1,295 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, g
 import os
 import io
-import folium
-import pandas as pd
-import numpy as np
-import random
-from datetime import datetime
 import logging
+import json
+import time
+from contextlib import nullcontext
 
 from geocoding import converter_enderecos
-from preprocessor import preprocessar_dados
-from optimization import run_genetic_algorithm
-from config import DATABASE_FOLDER
-
-# Configuração de logging para a API
-logging.basicConfig(level=logging.INFO, filename="api.log", filemode="a",
-                    format="%(asctime)s - %(levelname)s - %(message)s")
+from normalizacao_enderecos import montar_endereco_completo
+from armazenamento import carregar_dataset
+from exportacao import FORMATOS, exportar, gerar_csv
+from pipeline import (carregar_entradas, chave_roteirizacao, executar_roteirizacao, geocodificar_pedidos, ler_dataset,
+                      normalizar_parametros, separar_versoes)
+from datasets import obter_registro
+from tarefas import obter_fila, FilaCheia, SITUACOES_FINAIS
+from mapas import chave_mapa, mapa_html
+import metricas
+from logs import configurar_logging
+from perfilamento import perfilar, arquivos_perfil
 
 app = Flask(__name__)
 
-if not os.path.exists(DATABASE_FOLDER):
-    os.makedirs(DATABASE_FOLDER)
+# Intervalo, em segundos, entre consultas da tarefa no fluxo SSE e entre comentários de keep-alive
+INTERVALO_EVENTOS = 0.5
+INTERVALO_KEEPALIVE = 15
+
+# Planilhas aceitas pelo /upload e o conjunto de dados (Parquet) em que cada uma é guardada
+ARQUIVOS_DATASETS = {
+    "Pedidos.xlsx": "pedidos",
+    "Caminhoes.xlsx": "caminhoes",
+    "IA.xlsx": "ia",
+}
+
+def urls_perfil(identificador):
+    """
+    URLs de download dos arquivos do perfil (ver perfilamento.py), ou None se não houver perfil.
+    """
+    arquivos = arquivos_perfil(identificador)
+    return {nome: f"/perfis/{identificador}/{nome}" for nome in arquivos} or None
 
-def ler_planilha(nome_arquivo, colunas_obrigatorias):
+def ler_planilha(nome_arquivo, colunas_obrigatorias, colunas=None):
     """
-    Lê um arquivo .xlsx a partir da pasta de dados e valida as colunas obrigatórias.
+    Lê o conjunto de dados correspondente a uma planilha enviada e valida as colunas obrigatórias.
+    Se `colunas` for informado, somente essas colunas são carregadas.
     """
-    caminho = os.path.join(DATABASE_FOLDER, nome_arquivo)
-    df = pd.read_excel(caminho, engine="openpyxl")
+    if colunas is not None:
+        colunas = list(dict.fromkeys(list(colunas) + list(colunas_obrigatorias)))
+    df = carregar_dataset(ARQUIVOS_DATASETS[nome_arquivo], colunas=colunas)
     for coluna in colunas_obrigatorias:
         if coluna not in df.columns:
             logging.error(f"Coluna obrigatória '{coluna}' não encontrada em {nome_arquivo}.")
             raise ValueError(f"Coluna obrigatória '{coluna}' não encontrada em {nome_arquivo}.")
     return df
 
-def gerar_mapa(pedidos_df):
-    """
-    Gera um mapa interativo com Folium exibindo os pedidos.
-    """
-    if pedidos_df.empty:
-        return folium.Map(location=[0, 0], zoom_start=2)
-    centro = [pedidos_df.iloc[0]['Latitude'], pedidos_df.iloc[0]['Longitude']]
-    mapa = folium.Map(location=centro, zoom_start=12)
-    for _, row in pedidos_df.iterrows():
-        folium.Marker(
-            location=[row['Latitude'], row['Longitude']],
-            popup=row.get("Endereço Completo", "Sem endereço"),
-            icon=folium.Icon(color="blue")
-        ).add_to(mapa)
-    return mapa
+HTTP_REQUISICOES = metricas.contador("roteirizador_http_requisicoes_total", "Requisições atendidas pela API.",
+                                     ["endpoint", "metodo", "status"])
+HTTP_SEGUNDOS = metricas.histograma("roteirizador_http_segundos", "Duração das requisições à API.", ["endpoint"])
+
+@app.before_request
+def iniciar_cronometro():
+    # O logging é configurado na primeira requisição (as seguintes não fazem nada), não na importação
+    configurar_logging()
+    g.inicio_requisicao = time.perf_counter()
+
+@app.after_request
+def registrar_requisicao(resposta):
+    # A regra da rota (por exemplo, /jobs/<id_tarefa>) evita um rótulo por ID
+    endpoint = request.url_rule.rule if request.url_rule else "desconhecido"
+    HTTP_REQUISICOES.inc(endpoint=endpoint, metodo=request.method, status=resposta.status_code)
+    if "inicio_requisicao" in g:
+        HTTP_SEGUNDOS.observar(time.perf_counter() - g.inicio_requisicao, endpoint=endpoint)
+    return resposta
 
 # ---------- Endpoints da API REST ----------
 
+@app.route('/metrics', methods=['GET'])
+def get_metricas():
+    """
+    GET /metrics: Métricas no formato de texto do Prometheus (etapas, caches, algoritmos e requisições).
+    """
+    return Response(metricas.texto_prometheus(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/upload', methods=['POST'])
 def upload_files():
     """
-    POST /upload: Recebe os arquivos Pedidos.xlsx, Caminhoes.xlsx, IA.xlsx e os salva na pasta DATABASE_FOLDER.
+    POST /upload: Recebe os arquivos Pedidos.xlsx, Caminhoes.xlsx, IA.xlsx e os converte, em fluxo,
+    em uma nova versão de cada conjunto de dados (ver datasets.py). A resposta traz o ID das versões,
+    a ser informado nas requisições seguintes (por exemplo, /resultado?pedidos=<versão>&caminhoes=<versão>).
     """
     result = {}
-    for nome in ["Pedidos.xlsx", "Caminhoes.xlsx", "IA.xlsx"]:
+    versoes = {}
+    for nome, dataset in ARQUIVOS_DATASETS.items():
         if nome in request.files:
-            file = request.files[nome]
-            caminho = os.path.join(DATABASE_FOLDER, nome)
-            file.save(caminho)
-            result[nome] = "Arquivo enviado com sucesso"
+            def registrar_progresso(lidas, total, nome=nome):
+                logging.info(f"Ingestão de {nome}: {lidas}/{total if total else '?'} linhas lidas.")
+            try:
+                versao, resumo = obter_registro().ingerir(request.files[nome].stream, dataset,
+                                                          progresso=registrar_progresso)
+            except Exception as e:
+                logging.error(f"Erro ao importar {nome}: {e}")
+                result[nome] = f"Erro ao ler o arquivo: {e}"
+                continue
+            versoes[dataset] = versao
+            result[nome] = {
+                "status": "Arquivo enviado com sucesso",
+                "versao": versao,
+                "linhas_validas": resumo.linhas_validas,
+                "linhas_invalidas": resumo.linhas_invalidas,
+                "erros": resumo.erros,
+            }
         else:
             result[nome] = "Arquivo não enviado"
+    result["versoes"] = versoes
     return jsonify(result)
 
 @app.route('/resultado', methods=['GET'])
 def get_resultado():
     """
-    GET /resultado: Lê os arquivos de Pedidos e Caminhões, pré-processa e executa o algoritmo genético.
-    Retorna a melhor solução encontrada.
+    GET /resultado: Lê os conjuntos de Pedidos e Caminhões, pré-processa e executa o algoritmo genético.
+    Retorna a melhor solução encontrada. Para volumes grandes, prefira POST /jobs.
+    Parâmetros opcionais: geracoes, tamanho_pop, semente e as versões pedidos e caminhoes (do /upload).
+
+    A resposta leva como ETag o hash das entradas; com If-None-Match igual, retorna 304 sem recalcular.
+    Com perfilar=1, recalcula sem usar o cache e grava o perfil de tempo e memória da execução;
+    o ID do perfil vai no cabeçalho X-Perfil e os arquivos ficam em /perfis/<id>/<arquivo>.
     """
+    argumentos = request.args.to_dict()
+    perfilado = argumentos.pop("perfilar", "0") in ("1", "true")
     try:
-        pedidos_df = ler_planilha("Pedidos.xlsx", ["Endereço de Entrega", "Bairro de Entrega", "Cidade de Entrega", "Peso dos Itens"])
-        caminhoes_df = ler_planilha("Caminhoes.xlsx", ["Placa", "Capac. Kg", "Capac. Cx", "Disponível"])
-    except Exception as e:
+        parametros, versoes = separar_versoes(argumentos)
+        parametros = normalizar_parametros(parametros)
+        pedidos_df, caminhoes_df = carregar_entradas(versoes)
+        with perfilar() if perfilado else nullcontext() as sessao:
+            # A ETag cobre as coordenadas resolvidas: geocodifica uma vez, para a chave e para o cálculo
+            entradas = (geocodificar_pedidos(pedidos_df), caminhoes_df)
+            chave = chave_roteirizacao(parametros, entradas, geocodificadas=True)
+            if not perfilado and request.if_none_match.contains(chave):
+                resposta = Response(status=304)
+                resposta.set_etag(chave)
+                return resposta
+            solucao = executar_roteirizacao(parametros, entradas=entradas, usar_cache=not perfilado,
+                                            geocodificadas=True)
+    except (FileNotFoundError, ValueError) as e:
         logging.error(f"Erro na leitura dos arquivos: {e}")
         return jsonify({"error": f"Erro na leitura dos arquivos: {str(e)}"}), 400
+    resposta = jsonify(solucao)
+    resposta.set_etag(chave)
+    if perfilado:
+        identificador = os.path.basename(sessao.pasta)
+        resposta.headers["X-Perfil"] = identificador
+        if links := urls_perfil(identificador):
+            resposta.headers["Link"] = ", ".join(f'<{url}>; rel="related"' for url in links.values())
+    return resposta
+
+@app.route('/jobs', methods=['POST'])
+def criar_tarefa():
+    """
+    POST /jobs: Enfileira a roteirização (parâmetros opcionais no corpo JSON: geracoes, tamanho_pop, semente,
+    as versões pedidos e caminhoes e perfilar). Retorna 202 com o ID da tarefa; o andamento é consultado em
+    GET /jobs/<id>, que traz também as URLs do perfil quando a tarefa foi perfilada.
+    """
+    corpo = dict(request.get_json(silent=True) or {})
+    perfilado = bool(corpo.pop("perfilar", False))
+    try:
+        parametros, versoes = separar_versoes(corpo)
+        parametros = normalizar_parametros(parametros)
+        for nome, versao in versoes.items():
+            obter_registro().obter(versao, nome)
+        id_tarefa = obter_fila().submeter(parametros, versoes=versoes, perfilar=perfilado)
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({"error": str(e)}), 400
+    except FilaCheia as e:
+        return jsonify({"error": str(e)}), 429
+    return jsonify({"id": id_tarefa, "status_url": f"/jobs/{id_tarefa}"}), 202
 
-    pedidos_df["Endereço Completo"] = pedidos_df["Endereço de Entrega"] + ", " + pedidos_df["Bairro de Entrega"] + ", " + pedidos_df["Cidade de Entrega"]
-    pedidos_df = converter_enderecos(pedidos_df)
-    pedidos_df = preprocessar_dados(pedidos_df)
+@app.route('/jobs/<id_tarefa>', methods=['GET'])
+def consultar_tarefa(id_tarefa):
+    """
+    GET /jobs/<id>: Situação, progresso (0 a 1), etapa atual e, ao concluir, o resultado da tarefa.
+    """
+    tarefa = obter_fila().consultar(id_tarefa)
+    if tarefa is None:
+        return jsonify({"error": "Tarefa não encontrada."}), 404
+    tarefa["perfil"] = urls_perfil(id_tarefa)
+    return jsonify(tarefa)
+
+@app.route('/perfis/<identificador>/<arquivo>', methods=['GET'])
+def baixar_perfil(identificador, arquivo):
+    """
+    GET /perfis/<id>/<arquivo>: Baixa um arquivo do perfil (relatorio.txt ou perfil.prof).
+    """
+    caminho = arquivos_perfil(identificador).get(arquivo)
+    if caminho is None:
+        return jsonify({"error": "Perfil não encontrado."}), 404
+    mime = "text/plain; charset=utf-8" if arquivo.endswith(".txt") else "application/octet-stream"
+    return send_file(caminho, mimetype=mime, as_attachment=arquivo.endswith(".prof"), download_name=arquivo)
+
+@app.route('/jobs/<id_tarefa>', methods=['DELETE'])
+def cancelar_tarefa(id_tarefa):
+    """
+    DELETE /jobs/<id>: Cancela a tarefa, se ainda não tiver terminado.
+    """
+    if not obter_fila().cancelar(id_tarefa):
+        tarefa = obter_fila().consultar(id_tarefa)
+        if tarefa is None:
+            return jsonify({"error": "Tarefa não encontrada."}), 404
+        return jsonify({"error": f"A tarefa já terminou ({tarefa['situacao']})."}), 409
+    return jsonify(obter_fila().consultar(id_tarefa)), 202
+
+@app.route('/jobs/<id_tarefa>/eventos', methods=['GET'])
+def eventos_tarefa(id_tarefa):
+    """
+    GET /jobs/<id>/eventos: Fluxo Server-Sent Events com o progresso da tarefa.
+    Cada evento "progresso" traz a situação, o progresso (0 a 1) e o último evento dos algoritmos
+    (etapa, iteração, melhor custo, tempo decorrido); o evento "fim" encerra o fluxo.
+    """
+    fila = obter_fila()
+    if fila.consultar(id_tarefa) is None:
+        return jsonify({"error": "Tarefa não encontrada."}), 404
+
+    def gerar_eventos():
+        ultimo, ultimo_envio = None, time.monotonic()
+        while True:
+            tarefa = fila.consultar(id_tarefa)
+            estado = {"situacao": tarefa["situacao"], "progresso": tarefa["progresso"], "evento": tarefa["evento"]}
+            if estado != ultimo:
+                yield f"event: progresso\ndata: {json.dumps(estado, default=str)}\n\n"
+                ultimo, ultimo_envio = estado, time.monotonic()
+            elif time.monotonic() - ultimo_envio > INTERVALO_KEEPALIVE:
+                yield ": keep-alive\n\n"
+                ultimo_envio = time.monotonic()
+            if tarefa["situacao"] in SITUACOES_FINAIS:
+                fim = {"situacao": tarefa["situacao"], "erro": tarefa["erro"], "status_url": f"/jobs/{id_tarefa}"}
+                yield f"event: fim\ndata: {json.dumps(fim)}\n\n"
+                return
+            time.sleep(INTERVALO_EVENTOS)
 
-    solucao = run_genetic_algorithm(pedidos_df, caminhoes_df)
-    return jsonify(solucao)
+    return Response(gerar_eventos(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route('/mapa', methods=['GET'])
 def get_mapa():
     """
     GET /mapa: Gera e retorna uma página HTML com o mapa interativo dos pedidos.
+    O HTML fica em cache pelo hash dos pontos, que também é enviado como ETag.
+    Parâmetro opcional: pedidos (versão do /upload); sem ele, usa o conjunto atual.
     """
+    colunas = ["Endereço de Entrega", "Bairro de Entrega", "Cidade de Entrega"]
     try:
-        pedidos_df = ler_planilha("Pedidos.xlsx", ["Endereço de Entrega", "Bairro de Entrega", "Cidade de Entrega"])
-        pedidos_df["Endereço Completo"] = pedidos_df["Endereço de Entrega"] + ", " + pedidos_df["Bairro de Entrega"] + ", " + pedidos_df["Cidade de Entrega"]
+        versao = request.args.get("pedidos")
+        if versao:
+            pedidos_df = ler_dataset("pedidos", colunas, versao)[colunas].copy()
+        else:
+            pedidos_df = ler_planilha("Pedidos.xlsx", colunas, colunas=[])
+        pedidos_df["Endereço Completo"] = montar_endereco_completo(pedidos_df)
         pedidos_df = converter_enderecos(pedidos_df)
     except Exception as e:
         logging.error(f"Erro ao ler ou processar os pedidos: {e}")
         return jsonify({"error": f"Erro ao ler ou processar os pedidos: {str(e)}"}), 400
 
-    mapa = gerar_mapa(pedidos_df)
-    return mapa._repr_html_()
+    chave = chave_mapa(pedidos_df)
+    if request.if_none_match.contains(chave):
+        resposta = Response(status=304)
+    else:
+        resposta = Response(mapa_html(pedidos_df, chave=chave), mimetype="text/html")
+    resposta.set_etag(chave)
+    return resposta
+
+@app.route('/resultado/exportar', methods=['GET'])
+def exportar_resultado():
+    """
+    GET /resultado/exportar?formato=xlsx|csv|parquet&por_placa=1: Baixa o último resultado da roteirização.
+    O CSV é enviado em fluxo, em blocos; no Excel, por_placa=1 cria uma aba por caminhão na ordem de entrega.
+    """
+    formato = request.args.get("formato", "xlsx").lower()
+    if formato not in FORMATOS:
+        return jsonify({"error": f"Formato inválido. Use um de: {', '.join(FORMATOS)}"}), 400
+    try:
+        resultado_df = carregar_dataset("resultado")
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+
+    nome_arquivo, mime = FORMATOS[formato]
+    if formato == "csv":
+        return Response(gerar_csv(resultado_df), mimetype=mime,
+                        headers={"Content-Disposition": f"attachment; filename={nome_arquivo}"})
+    buffer = io.BytesIO()
+    exportar(resultado_df, formato, destino=buffer, por_placa=request.args.get("por_placa") == "1")
+    buffer.seek(0)
+    return send_file(buffer, mimetype=mime, as_attachment=True, download_name=nome_arquivo)
 
 if __name__ == '__main__':
+    configurar_logging()
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+Módulo de armazenamento
+
+Mantém os conjuntos de dados do sistema (pedidos, caminhões, frota, resultado da
+roteirização) em arquivos Parquet, com os tipos compactos do esquema (categorias,
+float32 e inteiros) e leitura apenas das colunas necessárias.
+
+O Excel fica restrito às bordas voltadas ao usuário: importar_excel converte uma
+planilha enviada e o módulo exportacao gera os arquivos para download.
+Se um conjunto ainda não existir em Parquet, a planilha antiga correspondente na
+pasta de dados é convertida na primeira leitura.
+"""
+
+import os
+import logging
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from config import DATABASE_FOLDER
+from esquema import aplicar_esquema
+
+PASTA_DATASETS = os.path.join(DATABASE_FOLDER, "datasets")
+
+# Planilhas usadas antes do armazenamento em Parquet, convertidas na primeira leitura
+PLANILHAS_LEGADAS = {
+    "pedidos": "Pedidos.xlsx",
+    "caminhoes": "Caminhoes.xlsx",
+    "frota": "caminhoes_frota.xlsx",
+    "resultado": "roterizacao_resultado.xlsx",
+    "ia": "IA.xlsx",
+}
+
+def caminho_dataset(nome):
+    """
+    Retorna o caminho do arquivo Parquet do conjunto de dados.
+    """
+    return os.path.join(PASTA_DATASETS, f"{nome}.parquet")
+
+
+def aplicar_tipos(df):
+    """
+    Converte as colunas para os tipos do esquema (ver esquema.py), registrando no log
+    os valores inválidos encontrados. Colunas de objetos fora do esquema são convertidas
+    para string, o que evita colunas com tipos misturados na gravação em Parquet.
+    """
+    df, erros = aplicar_esquema(df)
+    for erro in erros:
+        logging.warning(erro)
+    return df
+
+
+def salvar_dataset(nome, df):
+    """
+    Grava o conjunto de dados em Parquet, com os tipos de coluna definidos.
+    A gravação é feita em um arquivo temporário e substituída de forma atômica,
+    para que leitores simultâneos nunca vejam um arquivo incompleto.
+    """
+    os.makedirs(PASTA_DATASETS, exist_ok=True)
+    caminho = caminho_dataset(nome)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    aplicar_tipos(df).to_parquet(temporario, index=False, engine="pyarrow")
+    os.replace(temporario, caminho)
+    logging.info(f"Conjunto '{nome}' gravado com {len(df)} linhas.")
+
+
+def existe_dataset(nome):
+    """
+    Indica se o conjunto de dados existe (em Parquet ou como planilha antiga).
+    """
+    legado = PLANILHAS_LEGADAS.get(nome)
+    return os.path.exists(caminho_dataset(nome)) or (
+        legado is not None and os.path.exists(os.path.join(DATABASE_FOLDER, legado)))
+
+
+def carregar_dataset(nome, colunas=None):
+    """
+    Lê um conjunto de dados, carregando apenas as colunas pedidas.
+
+    Parâmetros:
+      nome (str): Nome do conjunto (por exemplo, "pedidos" ou "resultado").
+      colunas (list): Colunas a carregar (as inexistentes no arquivo são ignoradas); None carrega todas.
+
+    Retorna:
+      DataFrame: Dados do conjunto.
+
+    Lança:
+      FileNotFoundError: Se o conjunto não existir.
+    """
+    caminho = caminho_dataset(nome)
+    if not os.path.exists(caminho):
+        legado = PLANILHAS_LEGADAS.get(nome)
+        caminho_legado = os.path.join(DATABASE_FOLDER, legado) if legado else None
+        if caminho_legado is None or not os.path.exists(caminho_legado):
+            raise FileNotFoundError(f"Conjunto de dados '{nome}' não encontrado.")
+        logging.info(f"Convertendo a planilha {legado} para Parquet.")
+        importar_excel(nome, caminho_legado)
+    if colunas is not None:
+        existentes = set(pq.read_schema(caminho).names)
+        colunas = [coluna for coluna in colunas if coluna in existentes]
+    return pd.read_parquet(caminho, columns=colunas, engine="pyarrow")
+
+
+def importar_excel(nome, arquivo):
+    """
+    Converte uma planilha Excel (caminho ou arquivo enviado) no conjunto de dados `nome`.
+
+    Retorna:
+      DataFrame: Dados importados.
+    """
+    df = pd.read_excel(arquivo, engine="openpyxl")
+    salvar_dataset(nome, df)
+    return df
@@ -0,0 +1,457 @@
+"""
+Benchmark dos algoritmos de roteirização
+
+Gera instâncias sintéticas realistas e reprodutíveis (pela semente) e mede, para cada algoritmo,
+o tempo de execução, o pico de memória (tracemalloc, em uma execução à parte) e a qualidade da solução:
+
+- pedidos espalhados pelas cidades ao redor do ponto de partida em Cabreúva (config.py), com mais
+  pedidos nas cidades maiores, clientes com vários pedidos no mesmo endereço e pesos/caixas com
+  distribuição assimétrica (muitos pedidos pequenos, poucos grandes);
+- frota heterogênea (VUC, 3/4, toco e truck), dimensionada pelo peso total, com alguns
+  caminhões inativos.
+
+Os resultados podem ser gravados como base (--salvar-base) e comparados com ela nas execuções
+seguintes: tempo, memória ou qualidade piores que a tolerância são apontados como regressão e o
+código de saída passa a ser 1.
+
+Com --importacao, verifica o tempo de importação dos módulos usados pela API, pela linha de comando e
+pelos processos de trabalho, cada um em um interpretador novo: o tempo deve caber no orçamento,
+as dependências pesadas não podem ser carregadas e nenhum arquivo pode ser criado.
+
+Uso:
+  python benchmark.py --salvar-base
+  python benchmark.py --tamanhos 50 200 1000 --algoritmos tsp_genetico 2opt
+  python benchmark.py --importacao
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import warnings
+import importlib
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from config import endereco_partida_coords
+from instancia import RoutingInstance, distancias_haversine
+
+TAMANHOS = (50, 200, 1000, 5000, 20000)
+ARQUIVO_BASE = "benchmark_base.json"
+# Execuções de cada caso; fica o menor tempo, menos sujeito a interferências da máquina
+REPETICOES = 3
+
+# Tolerâncias relativas para apontar regressão, e diferenças absolutas abaixo das quais
+# a variação é tratada como ruído de medição
+TOLERANCIA_TEMPO = 0.25
+TOLERANCIA_MEMORIA = 0.25
+TOLERANCIA_QUALIDADE = 0.02
+RUIDO_SEGUNDOS = 0.1
+RUIDO_MB = 1.0
+
+# Cidades atendidas: (nome, latitude, longitude, dispersão em graus, participação nos pedidos)
+CIDADES = [
+    ("Cabreúva", *endereco_partida_coords, 0.03, 0.06),
+    ("Itu", -23.2636, -47.2992, 0.04, 0.12),
+    ("Salto", -23.2003, -47.2869, 0.03, 0.09),
+    ("Jundiaí", -23.1857, -46.8978, 0.05, 0.18),
+    ("Itupeva", -23.1533, -47.0578, 0.03, 0.06),
+    ("Indaiatuba", -23.0903, -47.2181, 0.04, 0.12),
+    ("Sorocaba", -23.5015, -47.4526, 0.06, 0.20),
+    ("Várzea Paulista", -23.2114, -46.8283, 0.02, 0.05),
+    ("Campo Limpo Paulista", -23.2078, -46.7889, 0.02, 0.04),
+    ("Pirapora do Bom Jesus", -23.3969, -46.9986, 0.02, 0.03),
+    ("Araçariguama", -23.4386, -47.0608, 0.02, 0.05),
+]
+BAIRROS = ["Centro", "Jardim América", "Vila Nova", "Distrito Industrial", "Jardim das Flores",
+           "Parque São Luiz", "Vila Operária", "Jardim Paulista"]
+LOGRADOUROS = ["Rua", "Avenida", "Rua", "Travessa", "Rua", "Alameda"]
+
+# Tipos de caminhão: (descrição, capacidade em kg, capacidade em caixas, participação na frota)
+TIPOS_CAMINHAO = [
+    ("VUC", 1500, 150, 0.30),
+    ("3/4", 3000, 300, 0.35),
+    ("Toco", 6000, 600, 0.25),
+    ("Truck", 12000, 1200, 0.10),
+]
+# Capacidade total da frota em relação ao peso total dos pedidos e fração de caminhões inativos
+FOLGA_FROTA = 1.2
+FRACAO_INATIVOS = 0.1
+
+# Orçamento de importação (s) de cada módulo em um interpretador novo; inclui numpy e pandas,
+# que todos carregam (cerca de 0,4 s)
+ORCAMENTO_IMPORTACAO = {
+    "config": 0.1,
+    "geocoding": 0.3,
+    "tarefas": 0.3,
+    "optimization": 0.8,
+    "roteamento": 0.8,
+    "ia_analise_pedidos": 0.8,
+    "melhorias_roterizacao": 0.8,
+    "mapas": 0.8,
+    "pipeline": 0.8,
+    "roteirizador": 0.8,
+    "api": 1.0,
+}
+# Dependências carregadas apenas no primeiro uso, nunca na importação desses módulos
+IMPORTACOES_ADIADAS = ("streamlit", "sklearn", "networkx", "folium", "geopy", "requests", "openpyxl")
+
+# Cada caso: função que executa o algoritmo, módulos que ela importa, inclusive os carregados só no
+# primeiro uso (importados antes da medição),
+# maior tamanho executado, métrica de qualidade e se valores maiores são melhores
+Caso = namedtuple("Caso", ["executar", "modulos", "limite", "metrica", "maior_melhor"])
+
+
+def gerar_instancia(num_pedidos, semente=0):
+    """
+    Gera pedidos e frota sintéticos, reprodutíveis pela semente.
+
+    Parâmetros:
+      num_pedidos (int): Quantidade de pedidos.
+      semente (int): Semente do gerador aleatório.
+
+    Retorna:
+      tuple: (pedidos_df, caminhoes_df), com as colunas das planilhas de pedidos e de frota
+             e os pedidos já geocodificados ('Latitude', 'Longitude', 'Endereço Completo').
+    """
+    rng = np.random.default_rng(semente)
+    nomes, lat_cidades, lon_cidades, dispersoes, participacoes = map(np.array, zip(*CIDADES))
+    participacoes = participacoes.astype(float) / participacoes.astype(float).sum()
+
+    # Clientes: cerca de um para cada 1,5 pedido, cada um com endereço e coordenadas fixos
+    num_clientes = max(1, int(num_pedidos / 1.5))
+    cidades = rng.choice(len(nomes), size=num_clientes, p=participacoes)
+    lat_clientes = lat_cidades.astype(float)[cidades] + rng.normal(0, 1, num_clientes) * dispersoes.astype(float)[cidades]
+    lon_clientes = lon_cidades.astype(float)[cidades] + rng.normal(0, 1, num_clientes) * dispersoes.astype(float)[cidades]
+    logradouros = rng.choice(LOGRADOUROS, size=num_clientes)
+    ruas = rng.integers(1, 400, size=num_clientes)
+    numeros = rng.integers(1, 3000, size=num_clientes)
+    bairros = rng.choice(BAIRROS, size=num_clientes)
+    enderecos = [f"{logradouro} {rua}, {numero}" for logradouro, rua, numero in zip(logradouros, ruas, numeros)]
+
+    # Alguns clientes concentram vários pedidos (distribuição de Zipf truncada)
+    pesos_clientes = 1.0 / np.arange(1, num_clientes + 1) ** 0.6
+    clientes = rng.choice(num_clientes, size=num_pedidos, p=pesos_clientes / pesos_clientes.sum())
+
+    # Peso log-normal (mediana ~120 kg) e caixas proporcionais ao peso, com variação
+    peso = np.clip(rng.lognormal(np.log(120), 0.9, num_pedidos), 2, 1400).round(1)
+    caixas = np.maximum(1, np.round(peso / rng.uniform(5, 15, num_pedidos))).astype(int)
+
+    enderecos_pedidos = np.asarray(enderecos, dtype=object)[clientes]
+    bairros_pedidos = bairros[clientes]
+    cidades_pedidos = nomes[cidades[clientes]]
+    pedidos_df = pd.DataFrame({
+        "Nº Pedido": np.arange(1, num_pedidos + 1),
+        "Cód. Cliente": clientes + 1,
+        "Nome Cliente": [f"Cliente {c + 1}" for c in clientes],
+        "Endereço de Entrega": enderecos_pedidos,
+        "Bairro de Entrega": bairros_pedidos,
+        "Cidade de Entrega": cidades_pedidos,
+        "Qtde. dos Itens": caixas,
+        "Peso dos Itens": peso,
+        "Latitude": lat_clientes[clientes].round(6),
+        "Longitude": lon_clientes[clientes].round(6),
+    })
+    pedidos_df["Endereço Completo"] = (pedidos_df["Endereço de Entrega"] + ", " + pedidos_df["Bairro de Entrega"]
+                                       + ", " + pedidos_df["Cidade de Entrega"])
+
+    descricoes, capacidades_kg, capacidades_cx, fracoes = zip(*TIPOS_CAMINHAO)
+    fracoes = np.array(fracoes) / sum(fracoes)
+    capacidade_media = float(np.dot(fracoes, capacidades_kg))
+    num_caminhoes = max(2, int(np.ceil(peso.sum() * FOLGA_FROTA / capacidade_media / (1 - FRACAO_INATIVOS))))
+    tipos = rng.choice(len(descricoes), size=num_caminhoes, p=fracoes)
+    caminhoes_df = pd.DataFrame({
+        "Placa": [f"{''.join(rng.choice(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'), 3))}{rng.integers(1000, 9999)}"
+                  for _ in range(num_caminhoes)],
+        "Transportador": [f"Transportadora {t + 1}" for t in rng.integers(0, max(1, num_caminhoes // 5), num_caminhoes)],
+        "Descrição Veículo": np.array(descricoes)[tipos],
+        "Capac. Cx": np.array(capacidades_cx, dtype=float)[tipos],
+        "Capac. Kg": np.array(capacidades_kg, dtype=float)[tipos],
+        "Disponível": np.where(rng.random(num_caminhoes) < FRACAO_INATIVOS, "Inativo", "Ativo"),
+    })
+    return pedidos_df, caminhoes_df
+
+
+def _distancia_rota_km(rota, distancias):
+    rota = np.asarray(rota)
+    return float(distancias[rota, np.roll(rota, -1)].sum()) / 1000
+
+
+# Cada caso recebe (pedidos_df, caminhoes_df, semente) e retorna o valor da métrica de qualidade
+
+def _algoritmo_genetico(pedidos_df, caminhoes_df, semente):
+    from optimization import run_genetic_algorithm
+
+    caminhoes_df = caminhoes_df[caminhoes_df["Disponível"] == "Ativo"]
+    return run_genetic_algorithm(RoutingInstance.de_dataframes(pedidos_df, caminhoes_df), semente=semente)["fitness"]
+
+
+def _tsp_genetico(pedidos_df, caminhoes_df, semente):
+    from ia_analise_pedidos import resolver_tsp_genetico
+
+    return resolver_tsp_genetico(RoutingInstance.de_dataframes(pedidos_df))[1] / 1000
+
+
+def _2opt(pedidos_df, caminhoes_df, semente):
+    from melhorias_roterizacao import otimizacao_2opt
+
+    # A partir da rota na ordem dos endereços (ponto de partida primeiro), em km como no módulo
+    distancias = RoutingInstance.de_dataframes(pedidos_df).matriz_distancias()
+    rota = otimizacao_2opt(list(range(len(distancias))), (distancias / 1000).tolist())
+    return _distancia_rota_km(rota, distancias)
+
+
+def _vrp(pedidos_df, caminhoes_df, semente):
+    from ia_analise_pedidos import resolver_vrp
+
+    instancia = RoutingInstance.de_dataframes(pedidos_df, caminhoes_df[caminhoes_df["Disponível"] == "Ativo"])
+    rotas = resolver_vrp(instancia)
+    if isinstance(rotas, str):
+        raise RuntimeError(rotas)
+    no = {nome: posicao for posicao, nome in enumerate(instancia.nos_rota())}
+    distancias = instancia.matriz_distancias()
+    return sum(_distancia_rota_km([0] + [no[nome] for nome in rota], distancias) for rota in rotas.values() if rota)
+
+
+def _distancia_ao_centro_km(agrupados):
+    # Distância média (km) de cada pedido ao centro da sua região
+    agrupados = agrupados.dropna(subset=["Regiao"])
+    centros = agrupados.groupby("Regiao")[["Latitude", "Longitude"]].transform("mean")
+    return float(distancias_haversine(agrupados["Latitude"], agrupados["Longitude"],
+                                      centros["Latitude"], centros["Longitude"]).mean()) / 1000
+
+
+def _agrupamento(pedidos_df, caminhoes_df, semente):
+    from ia_analise_pedidos import agrupar_por_regiao
+
+    return _distancia_ao_centro_km(agrupar_por_regiao(pedidos_df.copy(), metodo="kmeans", n_clusters=3))
+
+
+def _agrupamento_melhorias(pedidos_df, caminhoes_df, semente):
+    from melhorias_roterizacao import agrupar_por_regiao
+
+    return _distancia_ao_centro_km(agrupar_por_regiao(pedidos_df.copy(), metodo="kmeans", n_clusters=3))
+
+
+def _alocacao(pedidos_df, caminhoes_df, semente):
+    from ia_analise_pedidos import otimizar_aproveitamento_frota
+
+    # Fração dos pedidos alocados a algum caminhão
+    alocados = otimizar_aproveitamento_frota(pedidos_df.copy(), caminhoes_df, 100, 12, 3)
+    return float((alocados["Carga"] > 0).mean())
+
+
+CASOS = {
+    "algoritmo_genetico": Caso(_algoritmo_genetico, ["optimization"], 20000, "fitness", True),
+    "tsp_genetico": Caso(_tsp_genetico, ["ia_analise_pedidos"], 1000, "distância (km)", False),
+    "2opt": Caso(_2opt, ["melhorias_roterizacao"], 200, "distância (km)", False),
+    "vrp": Caso(_vrp, ["ia_analise_pedidos", "ortools.constraint_solver.pywrapcp"], 1000, "distância (km)", False),
+    "agrupamento": Caso(_agrupamento, ["ia_analise_pedidos", "sklearn.cluster"], 20000,
+                        "distância ao centro (km)", False),
+    "agrupamento_melhorias": Caso(_agrupamento_melhorias, ["melhorias_roterizacao", "sklearn.cluster"], 20000,
+                                  "distância ao centro (km)", False),
+    "alocacao": Caso(_alocacao, ["ia_analise_pedidos", "sklearn.cluster"], 20000, "pedidos alocados", True),
+}
+
+
+def _executar_caso(caso, pedidos_df, caminhoes_df, semente):
+    random.seed(semente)
+    np.random.seed(semente)
+    return caso.executar(pedidos_df, caminhoes_df, semente)
+
+
+def medir(nome, pedidos_df, caminhoes_df, semente=0, repeticoes=1):
+    """
+    Executa um caso e mede tempo, pico de memória e qualidade.
+
+    O tempo é o menor de `repeticoes` execuções sem tracemalloc (que torna as alocações
+    várias vezes mais lentas); o pico de memória vem de uma execução rastreada à parte.
+
+    Retorna:
+      dict: algoritmo, pedidos, segundos, memoria_mb, qualidade, metrica e maior_melhor
+            (ou "erro", se o algoritmo falhar ou não estiver disponível).
+    """
+    caso = CASOS[nome]
+    resultado = {"algoritmo": nome, "pedidos": len(pedidos_df), "metrica": caso.metrica,
+                 "maior_melhor": caso.maior_melhor}
+    for modulo in caso.modulos:
+        try:
+            importlib.import_module(modulo)
+        except ImportError:
+            # Dependência opcional ausente: o próprio caso relata o erro
+            pass
+    tempos = []
+    try:
+        for _ in range(max(repeticoes, 1)):
+            inicio = time.perf_counter()
+            qualidade = _executar_caso(caso, pedidos_df, caminhoes_df, semente)
+            tempos.append(time.perf_counter() - inicio)
+        tracemalloc.start()
+        try:
+            _executar_caso(caso, pedidos_df, caminhoes_df, semente)
+            pico = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    except Exception as e:
+        resultado["erro"] = str(e)
+        return resultado
+    resultado.update(segundos=round(min(tempos), 4), memoria_mb=round(pico / 1e6, 2), qualidade=round(float(qualidade), 4))
+    return resultado
+
+
+def executar(tamanhos=TAMANHOS, algoritmos=tuple(CASOS), semente=0, repeticoes=REPETICOES, saida=sys.stdout):
+    """
+    Executa os casos em cada tamanho (até o limite de cada algoritmo); o tempo é o menor das
+    `repeticoes` execuções de cada caso (ver medir).
+
+    Retorna:
+      list: Resultados de medir, um por algoritmo e tamanho.
+    """
+    resultados = []
+    for tamanho in tamanhos:
+        pedidos_df, caminhoes_df = gerar_instancia(tamanho, semente)
+        for nome in algoritmos:
+            if tamanho > CASOS[nome].limite:
+                continue
+            resultado = medir(nome, pedidos_df, caminhoes_df, semente, repeticoes)
+            resultados.append(resultado)
+            if saida:
+                print(_linha(resultado), file=saida, flush=True)
+    return resultados
+
+
+def comparar(resultados, base, tolerancia_tempo=TOLERANCIA_TEMPO, tolerancia_memoria=TOLERANCIA_MEMORIA,
+             tolerancia_qualidade=TOLERANCIA_QUALIDADE):
+    """
+    Compara os resultados com a base (mesmo algoritmo e tamanho).
+
+    Retorna:
+      list: Descrições das regressões encontradas (vazia se não houver).
+    """
+    anteriores = {(r["algoritmo"], r["pedidos"]): r for r in base if "erro" not in r}
+    regressoes = []
+    for atual in resultados:
+        anterior = anteriores.get((atual["algoritmo"], atual["pedidos"]))
+        if anterior is None:
+            continue
+        caso = f"{atual['algoritmo']} ({atual['pedidos']} pedidos)"
+        if "erro" in atual:
+            regressoes.append(f"{caso}: falhou ({atual['erro']})")
+            continue
+        if (atual["segundos"] > anterior["segundos"] * (1 + tolerancia_tempo)
+                and atual["segundos"] - anterior["segundos"] > RUIDO_SEGUNDOS):
+            regressoes.append(f"{caso}: tempo {anterior['segundos']:.3f} s -> {atual['segundos']:.3f} s")
+        if (atual["memoria_mb"] > anterior["memoria_mb"] * (1 + tolerancia_memoria)
+                and atual["memoria_mb"] - anterior["memoria_mb"] > RUIDO_MB):
+            regressoes.append(f"{caso}: memória {anterior['memoria_mb']:.1f} MB -> {atual['memoria_mb']:.1f} MB")
+        variacao = (atual["qualidade"] - anterior["qualidade"]) / max(abs(anterior["qualidade"]), 1e-9)
+        if (-variacao if atual["maior_melhor"] else variacao) > tolerancia_qualidade:
+            regressoes.append(f"{caso}: {atual['metrica']} {anterior['qualidade']:g} -> {atual['qualidade']:g}")
+    return regressoes
+
+
+def medir_importacao(modulo):
+    """
+    Importa o módulo em um interpretador novo, em um diretório vazio.
+
+    Retorna:
+      dict: modulo, segundos, adiadas (dependências pesadas carregadas) e arquivos (criados no diretório).
+    """
+    script = (f"import sys, time, json; inicio = time.perf_counter(); import {modulo}; "
+              f"print(json.dumps([time.perf_counter() - inicio, "
+              f"[m for m in {list(IMPORTACOES_ADIADAS)!r} if m in sys.modules]]))")
+    ambiente = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                                         os.environ.get("PYTHONPATH")])))
+    with tempfile.TemporaryDirectory() as pasta:
+        saida = subprocess.run([sys.executable, "-c", script], cwd=pasta, env=ambiente, capture_output=True,
+                               text=True, check=True).stdout
+        arquivos = sorted(os.listdir(pasta))
+    segundos, adiadas = json.loads(saida.strip().splitlines()[-1])
+    return {"modulo": modulo, "segundos": round(segundos, 3), "adiadas": adiadas, "arquivos": arquivos}
+
+
+def verificar_importacao(orcamento=ORCAMENTO_IMPORTACAO, saida=sys.stdout):
+    """
+    Verifica o tempo de importação e a ausência de efeitos colaterais de cada módulo do orçamento.
+
+    Retorna:
+      list: Descrições dos problemas encontrados (vazia se não houver).
+    """
+    problemas = []
+    for modulo, limite in orcamento.items():
+        medicao = medir_importacao(modulo)
+        if saida:
+            print(f"{modulo:<22} {medicao['segundos']:8.3f} s (orçamento {limite:.1f} s)", file=saida, flush=True)
+        if medicao["segundos"] > limite:
+            problemas.append(f"{modulo}: importação em {medicao['segundos']:.3f} s, acima de {limite:.1f} s")
+        if medicao["adiadas"]:
+            problemas.append(f"{modulo}: carrega na importação {', '.join(medicao['adiadas'])}")
+        if medicao["arquivos"]:
+            problemas.append(f"{modulo}: cria na importação {', '.join(medicao['arquivos'])}")
+    return problemas
+
+
+def _linha(resultado):
+    caso = f"{resultado['algoritmo']:<20} {resultado['pedidos']:>6}"
+    if "erro" in resultado:
+        return f"{caso}  erro: {resultado['erro']}"
+    return (f"{caso} {resultado['segundos']:10.3f} s {resultado['memoria_mb']:10.2f} MB"
+            f"  {resultado['metrica']} = {resultado['qualidade']:g}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dos algoritmos de roteirização com instâncias sintéticas.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=list(TAMANHOS), help="Quantidades de pedidos.")
+    parser.add_argument("--algoritmos", nargs="+", choices=list(CASOS), default=list(CASOS))
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES, help="Execuções por caso (fica o menor tempo).")
+    parser.add_argument("--base", default=ARQUIVO_BASE, help="Arquivo da base de comparação (padrão: %(default)s).")
+    parser.add_argument("--salvar-base", action="store_true", help="Grava os resultados como nova base.")
+    parser.add_argument("--tolerancia-tempo", type=float, default=TOLERANCIA_TEMPO)
+    parser.add_argument("--tolerancia-memoria", type=float, default=TOLERANCIA_MEMORIA)
+    parser.add_argument("--tolerancia-qualidade", type=float, default=TOLERANCIA_QUALIDADE)
+    parser.add_argument("--importacao", action="store_true",
+                        help="Verifica apenas o orçamento de importação dos módulos.")
+    argumentos = parser.parse_args(argv)
+
+    if argumentos.importacao:
+        problemas = verificar_importacao()
+        for problema in problemas:
+            print(f"REGRESSÃO {problema}")
+        if not problemas:
+            print("Importações dentro do orçamento.")
+        return 1 if problemas else 0
+    # Cidades pequenas têm menos endereços distintos que regiões pedidas ao K-Means
+    warnings.filterwarnings("ignore", message="Number of distinct clusters")
+
+    resultados = executar(argumentos.tamanhos, argumentos.algoritmos, argumentos.semente, argumentos.repeticoes)
+    if argumentos.salvar_base:
+        with open(argumentos.base, "w", encoding="utf-8") as arquivo:
+            json.dump(resultados, arquivo, ensure_ascii=False, indent=2)
+        print(f"Base gravada em {argumentos.base}.")
+        return 0
+
+    try:
+        with open(argumentos.base, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+    except FileNotFoundError:
+        print(f"Sem base em {argumentos.base}; use --salvar-base para criá-la.")
+        return 0
+    regressoes = comparar(resultados, base, argumentos.tolerancia_tempo, argumentos.tolerancia_memoria,
+                          argumentos.tolerancia_qualidade)
+    for regressao in regressoes:
+        print(f"REGRESSÃO {regressao}")
+    if not regressoes:
+        print("Nenhuma regressão em relação à base.")
+    return 1 if regressoes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,350 @@
+"""
+Módulo de cache de geocodificação
+
+Guarda as coordenadas já obtidas em um banco SQLite (modo WAL), com consultas
+indexadas, buscas em lote e inserções apenas de resultados novos.
+Os endereços são indexados pela chave canônica de normalizacao_enderecos, de modo
+que variações de escrita do mesmo endereço compartilham a mesma entrada.
+Na frente do banco fica uma camada em memória (LRU) de tamanho configurável.
+
+Cada entrada registra o provedor e a confiança do resultado e tem validade (TTL).
+Falhas também são registradas (cache negativo), com validade mais curta, para que
+um endereço inválido custe uma consulta por período e não uma por execução.
+
+Substitui os antigos caches em planilha (coordenadas_cache.xlsx e
+coordenadas_salvas.xlsx), que são migrados uma única vez na primeira abertura.
+"""
+
+import os
+import math
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+
+from config import (DATABASE_FOLDER, GEOCODE_DB, GEOCODE_CACHE_MEMORIA,
+                    GEOCODE_TTL_POSITIVO_DIAS, GEOCODE_TTL_NEGATIVO_DIAS)
+from normalizacao_enderecos import normalizar_endereco, chave_endereco
+
+PLANILHAS_LEGADAS = ["coordenadas_cache.xlsx", "coordenadas_salvas.xlsx"]
+
+# O SQLite limita a quantidade de parâmetros por instrução; as consultas IN são fatiadas.
+TAMANHO_LOTE_SQL = 900
+
+SEGUNDOS_POR_DIA = 86400
+
+# Resultado de geocodificação; latitude/longitude None indicam falha (entrada negativa).
+Geocodigo = namedtuple("Geocodigo", ["latitude", "longitude", "provedor", "confianca"])
+
+
+def _coordenadas_validas(coords):
+    """
+    Indica se coords é um par (latitude, longitude) numérico e finito.
+    """
+    if not coords or len(coords) != 2:
+        return False
+    try:
+        return all(v is not None and math.isfinite(float(v)) for v in coords)
+    except (TypeError, ValueError):
+        return False
+
+
+def _validade(geocodigo, agora):
+    """
+    Calcula o instante de expiração da entrada conforme seja um acerto ou uma falha.
+    Aproximações pelo centroide da cidade valem como falha, para serem refeitas mais cedo.
+    """
+    if geocodigo.latitude is None or geocodigo.provedor == "centroide_cidade":
+        return agora + GEOCODE_TTL_NEGATIVO_DIAS * SEGUNDOS_POR_DIA
+    return agora + GEOCODE_TTL_POSITIVO_DIAS * SEGUNDOS_POR_DIA
+
+
+class CacheGeocodificacao:
+    """
+    Cache persistente de resultados de geocodificação por endereço.
+
+    Cada thread usa a sua própria conexão SQLite; a camada em memória é
+    compartilhada e protegida por uma trava.
+    """
+
+    def __init__(self, caminho=GEOCODE_DB, tamanho_memoria=GEOCODE_CACHE_MEMORIA):
+        self.caminho = caminho
+        self.tamanho_memoria = tamanho_memoria
+        self._memoria = OrderedDict()
+        self._trava = threading.Lock()
+        self._local = threading.local()
+        self._criar_esquema()
+        self._migrar_planilhas()
+
+    # ---------- Conexão e esquema ----------
+
+    def conexao(self):
+        """
+        Retorna a conexão SQLite da thread atual (aberta na primeira chamada).
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            pasta = os.path.dirname(self.caminho)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            conn = sqlite3.connect(self.caminho, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _criar_esquema(self):
+        conn = self.conexao()
+        colunas = [linha[1] for linha in conn.execute("PRAGMA table_info(geocodigos)")]
+        with conn:
+            if colunas and "chave" not in colunas:
+                # Tabela da primeira versão, indexada pelo texto bruto do endereço
+                conn.execute("ALTER TABLE geocodigos RENAME TO geocodigos_bruto")
+            elif colunas and "provedor" not in colunas:
+                # Tabela sem provedor/validade e com coordenadas obrigatórias
+                conn.execute("ALTER TABLE geocodigos RENAME TO geocodigos_sem_validade")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS geocodigos (
+                    chave TEXT PRIMARY KEY,
+                    endereco TEXT NOT NULL,
+                    latitude REAL,
+                    longitude REAL,
+                    provedor TEXT NOT NULL,
+                    confianca INTEGER,
+                    criado_em REAL NOT NULL,
+                    expira_em REAL NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_geocodigos_expira_em ON geocodigos (expira_em)")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS migracoes (
+                    nome TEXT PRIMARY KEY,
+                    executada_em REAL NOT NULL
+                )
+            ''')
+            if colunas and "chave" in colunas and "provedor" not in colunas:
+                conn.execute('''
+                    INSERT OR IGNORE INTO geocodigos
+                        (chave, endereco, latitude, longitude, provedor, confianca, criado_em, expira_em)
+                    SELECT chave, endereco, latitude, longitude, 'legado', NULL, criado_em, ?
+                    FROM geocodigos_sem_validade
+                ''', (time.time() + GEOCODE_TTL_POSITIVO_DIAS * SEGUNDOS_POR_DIA,))
+                conn.execute("DROP TABLE geocodigos_sem_validade")
+
+    def _migrar_planilhas(self):
+        """
+        Importa, uma única vez, as planilhas de cache usadas nas versões anteriores
+        e as entradas gravadas com o texto bruto do endereço como chave.
+        """
+        conn = self.conexao()
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'geocodigos_bruto'").fetchone():
+            linhas = conn.execute("SELECT endereco, latitude, longitude FROM geocodigos_bruto").fetchall()
+            self.salvar_lote({endereco: (lat, lon) for endereco, lat, lon in linhas}, provedor="legado")
+            with conn:
+                conn.execute("DROP TABLE geocodigos_bruto")
+            logging.info(f"Cache de geocodificação reindexado por chave canônica: {len(linhas)} endereços.")
+        for nome in PLANILHAS_LEGADAS:
+            if conn.execute("SELECT 1 FROM migracoes WHERE nome = ?", (nome,)).fetchone():
+                continue
+            caminho = os.path.join(DATABASE_FOLDER, nome)
+            if os.path.exists(caminho):
+                try:
+                    import pandas as pd
+                    df = pd.read_excel(caminho, engine="openpyxl")
+                    coordenadas = dict(zip(df['Endereço'], zip(df['Latitude'], df['Longitude'])))
+                    inseridos = self.salvar_lote(coordenadas, provedor="legado")
+                    logging.info(f"Migração de {nome}: {inseridos} endereços importados.")
+                except Exception as e:
+                    logging.error(f"Erro ao migrar o cache {nome}: {e}")
+                    continue
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO migracoes (nome, executada_em) VALUES (?, ?)",
+                             (nome, time.time()))
+
+    # ---------- Camada em memória ----------
+
+    def _lembrar(self, chave, geocodigo, expira_em):
+        if self.tamanho_memoria <= 0:
+            return
+        with self._trava:
+            self._memoria[chave] = (geocodigo, expira_em)
+            self._memoria.move_to_end(chave)
+            while len(self._memoria) > self.tamanho_memoria:
+                self._memoria.popitem(last=False)
+
+    def _da_memoria(self, chave, agora):
+        with self._trava:
+            entrada = self._memoria.get(chave)
+            if entrada is None:
+                return None
+            if entrada[1] <= agora:
+                del self._memoria[chave]
+                return None
+            self._memoria.move_to_end(chave)
+            return entrada[0]
+
+    # ---------- Consultas ----------
+
+    def consultar_lote(self, enderecos):
+        """
+        Busca vários endereços de uma vez (consultas IN fatiadas), ignorando entradas expiradas.
+        Variações de escrita de um mesmo endereço são resolvidas pela chave canônica.
+
+        Retorna:
+          dict: endereço (como informado) -> Geocodigo, incluindo falhas ainda válidas
+                (com latitude e longitude None).
+        """
+        agora = time.time()
+        encontrados = {}
+        faltantes = {}
+        for endereco in dict.fromkeys(enderecos):
+            chave = chave_endereco(endereco)
+            geocodigo = self._da_memoria(chave, agora)
+            if geocodigo is not None:
+                encontrados[endereco] = geocodigo
+            else:
+                faltantes.setdefault(chave, []).append(endereco)
+
+        conn = self.conexao()
+        chaves = list(faltantes)
+        for inicio in range(0, len(chaves), TAMANHO_LOTE_SQL):
+            fatia = chaves[inicio:inicio + TAMANHO_LOTE_SQL]
+            marcadores = ",".join("?" * len(fatia))
+            linhas = conn.execute(
+                f"SELECT chave, latitude, longitude, provedor, confianca, expira_em FROM geocodigos "
+                f"WHERE chave IN ({marcadores}) AND expira_em > ?",
+                fatia + [agora]
+            ).fetchall()
+            for chave, lat, lon, provedor, confianca, expira_em in linhas:
+                geocodigo = Geocodigo(lat, lon, provedor, confianca)
+                self._lembrar(chave, geocodigo, expira_em)
+                for endereco in faltantes[chave]:
+                    encontrados[endereco] = geocodigo
+        return encontrados
+
+    def buscar(self, endereco):
+        """
+        Retorna (latitude, longitude) do endereço ou None se não estiver no cache
+        (ou se a entrada válida for uma falha registrada).
+        """
+        return self.buscar_lote([endereco]).get(endereco)
+
+    def buscar_lote(self, enderecos):
+        """
+        Busca vários endereços de uma vez.
+
+        Retorna:
+          dict: endereço (como informado) -> (latitude, longitude), somente para os encontrados.
+        """
+        return {
+            endereco: (geocodigo.latitude, geocodigo.longitude)
+            for endereco, geocodigo in self.consultar_lote(enderecos).items()
+            if geocodigo.latitude is not None
+        }
+
+    # ---------- Inserções ----------
+
+    def registrar_lote(self, resultados):
+        """
+        Grava de uma vez (em uma única transação) resultados de geocodificação, inclusive falhas.
+        Entradas ainda válidas não são reescritas; somente as expiradas são substituídas.
+
+        Parâmetros:
+          resultados (dict): endereço -> Geocodigo.
+
+        Retorna:
+          int: Quantidade de entradas gravadas.
+        """
+        agora = time.time()
+        registros = []
+        for endereco, geocodigo in resultados.items():
+            if not endereco:
+                continue
+            if not _coordenadas_validas((geocodigo.latitude, geocodigo.longitude)):
+                geocodigo = geocodigo._replace(latitude=None, longitude=None)
+            else:
+                geocodigo = geocodigo._replace(latitude=float(geocodigo.latitude),
+                                               longitude=float(geocodigo.longitude))
+            registros.append((chave_endereco(endereco), normalizar_endereco(endereco), geocodigo.latitude,
+                              geocodigo.longitude, geocodigo.provedor, geocodigo.confianca, agora,
+                              _validade(geocodigo, agora)))
+        if not registros:
+            return 0
+        conn = self.conexao()
+        with conn:
+            antes = conn.total_changes
+            conn.executemany('''
+                INSERT INTO geocodigos
+                    (chave, endereco, latitude, longitude, provedor, confianca, criado_em, expira_em)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (chave) DO UPDATE SET
+                    latitude = excluded.latitude, longitude = excluded.longitude,
+                    provedor = excluded.provedor, confianca = excluded.confianca,
+                    criado_em = excluded.criado_em, expira_em = excluded.expira_em
+                WHERE geocodigos.expira_em <= excluded.criado_em
+            ''', registros)
+            gravados = conn.total_changes - antes
+        with self._trava:
+            for registro in registros:
+                self._memoria.pop(registro[0], None)
+        return gravados
+
+    def invalidar_provedores(self, provedores):
+        """
+        Remove do cache as entradas produzidas pelos provedores informados
+        (por exemplo, ao importar uma nova fonte que pode resolvê-las melhor).
+
+        Retorna:
+          int: Quantidade de entradas removidas.
+        """
+        provedores = list(provedores)
+        conn = self.conexao()
+        with conn:
+            removidas = conn.execute(
+                f"DELETE FROM geocodigos WHERE provedor IN ({','.join('?' * len(provedores))})", provedores
+            ).rowcount
+        with self._trava:
+            self._memoria.clear()
+        return removidas
+
+    def salvar(self, endereco, coords, provedor="desconhecido", confianca=None):
+        """
+        Registra as coordenadas de um endereço, se ainda não existirem no cache.
+        """
+        return self.salvar_lote({endereco: coords}, provedor=provedor, confianca=confianca)
+
+    def salvar_lote(self, coordenadas, provedor="desconhecido", confianca=None):
+        """
+        Registra coordenadas obtidas fora da cadeia de provedores (planilhas, edição manual).
+        Coordenadas inválidas (None ou NaN) são ignoradas; entradas válidas existentes não são reescritas.
+
+        Parâmetros:
+          coordenadas (dict): endereço -> (latitude, longitude).
+          provedor (str): Origem das coordenadas.
+          confianca (int): Confiança atribuída (0 a 10), se conhecida.
+
+        Retorna:
+          int: Quantidade de endereços gravados.
+        """
+        return self.registrar_lote({
+            endereco: Geocodigo(coords[0], coords[1], provedor, confianca)
+            for endereco, coords in coordenadas.items()
+            if _coordenadas_validas(coords)
+        })
+
+
+_cache_global = None
+_trava_global = threading.Lock()
+
+
+def obter_cache():
+    """
+    Retorna a instância compartilhada do cache de geocodificação do processo.
+    """
+    global _cache_global
+    if _cache_global is None:
+        with _trava_global:
+            if _cache_global is None:
+                _cache_global = CacheGeocodificacao()
+    return _cache_global
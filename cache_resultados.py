@@ -0,0 +1,145 @@
+"""
+Módulo de cache de resultados da roteirização
+
+Guarda as soluções calculadas em disco, endereçadas pelo hash das entradas normalizadas
+(pedidos já geocodificados, frota e parâmetros do algoritmo, incluindo a semente): as mesmas
+entradas produzem a mesma chave, que a API também expõe como ETag.
+
+Nenhuma entrada precisa ser invalidada: um novo /upload gera uma nova versão do conjunto
+(datasets.py), e qualquer mudança no conteúdo lido, inclusive nas coordenadas, muda o hash.
+O cache é um LRU limitado em tamanho (RESULTADOS_CACHE_MAX_MB): cada resultado é um arquivo
+JSON cujo horário de modificação é renovado a cada leitura, e os menos usados recentemente
+são removidos quando o limite é ultrapassado.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+
+import pandas as pd
+
+from config import RESULTADOS_CACHE_DIR, RESULTADOS_CACHE_MAX_MB
+from metricas import registrar_cache
+
+# Colunas que influenciam a solução; as demais não entram no hash
+COLUNAS_HASH_PEDIDOS = ["Endereço de Entrega", "Bairro de Entrega", "Cidade de Entrega",
+                        "Peso dos Itens", "Qtde. dos Itens", "Latitude", "Longitude"]
+COLUNAS_HASH_CAMINHOES = ["Placa", "Capac. Kg", "Capac. Cx", "Disponível"]
+
+# Versão do formato das entradas/resultados; alterá-la invalida as chaves antigas
+VERSAO = 1
+
+
+def _hash_dataframe(hasher, df, colunas):
+    presentes = [coluna for coluna in colunas if coluna in df.columns]
+    hasher.update(json.dumps([presentes, [str(df[c].dtype) for c in presentes], len(df)]).encode())
+    if presentes and len(df):
+        hasher.update(pd.util.hash_pandas_object(df[presentes], index=True).to_numpy().tobytes())
+
+
+def hash_entradas(pedidos_df, caminhoes_df, parametros):
+    """
+    Hash (hex) das entradas da roteirização: colunas relevantes de pedidos e caminhões,
+    na ordem das linhas, e os parâmetros do algoritmo.
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    hasher.update(f"v{VERSAO}".encode())
+    _hash_dataframe(hasher, pedidos_df, COLUNAS_HASH_PEDIDOS)
+    _hash_dataframe(hasher, caminhoes_df, COLUNAS_HASH_CAMINHOES)
+    hasher.update(json.dumps(parametros, sort_keys=True, default=str).encode())
+    return hasher.hexdigest()
+
+
+class CacheResultados:
+    """
+    Cache LRU de resultados em disco, limitado em tamanho.
+    """
+
+    def __init__(self, pasta=RESULTADOS_CACHE_DIR, max_bytes=int(RESULTADOS_CACHE_MAX_MB * 1e6), nome="resultados"):
+        self.pasta = pasta
+        self.nome = nome
+        self.max_bytes = max_bytes
+        self._trava = threading.Lock()
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, f"{chave}.json")
+
+    def obter(self, chave):
+        """
+        Retorna o resultado guardado para a chave, ou None.
+        """
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, encoding="utf-8") as arquivo:
+                resultado = json.load(arquivo)
+            os.utime(caminho)
+        except FileNotFoundError:
+            registrar_cache(self.nome, faltas=1)
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Cache de resultados: entrada {chave} ilegível, descartada: {e}")
+            self.remover(chave)
+            registrar_cache(self.nome, faltas=1)
+            return None
+        registrar_cache(self.nome, acertos=1)
+        return resultado
+
+    def guardar(self, chave, resultado):
+        """
+        Grava o resultado (serializável em JSON) e remove as entradas menos usadas se o limite for ultrapassado.
+        """
+        os.makedirs(self.pasta, exist_ok=True)
+        caminho = self._caminho(chave)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, default=str)
+        os.replace(temporario, caminho)
+        self._aplicar_limite()
+
+    def remover(self, chave):
+        try:
+            os.remove(self._caminho(chave))
+        except FileNotFoundError:
+            pass
+
+    def _entradas(self):
+        if not os.path.isdir(self.pasta):
+            return []
+        return [entrada for entrada in os.scandir(self.pasta) if entrada.name.endswith(".json")]
+
+    def _aplicar_limite(self):
+        with self._trava:
+            entradas = []
+            for entrada in self._entradas():
+                try:
+                    estado = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                entradas.append((estado.st_mtime, estado.st_size, entrada.path))
+            total = sum(tamanho for _, tamanho, _ in entradas)
+            for _, tamanho, caminho in sorted(entradas):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    pass
+                total -= tamanho
+
+
+_cache = None
+_trava_modulo = threading.Lock()
+
+
+def obter_cache_resultados():
+    """
+    Retorna o cache de resultados do processo, criado na primeira chamada.
+    """
+    global _cache
+    if _cache is None:
+        with _trava_modulo:
+            if _cache is None:
+                _cache = CacheResultados()
+    return _cache
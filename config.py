@@ -7,13 +7,65 @@ Configuração do sistema de roteirização
 
 import os
 
+# Pasta dos dados; criada por quem grava nela (conjuntos, caches, bancos), não na importação
 DATABASE_FOLDER = "database"
-if not os.path.exists(DATABASE_FOLDER):
-    os.makedirs(DATABASE_FOLDER)
 
 # Parâmetros de geocodificação
 GEOCODER_USER_AGENT = os.environ.get("GEOCODER_USER_AGENT", "logistica_app")
 OPENCAGE_API_KEY = os.environ.get("OPENCAGE_API_KEY", "6f522c67add14152926990afbe127384")
+OPENCAGE_URL = os.environ.get("OPENCAGE_URL", "https://api.opencagedata.com/geocode/v1/json")
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+
+# Geocodificação em lote: requisições simultâneas e limite de requisições por segundo por provedor
+GEOCODE_WORKERS = int(os.environ.get("GEOCODE_WORKERS", "8"))
+GEOCODE_LIMITES_POR_SEGUNDO = {
+    "opencage": float(os.environ.get("OPENCAGE_RPS", "1")),
+    "nominatim": float(os.environ.get("NOMINATIM_RPS", "1")),
+}
+GEOCODE_TENTATIVAS = int(os.environ.get("GEOCODE_TENTATIVAS", "4"))
+GEOCODE_TIMEOUT = float(os.environ.get("GEOCODE_TIMEOUT", "10"))
+
+# Cache de geocodificação (SQLite + camada em memória)
+GEOCODE_DB = os.environ.get("GEOCODE_DB", os.path.join(DATABASE_FOLDER, "geocodificacao.db"))
+GEOCODE_CACHE_MEMORIA = int(os.environ.get("GEOCODE_CACHE_MEMORIA", "50000"))
+# Validade das entradas do cache: resultados encontrados e falhas (cache negativo)
+GEOCODE_TTL_POSITIVO_DIAS = float(os.environ.get("GEOCODE_TTL_POSITIVO_DIAS", "365"))
+GEOCODE_TTL_NEGATIVO_DIAS = float(os.environ.get("GEOCODE_TTL_NEGATIVO_DIAS", "7"))
+# Confiança mínima (0 a 10) para aceitar o gazetteer offline antes dos provedores remotos
+# (4 = bairro; resultados no nível de cidade só são usados como centroide de último recurso)
+GAZETTEER_CONFIANCA_MINIMA = int(os.environ.get("GAZETTEER_CONFIANCA_MINIMA", "4"))
+
+# Fila de tarefas da API (/jobs): banco das tarefas, processos simultâneos e tarefas aguardando na fila
+JOBS_DB = os.environ.get("JOBS_DB", os.path.join(DATABASE_FOLDER, "tarefas.db"))
+JOBS_WORKERS = int(os.environ.get("JOBS_WORKERS", "2"))
+JOBS_MAX_PENDENTES = int(os.environ.get("JOBS_MAX_PENDENTES", "20"))
+# Intervalo (s) do sinal de vida de cada fila; tarefas de uma fila sem sinal há 3 intervalos são interrompidas
+JOBS_BATIMENTO_SEGUNDOS = float(os.environ.get("JOBS_BATIMENTO_SEGUNDOS", "10"))
+
+# Rotas por carga (roteamento.py): processos que resolvem as rotas dos caminhões em paralelo
+ROTAS_WORKERS = int(os.environ.get("ROTAS_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Versões dos conjuntos enviados ao /upload: memória máxima das versões carregadas (LRU)
+# e quantidade de versões mantidas em disco
+DATASETS_MEMORIA_MAX_MB = float(os.environ.get("DATASETS_MEMORIA_MAX_MB", "512"))
+DATASETS_VERSOES_MAX = int(os.environ.get("DATASETS_VERSOES_MAX", "50"))
+
+# Cache de resultados da roteirização em disco (LRU limitado em tamanho)
+RESULTADOS_CACHE_DIR = os.environ.get("RESULTADOS_CACHE_DIR", os.path.join(DATABASE_FOLDER, "cache_resultados"))
+RESULTADOS_CACHE_MAX_MB = float(os.environ.get("RESULTADOS_CACHE_MAX_MB", "100"))
+# HTML dos mapas gerados, indexado pelo hash dos pontos exibidos
+MAPAS_CACHE_DIR = os.environ.get("MAPAS_CACHE_DIR", os.path.join(RESULTADOS_CACHE_DIR, "mapas"))
+MAPAS_CACHE_MAX_MB = float(os.environ.get("MAPAS_CACHE_MAX_MB", "200"))
+
+# Perfis (cProfile + tracemalloc) das execuções com perfilamento ligado
+PERFIS_DIR = os.environ.get("PERFIS_DIR", os.path.join(DATABASE_FOLDER, "perfis"))
+
+# Logging (logs.py): arquivo único, nível, formato (json ou texto) e, no algoritmo genético,
+# de quantas em quantas gerações o progresso é registrado
+LOG_ARQUIVO = os.environ.get("LOG_ARQUIVO", "roteirizador.log")
+LOG_NIVEL = os.environ.get("LOG_NIVEL", "INFO").upper()
+LOG_FORMATO = os.environ.get("LOG_FORMATO", "json")
+LOG_INTERVALO_GERACOES = int(os.environ.get("LOG_INTERVALO_GERACOES", "25"))
 
 # Parâmetros de rota de partida
 endereco_partida = "Avenida Antonio Ortega, 3604 - Pinhal, Cabreúva - SP, São Paulo, Brasil"
@@ -1,53 +1,494 @@
+import os
+import time
 import sqlite3
+import threading
 
-def connect_db(db_name="database.db"):
-    conn = sqlite3.connect(db_name)
+import numpy as np
+import pandas as pd
+
+CAMINHO_PADRAO = "database.db"
+
+# Linhas por chamada de executemany; todas as chamadas de uma gravação ficam na mesma transação
+TAMANHO_LOTE = 5000
+
+# Gravações com ao menos esse número de linhas, e que cobrem ao menos metade da tabela, recriam o
+# R*Tree inteiro no fim da transação em vez de atualizá-lo linha a linha pelos gatilhos (~3x mais lento)
+LIMITE_REINDEXACAO_LOTE = 10000
+
+# Colunas da planilha de pedidos -> colunas da tabela pedidos
+COLUNAS_PEDIDOS = {
+    "Nº Pedido": "numero_pedido",
+    "Cód. Cliente": "codigo_cliente",
+    "Nome Cliente": "cliente",
+    "Endereço Completo": "endereco",
+    "Bairro de Entrega": "bairro",
+    "Cidade de Entrega": "cidade",
+    "Peso dos Itens": "peso",
+    "Qtde. dos Itens": "caixas",
+    "Latitude": "latitude",
+    "Longitude": "longitude",
+    "Placa": "placa",
+    "Carga": "carga",
+    "Ordem de Entrega TSP": "ordem_entrega",
+}
+
+# Colunas da planilha da frota -> colunas da tabela frota
+COLUNAS_FROTA = {
+    "Placa": "placa",
+    "Descrição Veículo": "modelo",
+    "Transportador": "transportador",
+    "Capac. Kg": "capacidade",
+    "Capac. Cx": "capacidade_caixas",
+    "Disponível": "disponivel",
+}
+
+ESQUEMA = {
+    "pedidos": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "numero_pedido": "TEXT UNIQUE",
+        "codigo_cliente": "TEXT",
+        "cliente": "TEXT",
+        "endereco": "TEXT NOT NULL",
+        "bairro": "TEXT",
+        "cidade": "TEXT",
+        "peso": "REAL",
+        "caixas": "INTEGER",
+        "latitude": "REAL",
+        "longitude": "REAL",
+        "placa": "TEXT",
+        "carga": "INTEGER",
+        "ordem_entrega": "TEXT",
+        "atualizado_em": "REAL",
+    },
+    "frota": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "placa": "TEXT NOT NULL UNIQUE",
+        "modelo": "TEXT",
+        "transportador": "TEXT",
+        "capacidade": "REAL",
+        "capacidade_caixas": "INTEGER",
+        "disponivel": "TEXT",
+        "atualizado_em": "REAL",
+    },
+    "coordenadas": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "endereco": "TEXT NOT NULL UNIQUE",
+        "latitude": "REAL NOT NULL",
+        "longitude": "REAL NOT NULL",
+        "atualizado_em": "REAL",
+    },
+    "ia_planilhas": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "nome": "TEXT NOT NULL",
+        "dados": "BLOB NOT NULL",
+    },
+}
+
+INDICES = [
+    "CREATE INDEX IF NOT EXISTS idx_pedidos_endereco ON pedidos (endereco)",
+    "CREATE INDEX IF NOT EXISTS idx_pedidos_cidade ON pedidos (cidade)",
+    "CREATE INDEX IF NOT EXISTS idx_pedidos_placa_carga ON pedidos (placa, carga)",
+]
+
+# Índices espaciais R*Tree: tabela de origem -> (tabela virtual, coluna de id da origem)
+INDICES_ESPACIAIS = {
+    "pedidos": ("pedidos_rtree", "id"),
+    "coordenadas": ("coordenadas_rtree", "id"),
+}
+
+RAIO_TERRA_M = 6371008.8
+
+_local = threading.local()
+_esquemas_criados = set()
+_trava = threading.Lock()
+
+
+def _recriar_tabela(conn, tabela, colunas, existentes):
+    """
+    Recria a tabela com a definição atual, copiando as colunas em comum. Usado quando uma versão
+    anterior declarou NOT NULL em colunas hoje opcionais ou não tinha a chave primária atual (o SQLite
+    não altera restrições com ALTER). O R*Tree da tabela, indexado pela chave antiga, é descartado e
+    recriado por _criar_indices_espaciais.
+    """
+    definicao = ", ".join(f"{nome} {tipo}" for nome, tipo in colunas.items())
+    comuns = ", ".join(nome for nome in colunas if nome in existentes)
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    conn.execute(f"DROP TABLE IF EXISTS {tabela}_migracao")
+    conn.execute(f"CREATE TABLE {tabela}_migracao ({definicao})")
+    conn.execute(f"INSERT INTO {tabela}_migracao ({comuns}) SELECT {comuns} FROM {tabela}")
+    conn.execute(f"DROP TABLE {tabela}")
+    conn.execute(f"ALTER TABLE {tabela}_migracao RENAME TO {tabela}")
+    if tabela in INDICES_ESPACIAIS:
+        _remover_indice_espacial(conn, tabela)
+
+
+def _criar_esquema(conn):
+    """
+    Cria as tabelas e índices. Tabelas de versões anteriores recebem as colunas que faltam e são
+    recriadas se tiverem NOT NULL em colunas hoje opcionais (frota.modelo e frota.capacidade) ou
+    não tiverem a chave primária atual (coordenadas, antes indexada pelo endereço).
+    """
+    with conn:
+        for tabela, colunas in ESQUEMA.items():
+            definicao = ", ".join(f"{nome} {tipo}" for nome, tipo in colunas.items())
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {tabela} ({definicao})")
+            info = conn.execute(f"PRAGMA table_info({tabela})").fetchall()
+            existentes = {linha[1] for linha in info}
+            restricoes_antigas = any(linha[3] and linha[1] in colunas and "NOT NULL" not in colunas[linha[1]]
+                                     for linha in info)
+            sem_chave = any("PRIMARY KEY" in tipo and nome not in existentes for nome, tipo in colunas.items())
+            if restricoes_antigas or sem_chave:
+                _recriar_tabela(conn, tabela, colunas, existentes)
+                existentes = set(colunas)
+            for nome, tipo in colunas.items():
+                if nome not in existentes:
+                    tipo = tipo.replace("UNIQUE", "").replace("NOT NULL", "")
+                    conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {nome} {tipo}")
+                    if "UNIQUE" in colunas[nome]:
+                        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{tabela}_{nome} ON {tabela} ({nome})")
+        for indice in INDICES:
+            conn.execute(indice)
+        _criar_indices_espaciais(conn)
+
+
+def rtree_disponivel(conn):
+    """
+    Indica se o SQLite foi compilado com o módulo R*Tree.
+    """
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp._teste_rtree USING rtree(id, x0, x1)")
+        conn.execute("DROP TABLE temp._teste_rtree")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _criar_indices_espaciais(conn):
+    """
+    Cria as tabelas R*Tree e os gatilhos que as mantêm sincronizadas com pedidos e coordenadas:
+    toda inserção, atualização de latitude/longitude ou exclusão atualiza o índice, inclusive
+    as feitas pelos upserts em lote. Linhas já existentes são indexadas na criação.
+    Sem o módulo R*Tree, as consultas usam o índice comum em (latitude, longitude).
+    """
+    for tabela in INDICES_ESPACIAIS:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_lat_lon ON {tabela} (latitude, longitude)")
+    if not rtree_disponivel(conn):
+        return
+    for tabela, (rtree, id_origem) in INDICES_ESPACIAIS.items():
+        existe = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (rtree,)).fetchone()
+        if existe:
+            continue
+        conn.execute(f"CREATE VIRTUAL TABLE {rtree} USING rtree(id, min_lat, max_lat, min_lon, max_lon)")
+        conn.execute(f"""
+            INSERT INTO {rtree} SELECT {id_origem}, latitude, latitude, longitude, longitude FROM {tabela}
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """)
+        novo = f"SELECT new.{id_origem}, new.latitude, new.latitude, new.longitude, new.longitude " \
+               f"WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL"
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {rtree}_insert AFTER INSERT ON {tabela} "
+                     f"BEGIN INSERT OR REPLACE INTO {rtree} {novo}; END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {rtree}_update AFTER UPDATE OF latitude, longitude ON {tabela} "
+                     f"BEGIN DELETE FROM {rtree} WHERE id = old.{id_origem}; INSERT INTO {rtree} {novo}; END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {rtree}_delete AFTER DELETE ON {tabela} "
+                     f"BEGIN DELETE FROM {rtree} WHERE id = old.{id_origem}; END")
+
+
+def distancias_haversine(lat_1, lon_1, lat_2, lon_2):
+    """
+    Distância em metros (fórmula de haversine) entre os pontos, com broadcasting do NumPy.
+    """
+    lat_1, lon_1, lat_2, lon_2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat_1, lon_1, lat_2, lon_2))
+    a = (np.sin((lat_2 - lat_1) / 2) ** 2
+         + np.cos(lat_1) * np.cos(lat_2) * np.sin((lon_2 - lon_1) / 2) ** 2)
+    return 2 * RAIO_TERRA_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def caixa_do_raio(latitude, longitude, raio_m):
+    """
+    Caixa (lat_min, lat_max, lon_min, lon_max) que contém o círculo de raio `raio_m` em torno do ponto.
+    """
+    delta_lat = np.degrees(raio_m / RAIO_TERRA_M)
+    cos_lat = max(np.cos(np.radians(latitude)), 1e-6)
+    delta_lon = min(np.degrees(raio_m / (RAIO_TERRA_M * cos_lat)), 180.0)
+    return latitude - delta_lat, latitude + delta_lat, longitude - delta_lon, longitude + delta_lon
+
+
+def _para_arrays(cursor, tipos):
+    """
+    Converte o resultado de uma consulta em dict coluna -> array NumPy (NULL -> NaN nas colunas numéricas).
+    """
+    colunas = [descricao[0] for descricao in cursor.description]
+    linhas = cursor.fetchall()
+    valores = list(zip(*linhas)) if linhas else [()] * len(colunas)
+    arrays = {}
+    for coluna, dados in zip(colunas, valores):
+        tipo = tipos.get(coluna, object)
+        if tipo is object:
+            arrays[coluna] = np.array(dados, dtype=object)
+        else:
+            arrays[coluna] = np.array([np.nan if v is None else v for v in dados], dtype=tipo)
+    return arrays
+
+
+def connect_db(db_name=CAMINHO_PADRAO):
+    """
+    Retorna a conexão da thread atual com o banco `db_name`, aberta em modo WAL.
+    A mesma conexão é reaproveitada em todas as chamadas da thread; não a feche.
+    O esquema das tabelas é criado pela classe Database (ou por create_tables).
+    """
+    conexoes = getattr(_local, "conexoes", None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+    caminho = os.path.abspath(db_name)
+    conn = conexoes.get(caminho)
+    if conn is None:
+        conn = sqlite3.connect(caminho, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conexoes[caminho] = conn
     return conn
 
+
+def _linhas(df, mapeamento, colunas_texto=()):
+    """
+    Converte as colunas mapeadas do DataFrame em tuplas para executemany (NaN -> NULL).
+
+    Retorna:
+      tuple: (colunas da tabela, lista de tuplas).
+    """
+    presentes = [coluna for coluna in mapeamento if coluna in df.columns]
+    dados = df[presentes].copy()
+    for coluna in presentes:
+        if mapeamento[coluna] in colunas_texto:
+            dados[coluna] = dados[coluna].astype("string")
+    dados = dados.astype(object).where(dados.notna(), None)
+    return [mapeamento[c] for c in presentes], list(dados.itertuples(index=False, name=None))
+
+
+def _remover_indice_espacial(conn, tabela):
+    """
+    Remove o R*Tree da tabela e seus gatilhos (dentro da transação aberta); _criar_indices_espaciais
+    os recria, indexando todas as linhas de uma vez.
+    """
+    rtree = INDICES_ESPACIAIS[tabela][0]
+    for evento in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {rtree}_{evento}")
+    conn.execute(f"DROP TABLE IF EXISTS {rtree}")
+
+
+def _upsert(conn, tabela, colunas, linhas, chave):
+    """
+    Grava as linhas com executemany em uma única transação, atualizando as existentes pela `chave`.
+    Cargas em massa recriam o R*Tree no fim, em vez de atualizá-lo linha a linha (ver LIMITE_REINDEXACAO_LOTE).
+    """
+    colunas = colunas + ["atualizado_em"]
+    agora = time.time()
+    atualizacoes = ", ".join(f"{c} = excluded.{c}" for c in colunas if c != chave)
+    sql = (f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))}) "
+           f"ON CONFLICT ({chave}) DO UPDATE SET {atualizacoes}")
+    with conn:
+        reindexar = False
+        if tabela in INDICES_ESPACIAIS and len(linhas) >= LIMITE_REINDEXACAO_LOTE:
+            conn.execute("BEGIN IMMEDIATE")
+            reindexar = 2 * len(linhas) >= conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+            if reindexar:
+                _remover_indice_espacial(conn, tabela)
+        for inicio in range(0, len(linhas), TAMANHO_LOTE):
+            conn.executemany(sql, (linha + (agora,) for linha in linhas[inicio:inicio + TAMANHO_LOTE]))
+        if reindexar:
+            _criar_indices_espaciais(conn)
+    return len(linhas)
+
+
+# Colunas retornadas por padrão nas consultas espaciais e seus tipos NumPy
+COLUNAS_CONSULTA_PEDIDOS = ("id", "latitude", "longitude", "peso", "caixas", "cidade")
+TIPOS_ARRAYS = {"id": np.int64, "latitude": np.float64, "longitude": np.float64, "peso": np.float64,
+                "caixas": np.float64, "capacidade": np.float64, "carga": np.float64}
+
+
+def _filtrar_raio(arrays, latitude, longitude, raio_m):
+    distancias = distancias_haversine(latitude, longitude, arrays["latitude"], arrays["longitude"])
+    dentro = np.flatnonzero(distancias <= raio_m)
+    dentro = dentro[np.argsort(distancias[dentro], kind="stable")]
+    resultado = {coluna: valores[dentro] for coluna, valores in arrays.items()}
+    resultado["distancia_m"] = distancias[dentro]
+    return resultado
+
+
+class Database:
+    """
+    Acesso ao banco SQLite do roteirizador.
+
+    Cada thread usa uma única conexão (em modo WAL) por arquivo de banco, compartilhada entre
+    as instâncias; as gravações em lote usam executemany dentro de uma só transação.
+    Pedidos e coordenadas têm índices espaciais R*Tree, usados pelas consultas por caixa e por raio,
+    que retornam arrays NumPy.
+    """
+
+    def __init__(self, caminho=CAMINHO_PADRAO):
+        self.caminho = caminho
+
+    @property
+    def conn(self):
+        conn = connect_db(self.caminho)
+        caminho = os.path.abspath(self.caminho)
+        if caminho not in _esquemas_criados:
+            with _trava:
+                if caminho not in _esquemas_criados:
+                    _criar_esquema(conn)
+                    _esquemas_criados.add(caminho)
+        return conn
+
+    def create_tables(self):
+        """
+        Cria (ou atualiza) as tabelas e índices do banco.
+        """
+        _criar_esquema(connect_db(self.caminho))
+        _esquemas_criados.add(os.path.abspath(self.caminho))
+
+    def salvar_pedidos(self, pedidos_df):
+        """
+        Grava os pedidos do DataFrame, atualizando os já existentes pelo Nº Pedido.
+        Pedidos sem Nº Pedido são sempre inseridos.
+
+        Retorna:
+          int: Quantidade de linhas gravadas.
+        """
+        df = pedidos_df
+        if "Endereço Completo" not in df.columns and "Endereço de Entrega" in df.columns:
+            df = df.assign(**{"Endereço Completo": df["Endereço de Entrega"]})
+        if "Carga" not in df.columns:
+            for alternativa in ("Nº Carga", "N° Carga"):
+                if alternativa in df.columns:
+                    df = df.assign(Carga=df[alternativa])
+                    break
+        colunas, linhas = _linhas(df, COLUNAS_PEDIDOS, colunas_texto=("numero_pedido", "codigo_cliente"))
+        return _upsert(self.conn, "pedidos", colunas, linhas, "numero_pedido")
+
+    def salvar_frota(self, caminhoes_df):
+        """
+        Grava os caminhões do DataFrame, atualizando os já existentes pela placa.
+
+        Retorna:
+          int: Quantidade de linhas gravadas.
+        """
+        colunas, linhas = _linhas(caminhoes_df.dropna(subset=["Placa"]), COLUNAS_FROTA)
+        return _upsert(self.conn, "frota", colunas, linhas, "placa")
+
+    def salvar_coordenadas(self, coordenadas):
+        """
+        Grava as coordenadas geocodificadas.
+
+        Parâmetros:
+          coordenadas (dict): endereço -> (latitude, longitude); valores None são ignorados.
+
+        Retorna:
+          int: Quantidade de linhas gravadas.
+        """
+        linhas = [(endereco, float(coords[0]), float(coords[1]))
+                  for endereco, coords in (coordenadas or {}).items()
+                  if coords is not None and coords[0] is not None and coords[1] is not None]
+        return _upsert(self.conn, "coordenadas", ["endereco", "latitude", "longitude"], linhas, "endereco")
+
+    def carregar_coordenadas(self):
+        """
+        Retorna todas as coordenadas gravadas como dict endereço -> (latitude, longitude).
+        """
+        return {endereco: (lat, lon) for endereco, lat, lon in
+                self.conn.execute("SELECT endereco, latitude, longitude FROM coordenadas")}
+
+    def _consultar_caixa(self, tabela, colunas, lat_min, lat_max, lon_min, lon_max, filtro="", parametros=()):
+        rtree, id_origem = INDICES_ESPACIAIS[tabela]
+        selecao = ", ".join(f"t.{coluna}" for coluna in colunas)
+        caixa = "t.latitude BETWEEN ? AND ? AND t.longitude BETWEEN ? AND ?"
+        limites = (lat_min, lat_max, lon_min, lon_max)
+        conn = self.conn
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (rtree,)).fetchone():
+            # O R*Tree guarda as coordenadas em float32 (arredondadas para fora): a caixa exata é
+            # conferida de novo nas colunas da tabela
+            sql = (f"SELECT {selecao} FROM {rtree} r JOIN {tabela} t ON t.{id_origem} = r.id "
+                   f"WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ? AND {caixa}")
+            parametros_caixa = limites + limites
+        else:
+            sql = f"SELECT {selecao} FROM {tabela} t WHERE {caixa}"
+            parametros_caixa = limites
+        return _para_arrays(conn.execute(sql + filtro, parametros_caixa + tuple(parametros)), TIPOS_ARRAYS)
+
+    def pedidos_na_caixa(self, lat_min, lat_max, lon_min, lon_max, pendentes=False, colunas=COLUNAS_CONSULTA_PEDIDOS):
+        """
+        Pedidos com coordenadas dentro da caixa informada (por exemplo, a de uma região).
+
+        Parâmetros:
+          pendentes (bool): Se True, apenas pedidos ainda sem carga atribuída.
+          colunas (tuple): Colunas da tabela pedidos a retornar.
+
+        Retorna:
+          dict: coluna -> array NumPy (id em int64, coordenadas/peso em float64).
+        """
+        filtro = " AND (t.carga IS NULL OR t.carga = 0)" if pendentes else ""
+        return self._consultar_caixa("pedidos", colunas, lat_min, lat_max, lon_min, lon_max, filtro)
+
+    def pedidos_no_raio(self, latitude, longitude, raio_km, pendentes=False, colunas=COLUNAS_CONSULTA_PEDIDOS):
+        """
+        Pedidos a até `raio_km` do ponto (por exemplo, do endereço de partida), do mais próximo ao mais distante.
+        O R*Tree seleciona a caixa que contém o círculo e a distância exata é filtrada com haversine.
+
+        Retorna:
+          dict: coluna -> array NumPy, com a coluna adicional "distancia_m".
+        """
+        colunas = tuple(dict.fromkeys(tuple(colunas) + ("latitude", "longitude")))
+        arrays = self.pedidos_na_caixa(*caixa_do_raio(latitude, longitude, raio_km * 1000), pendentes=pendentes,
+                                       colunas=colunas)
+        return _filtrar_raio(arrays, latitude, longitude, raio_km * 1000)
+
+    def coordenadas_no_raio(self, latitude, longitude, raio_km):
+        """
+        Endereços geocodificados a até `raio_km` do ponto, do mais próximo ao mais distante.
+
+        Retorna:
+          dict: "endereco", "latitude", "longitude" e "distancia_m" -> arrays NumPy.
+        """
+        arrays = self._consultar_caixa("coordenadas", ("endereco", "latitude", "longitude"),
+                                       *caixa_do_raio(latitude, longitude, raio_km * 1000))
+        return _filtrar_raio(arrays, latitude, longitude, raio_km * 1000)
+
+    def carregar_pedidos(self):
+        """
+        Retorna a tabela de pedidos como DataFrame.
+        """
+        return pd.read_sql_query("SELECT * FROM pedidos", self.conn)
+
+    def carregar_frota(self):
+        """
+        Retorna a tabela da frota como DataFrame.
+        """
+        return pd.read_sql_query("SELECT * FROM frota", self.conn)
+
+
 def create_tables(conn):
-    cursor = conn.cursor()
-    
-    # Tabela para armazenar as planilhas de IA
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ia_planilhas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            dados BLOB NOT NULL
-        )
-    ''')
-    
-    # Tabela para armazenar informações da frota
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS frota (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            modelo TEXT NOT NULL,
-            capacidade INTEGER NOT NULL,
-            placa TEXT NOT NULL UNIQUE
-        )
-    ''')
-    
-    conn.commit()
+    _criar_esquema(conn)
+
 
 def insert_ia_planilha(conn, nome, dados):
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO ia_planilhas (nome, dados) VALUES (?, ?)
-    ''', (nome, dados))
-    conn.commit()
+    with conn:
+        conn.execute('''
+            INSERT INTO ia_planilhas (nome, dados) VALUES (?, ?)
+        ''', (nome, dados))
+
 
 def insert_frota(conn, modelo, capacidade, placa):
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO frota (modelo, capacidade, placa) VALUES (?, ?, ?)
-    ''', (modelo, capacidade, placa))
-    conn.commit()
+    with conn:
+        conn.execute('''
+            INSERT INTO frota (modelo, capacidade, placa, atualizado_em) VALUES (?, ?, ?, ?)
+            ON CONFLICT (placa) DO UPDATE SET modelo = excluded.modelo, capacidade = excluded.capacidade,
+                                              atualizado_em = excluded.atualizado_em
+        ''', (modelo, capacidade, placa, time.time()))
+
 
 def query_ia_planilhas(conn):
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM ia_planilhas')
-    return cursor.fetchall()
+    return conn.execute('SELECT * FROM ia_planilhas').fetchall()
+
 
 def query_frota(conn):
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM frota')
-    return cursor.fetchall()
\ No newline at end of file
+    return conn.execute('SELECT * FROM frota').fetchall()
@@ -1,63 +1,54 @@
-import sqlite3
+from db.database import connect_db
 
 def conectar_db():
-    conn = sqlite3.connect('frota_ia.db')
-    return conn
+    # Conexão da thread atual, reaproveitada entre as chamadas (não deve ser fechada)
+    return connect_db('frota_ia.db')
 
 def criar_tabelas():
     conn = conectar_db()
-    cursor = conn.cursor()
     
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS frota (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        modelo TEXT NOT NULL,
-        capacidade INTEGER NOT NULL,
-        placa TEXT NOT NULL UNIQUE
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS pedidos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        endereco TEXT NOT NULL,
-        peso INTEGER NOT NULL,
-        latitude REAL,
-        longitude REAL
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS frota (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            modelo TEXT NOT NULL,
+            capacidade INTEGER NOT NULL,
+            placa TEXT NOT NULL UNIQUE
+        )
+        ''')
+        
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS pedidos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            endereco TEXT NOT NULL,
+            peso INTEGER NOT NULL,
+            latitude REAL,
+            longitude REAL
+        )
+        ''')
 
 def cadastrar_caminhao(modelo, capacidade, placa):
+    cadastrar_caminhoes_lote([(modelo, capacidade, placa)])
+
+def cadastrar_caminhoes_lote(caminhoes):
+    """
+    Cadastra vários caminhões (tuplas modelo, capacidade, placa) em uma única transação.
+    """
     conn = conectar_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    INSERT INTO frota (modelo, capacidade, placa) VALUES (?, ?, ?)
-    ''', (modelo, capacidade, placa))
     
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.executemany('''
+        INSERT INTO frota (modelo, capacidade, placa) VALUES (?, ?, ?)
+        ''', caminhoes)
 
 def consultar_frota():
     conn = conectar_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM frota')
-    resultados = cursor.fetchall()
-    
-    conn.close()
-    return resultados
+    return conn.execute('SELECT * FROM frota').fetchall()
 
 def atualizar_caminhao(id, modelo, capacidade, placa):
     conn = conectar_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    UPDATE frota SET modelo = ?, capacidade = ?, placa = ? WHERE id = ?
-    ''', (modelo, capacidade, placa, id))
     
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    with conn:
+        conn.execute('''
+        UPDATE frota SET modelo = ?, capacidade = ?, placa = ? WHERE id = ?
+        ''', (modelo, capacidade, placa, id))
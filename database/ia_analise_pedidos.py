@@ -1,14 +1,14 @@
-import sqlite3
+from db.database import connect_db
 
 def conectar_banco():
-    conn = sqlite3.connect('banco_de_dados.db')
-    return conn
+    # Conexão da thread atual, reaproveitada entre as chamadas (não deve ser fechada)
+    return connect_db('banco_de_dados.db')
 
 def criar_tabelas():
     conn = conectar_banco()
-    cursor = conn.cursor()
     
-    cursor.execute('''
+    with conn:
+        conn.execute('''
     CREATE TABLE IF NOT EXISTS pedidos (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         endereco TEXT NOT NULL,
@@ -19,59 +19,45 @@ def criar_tabelas():
     )
     ''')
     
-    cursor.execute('''
+        conn.execute('''
     CREATE TABLE IF NOT EXISTS frota (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         modelo TEXT NOT NULL,
         capacidade REAL NOT NULL
     )
     ''')
-    
-    conn.commit()
-    conn.close()
 
 def inserir_pedido(endereco, latitude, longitude, peso_itens, ordem_entrega):
+    inserir_pedidos([(endereco, latitude, longitude, peso_itens, ordem_entrega)])
+
+def inserir_pedidos(pedidos):
+    """
+    Insere vários pedidos (tuplas endereco, latitude, longitude, peso_itens, ordem_entrega)
+    em uma única transação.
+    """
     conn = conectar_banco()
-    cursor = conn.cursor()
     
-    cursor.execute('''
-    INSERT INTO pedidos (endereco, latitude, longitude, peso_itens, ordem_entrega)
-    VALUES (?, ?, ?, ?, ?)
-    ''', (endereco, latitude, longitude, peso_itens, ordem_entrega))
-    
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.executemany('''
+        INSERT INTO pedidos (endereco, latitude, longitude, peso_itens, ordem_entrega)
+        VALUES (?, ?, ?, ?, ?)
+        ''', pedidos)
 
 def inserir_caminhao(modelo, capacidade):
     conn = conectar_banco()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    INSERT INTO frota (modelo, capacidade)
-    VALUES (?, ?)
-    ''', (modelo, capacidade))
     
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute('''
+        INSERT INTO frota (modelo, capacidade)
+        VALUES (?, ?)
+        ''', (modelo, capacidade))
 
 def consultar_pedidos():
     conn = conectar_banco()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM pedidos')
-    resultados = cursor.fetchall()
-    
-    conn.close()
-    return resultados
+    return conn.execute('SELECT * FROM pedidos').fetchall()
 
 def consultar_frota():
     conn = conectar_banco()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM frota')
-    resultados = cursor.fetchall()
-    
-    conn.close()
-    return resultados
+    return conn.execute('SELECT * FROM frota').fetchall()
 
 criar_tabelas()
\ No newline at end of file
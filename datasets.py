@@ -0,0 +1,179 @@
+"""
+Módulo de versões de conjuntos de dados
+
+Cada planilha enviada ao /upload é ingerida uma única vez (ingestao.py) e vira uma versão
+imutável do conjunto, identificada pelo hash do conteúdo (por exemplo, "pedidos-3f9c0a1b2d4e5f60").
+As requisições seguintes (/resultado, /mapa, /jobs) indicam a versão que querem usar, de modo
+que envios simultâneos de clientes diferentes não se sobrescrevem.
+
+As versões ficam em Parquet na pasta de versões (o processo de trabalho das tarefas as lê de lá)
+e as usadas recentemente ficam carregadas em memória, em um LRU limitado por DATASETS_MEMORIA_MAX_MB.
+O envio mais recente de cada conjunto continua sendo também o conjunto atual (armazenamento.py),
+usado quando nenhuma versão é indicada.
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from armazenamento import PASTA_DATASETS, caminho_dataset
+from config import DATASETS_MEMORIA_MAX_MB, DATASETS_VERSOES_MAX
+from ingestao import ingerir_planilha
+from metricas import registrar_cache
+
+PASTA_VERSOES = os.path.join(PASTA_DATASETS, "versoes")
+FORMATO_VERSAO = re.compile(r"^([a-z_]+)-([0-9a-f]{16})$")
+
+
+def _hash_conteudo(df):
+    hasher = hashlib.blake2b(digest_size=8)
+    hasher.update(json.dumps([[str(c) for c in df.columns], [str(t) for t in df.dtypes]]).encode())
+    if len(df):
+        hasher.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return hasher.hexdigest()
+
+
+def conjunto_da_versao(versao):
+    """
+    Nome do conjunto de uma versão ("pedidos-..." -> "pedidos").
+
+    Lança:
+      ValueError: Se o identificador não tiver o formato de uma versão.
+    """
+    encontrado = FORMATO_VERSAO.match(str(versao))
+    if encontrado is None:
+        raise ValueError(f"Versão de conjunto inválida: {versao!r}")
+    return encontrado.group(1)
+
+
+class RegistroDatasets:
+    """
+    Versões dos conjuntos de dados, em Parquet e em um LRU em memória limitado em tamanho.
+    """
+
+    def __init__(self, pasta=PASTA_VERSOES, max_bytes=int(DATASETS_MEMORIA_MAX_MB * 1e6),
+                 max_versoes=DATASETS_VERSOES_MAX):
+        self.pasta = pasta
+        self.max_bytes = max_bytes
+        self.max_versoes = max_versoes
+        self._memoria = OrderedDict()
+        self._bytes = 0
+        self._trava = threading.Lock()
+
+    def _caminho(self, versao):
+        return os.path.join(self.pasta, f"{versao}.parquet")
+
+    def ingerir(self, arquivo, nome, progresso=None):
+        """
+        Ingere uma planilha como nova versão do conjunto `nome` e a torna a versão atual.
+
+        Retorna:
+          tuple: (ID da versão, ResumoIngestao).
+
+        Lança:
+          ValueError: Se a planilha for inválida (ver ingestao.ingerir_planilha).
+        """
+        os.makedirs(self.pasta, exist_ok=True)
+        temporario = os.path.join(self.pasta, f"{nome}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            resumo = ingerir_planilha(arquivo, nome, progresso=progresso, destino=temporario)
+            df = pd.read_parquet(temporario, engine="pyarrow")
+            versao = f"{nome}-{_hash_conteudo(df)}"
+            os.replace(temporario, self._caminho(versao))
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+        self._tornar_atual(nome, versao)
+        self._guardar_em_memoria(versao, df)
+        self._aplicar_limite_disco()
+        logging.info(f"Versão {versao} registrada com {len(df)} linhas.")
+        return versao, resumo
+
+    def _tornar_atual(self, nome, versao):
+        destino = caminho_dataset(nome)
+        temporario = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.link(self._caminho(versao), temporario)
+        except OSError:
+            shutil.copyfile(self._caminho(versao), temporario)
+        os.replace(temporario, destino)
+
+    def obter(self, versao, nome=None):
+        """
+        Retorna o DataFrame da versão (não o altere: é compartilhado entre as requisições).
+
+        Parâmetros:
+          versao (str): ID retornado por ingerir.
+          nome (str): Conjunto esperado; se informado, a versão precisa pertencer a ele.
+
+        Lança:
+          ValueError: Se o ID for inválido ou de outro conjunto.
+          FileNotFoundError: Se a versão não existir (ou já tiver sido descartada do disco).
+        """
+        conjunto = conjunto_da_versao(versao)
+        if nome is not None and conjunto != nome:
+            raise ValueError(f"A versão {versao} não é do conjunto '{nome}'.")
+        with self._trava:
+            guardado = self._memoria.get(versao)
+            if guardado is not None:
+                self._memoria.move_to_end(versao)
+                registrar_cache("datasets", acertos=1)
+                return guardado[0]
+        registrar_cache("datasets", faltas=1)
+        caminho = self._caminho(versao)
+        try:
+            df = pd.read_parquet(caminho, engine="pyarrow")
+            os.utime(caminho)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Versão {versao} não encontrada.")
+        self._guardar_em_memoria(versao, df)
+        return df
+
+    def _guardar_em_memoria(self, versao, df):
+        tamanho = int(df.memory_usage(deep=True).sum())
+        with self._trava:
+            if versao in self._memoria:
+                self._memoria.move_to_end(versao)
+                return
+            self._memoria[versao] = (df, tamanho)
+            self._bytes += tamanho
+            while self._bytes > self.max_bytes and len(self._memoria) > 1:
+                _, (_, tamanho_descartado) = self._memoria.popitem(last=False)
+                self._bytes -= tamanho_descartado
+
+    def _aplicar_limite_disco(self):
+        with self._trava:
+            versoes = [entrada for entrada in os.scandir(self.pasta)
+                       if entrada.name.endswith(".parquet") and FORMATO_VERSAO.match(entrada.name[:-8])]
+            if len(versoes) <= self.max_versoes:
+                return
+            versoes.sort(key=lambda entrada: entrada.stat().st_mtime)
+            for entrada in versoes[:len(versoes) - self.max_versoes]:
+                try:
+                    os.remove(entrada.path)
+                except FileNotFoundError:
+                    pass
+                logging.info(f"Versão {entrada.name[:-8]} descartada do disco.")
+
+
+_registro = None
+_trava_modulo = threading.Lock()
+
+
+def obter_registro():
+    """
+    Retorna o registro de versões do processo, criado na primeira chamada.
+    """
+    global _registro
+    if _registro is None:
+        with _trava_modulo:
+            if _registro is None:
+                _registro = RegistroDatasets()
+    return _registro
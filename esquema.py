@@ -0,0 +1,127 @@
+"""
+Módulo de esquema de dados
+
+Declara os tipos das colunas de Pedidos e Caminhões com representações compactas:
+categorias para cidade, bairro e placa, float32 para coordenadas e pesos e inteiros
+para quantidades de caixas. A conversão é vetorizada e os valores inválidos são
+reportados, em vez de substituídos silenciosamente.
+"""
+
+import pandas as pd
+import pyarrow as pa
+
+ESQUEMA_PEDIDOS = {
+    # Identificadores são texto: códigos como "PED-123" ou "00123" não podem virar número
+    "Nº Pedido": "string",
+    "Cód. Cliente": "string",
+    "Nº Carga": "Int64",
+    "N° Carga": "Int64",
+    "Nome Cliente": "string",
+    "Grupo Cliente": "category",
+    "Endereço de Entrega": "string",
+    "Bairro de Entrega": "category",
+    "Cidade de Entrega": "category",
+    "Endereço Completo": "string",
+    "Placa": "category",
+    "Qtde. dos Itens": "int32",
+    "Peso dos Itens": "float32",
+    "Latitude": "float32",
+    "Longitude": "float32",
+    "Ordem de Entrega TSP": "string",
+}
+
+ESQUEMA_CAMINHOES = {
+    "Placa": "category",
+    "Transportador": "category",
+    "Descrição Veículo": "category",
+    "Disponível": "category",
+    "Capac. Cx": "int32",
+    "Capac. Kg": "float32",
+}
+
+# Esquema combinado, usado para conjuntos que misturam colunas (por exemplo, o resultado)
+ESQUEMA_GERAL = {**ESQUEMA_CAMINHOES, **ESQUEMA_PEDIDOS}
+
+TIPOS_NUMERICOS = {"int32", "Int64", "float32"}
+
+TIPOS_ARROW = {
+    "string": pa.string(),
+    "category": pa.dictionary(pa.int32(), pa.string()),
+    "int32": pa.int32(),
+    "Int64": pa.int64(),
+    "float32": pa.float32(),
+}
+
+# Quantidade máxima de linhas citadas em cada mensagem de erro
+MAX_LINHAS_REPORTADAS = 10
+
+
+def tipo_arrow(coluna, esquema=ESQUEMA_GERAL):
+    """
+    Tipo Arrow/Parquet correspondente à coluna (string para colunas fora do esquema).
+    """
+    return TIPOS_ARROW[esquema.get(coluna, "string")]
+
+
+def _descrever_linhas(indices):
+    linhas = ", ".join(str(i) for i in indices[:MAX_LINHAS_REPORTADAS])
+    if len(indices) > MAX_LINHAS_REPORTADAS:
+        linhas += ", ..."
+    return linhas
+
+
+def aplicar_esquema(df, esquema=ESQUEMA_GERAL):
+    """
+    Converte as colunas presentes no DataFrame para os tipos do esquema.
+
+    - Colunas numéricas são convertidas com pd.to_numeric; valores não numéricos viram
+      ausentes e são reportados. Quantidades inteiras ausentes são gravadas como 0.
+    - Colunas de texto fora do esquema são convertidas para string; números inteiros lidos como
+      float (colunas numéricas com vazios) perdem o ".0".
+
+    Parâmetros:
+      df (DataFrame): Dados a converter (não é alterado).
+      esquema (dict): coluna -> tipo ("string", "category", "int32", "Int64" ou "float32").
+
+    Retorna:
+      tuple: (DataFrame convertido, lista de mensagens de erro de validação).
+    """
+    df = df.copy()
+    erros = []
+    for coluna in df.columns:
+        tipo = esquema.get(coluna)
+        serie = df[coluna]
+        if tipo in TIPOS_NUMERICOS:
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                serie = serie.astype(object)
+            if serie.dtype == object or pd.api.types.is_string_dtype(serie.dtype):
+                serie = serie.astype("string").str.strip().str.replace(",", ".", regex=False)
+            numerica = pd.to_numeric(serie, errors="coerce")
+            invalidos = numerica.isna() & serie.notna()
+            if tipo == "int32":
+                invalidos |= numerica.isna()
+                fracionarios = numerica.notna() & (numerica % 1 != 0)
+                if fracionarios.any():
+                    erros.append(f"Coluna '{coluna}': {int(fracionarios.sum())} valores não inteiros arredondados "
+                                 f"(linhas {_descrever_linhas(df.index[fracionarios].tolist())}).")
+                numerica = numerica.round().fillna(0)
+            elif tipo == "Int64":
+                numerica = numerica.round()
+            if invalidos.any():
+                erros.append(f"Coluna '{coluna}': {int(invalidos.sum())} valores inválidos ou vazios "
+                             f"(linhas {_descrever_linhas(df.index[invalidos].tolist())}).")
+            df[coluna] = numerica.astype(tipo)
+        elif tipo == "category":
+            df[coluna] = serie.astype("string").str.strip().astype("category")
+        elif tipo == "string" or serie.dtype == object:
+            if pd.api.types.is_float_dtype(serie.dtype) and serie.dropna().mod(1).eq(0).all():
+                serie = serie.astype("Int64")
+            df[coluna] = serie.astype("string")
+    return df, erros
+
+
+def memoria_mb(df):
+    """
+    Memória ocupada pelo DataFrame, em MB (contando o conteúdo das strings).
+    """
+    return df.memory_usage(deep=True).sum() / 1e6
@@ -0,0 +1,171 @@
+"""
+Módulo de exportação
+
+Gera os arquivos de download do resultado da roteirização (Excel, CSV ou Parquet) sem
+materializar cópias do DataFrame: as linhas são escritas em lotes por um gravador de memória
+constante (openpyxl em modo write_only) diretamente em um buffer em memória ou em qualquer
+arquivo aberto para escrita, como a resposta HTTP.
+
+No Excel, a opção `por_placa` cria uma aba por caminhão (Placa), com os pedidos na ordem de entrega.
+"""
+
+import io
+import re
+import math
+import datetime
+
+import numpy as np
+import pandas as pd
+
+FORMATOS = {
+    "xlsx": ("roterizacao_resultado.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("roterizacao_resultado.csv", "text/csv"),
+    "parquet": ("roterizacao_resultado.parquet", "application/vnd.apache.parquet"),
+}
+
+# Linhas convertidas de cada vez ao escrever
+TAMANHO_LOTE = 5000
+
+COLUNA_ORDEM = "Ordem de Entrega TSP"
+NOME_ABA_SEM_PLACA = "Sem placa"
+CARACTERES_INVALIDOS_ABA = re.compile(r"[\[\]:*?/\\]")
+
+
+def _valor_celula(valor):
+    """
+    Converte um valor do DataFrame em um tipo aceito pelo openpyxl (ausentes viram célula vazia).
+    """
+    if valor is None or valor is pd.NA or valor is pd.NaT:
+        return None
+    if isinstance(valor, np.float32):
+        # Evita casas decimais espúrias da conversão float32 -> float64 (0.1 -> 0.10000000149)
+        valor = float(str(valor))
+    elif isinstance(valor, np.generic):
+        valor = valor.item()
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    if isinstance(valor, (str, int, float, bool, datetime.datetime, datetime.date)):
+        return valor
+    return str(valor)
+
+
+def _linhas(df, tamanho_lote=TAMANHO_LOTE):
+    """
+    Percorre as linhas do DataFrame em lotes, já convertidas para células.
+    """
+    for inicio in range(0, len(df), tamanho_lote):
+        for linha in df.iloc[inicio:inicio + tamanho_lote].itertuples(index=False, name=None):
+            yield [_valor_celula(valor) for valor in linha]
+
+
+def ordem_de_entrega(df):
+    """
+    Posições das linhas ordenadas pela ordem de entrega ("carga-sequência" da coluna
+    'Ordem de Entrega TSP'); linhas sem ordem ficam no fim, na ordem original.
+    """
+    if COLUNA_ORDEM not in df.columns:
+        return np.arange(len(df))
+    partes = df[COLUNA_ORDEM].astype("string").str.extract(r"(\d+)\D+(\d+)")
+    carga = pd.to_numeric(partes[0], errors="coerce").fillna(np.inf).to_numpy()
+    sequencia = pd.to_numeric(partes[1], errors="coerce").fillna(np.inf).to_numpy()
+    return np.lexsort((np.arange(len(df)), sequencia, carga))
+
+
+def _nome_aba(placa, usados):
+    nome = CARACTERES_INVALIDOS_ABA.sub("-", str(placa)).strip()[:31] or NOME_ABA_SEM_PLACA
+    base, contador = nome, 2
+    while nome.lower() in usados:
+        sufixo = f" ({contador})"
+        nome = base[:31 - len(sufixo)] + sufixo
+        contador += 1
+    usados.add(nome.lower())
+    return nome
+
+
+def escrever_excel(df, destino, nome_planilha="Resultado", por_placa=False):
+    """
+    Escreve o DataFrame em Excel com o gravador write_only do openpyxl (memória constante).
+
+    Parâmetros:
+      df (DataFrame): Dados a exportar.
+      destino (str ou arquivo): Caminho ou arquivo binário aberto para escrita (por exemplo, BytesIO).
+      nome_planilha (str): Nome da aba com todos os pedidos.
+      por_placa (bool): Se True, acrescenta uma aba por Placa com os pedidos na ordem de entrega.
+    """
+    # openpyxl só é carregado ao exportar em Excel (o roteamento importa apenas COLUNA_ORDEM)
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    usados = set()
+    abas = [(nome_planilha, df)]
+    if por_placa and "Placa" in df.columns:
+        placas = df["Placa"].astype("string").fillna("").str.strip()
+        for placa, posicoes in pd.Series(np.arange(len(df))).groupby(placas.to_numpy(), sort=True):
+            grupo = df.iloc[posicoes.to_numpy()]
+            abas.append((placa or NOME_ABA_SEM_PLACA, grupo.iloc[ordem_de_entrega(grupo)]))
+    for nome, dados in abas:
+        planilha = workbook.create_sheet(_nome_aba(nome, usados))
+        planilha.append([str(coluna) for coluna in dados.columns])
+        for linha in _linhas(dados):
+            planilha.append(linha)
+    workbook.save(destino)
+
+
+def escrever_csv(df, destino, tamanho_lote=TAMANHO_LOTE):
+    """
+    Escreve o DataFrame em CSV (UTF-8 com BOM, separador ";", para abrir direto no Excel), em lotes.
+
+    Parâmetros:
+      destino (arquivo): Arquivo binário aberto para escrita.
+    """
+    for parte in gerar_csv(df, tamanho_lote):
+        destino.write(parte)
+
+
+def gerar_csv(df, tamanho_lote=TAMANHO_LOTE):
+    """
+    Gera o CSV do DataFrame em blocos de bytes, para respostas HTTP em fluxo.
+    """
+    for inicio in range(0, max(len(df), 1), tamanho_lote):
+        texto = df.iloc[inicio:inicio + tamanho_lote].to_csv(index=False, header=inicio == 0, sep=";",
+                                                             decimal=",")
+        yield (("\ufeff" if inicio == 0 else "") + texto).encode("utf-8")
+
+
+def escrever_parquet(df, destino):
+    """
+    Escreve o DataFrame em Parquet.
+
+    Parâmetros:
+      destino (str ou arquivo): Caminho ou arquivo binário aberto para escrita.
+    """
+    df.to_parquet(destino, index=False, engine="pyarrow")
+
+
+def exportar(df, formato="xlsx", destino=None, por_placa=False):
+    """
+    Exporta o resultado no formato pedido.
+
+    Parâmetros:
+      df (DataFrame): Dados a exportar.
+      formato (str): "xlsx", "csv" ou "parquet".
+      destino (arquivo): Arquivo binário aberto para escrita; se None, o conteúdo é retornado.
+      por_placa (bool): No Excel, acrescenta uma aba por Placa na ordem de entrega.
+
+    Retorna:
+      bytes: Conteúdo do arquivo, se `destino` for None.
+
+    Lança:
+      ValueError: Se o formato não for suportado.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportação inválido: {formato}. Use um de: {', '.join(FORMATOS)}.")
+    buffer = destino if destino is not None else io.BytesIO()
+    if formato == "xlsx":
+        escrever_excel(df, buffer, por_placa=por_placa)
+    elif formato == "csv":
+        escrever_csv(df, buffer)
+    else:
+        escrever_parquet(df, buffer)
+    if destino is None:
+        return buffer.getvalue()
@@ -0,0 +1,272 @@
+"""
+Módulo de geocodificação offline (gazetteer)
+
+Resolve endereços sem acesso à rede a partir de um gazetteer importado de um arquivo CSV
+com centroides de logradouros (ou trechos numerados), bairros e cidades.
+
+Formato do CSV (separador "," ou ";", cabeçalho obrigatório):
+  cidade, bairro, logradouro, numero_inicio, numero_fim, latitude, longitude
+Somente cidade, latitude e longitude são obrigatórias: uma linha sem logradouro é o
+centroide do bairro e uma linha sem bairro é o centroide da cidade.
+
+Os nomes são indexados na forma canônica de normalizacao_enderecos; logradouros sem
+correspondência exata são buscados por similaridade entre os da mesma cidade.
+"""
+
+import csv
+import difflib
+import logging
+import threading
+from functools import lru_cache
+
+from cache_geocodificacao import obter_cache, Geocodigo
+from normalizacao_enderecos import normalizar_endereco
+
+PROVEDOR_GAZETTEER = "gazetteer"
+
+# Confiança atribuída a cada nível de resolução
+CONFIANCA_TRECHO = 8
+CONFIANCA_LOGRADOURO = 7
+CONFIANCA_LOGRADOURO_APROXIMADO = 6
+CONFIANCA_BAIRRO = 4
+CONFIANCA_CIDADE = 2
+
+# Similaridade mínima (0 a 1) para aceitar um logradouro ou bairro aproximado
+SIMILARIDADE_MINIMA = 0.85
+
+# Palavras que não ajudam a distinguir logradouros na busca aproximada
+PALAVRAS_GENERICAS = {"rua", "avenida", "alameda", "travessa", "estrada", "rodovia", "praca",
+                      "de", "da", "do", "das", "dos", "e"}
+
+TAMANHO_LOTE_IMPORTACAO = 5000
+
+
+def _numero(valor):
+    try:
+        return int(float(str(valor).replace(",", ".")))
+    except (TypeError, ValueError):
+        return None
+
+
+def separar_numero(logradouro):
+    """
+    Separa o nome canônico do logradouro do número do imóvel.
+
+    Retorna:
+      tuple: (nome canônico, número ou None).
+    """
+    tokens = normalizar_endereco(logradouro).split()
+    for posicao, token in enumerate(tokens):
+        if token.isdigit() or token in ("sn", "km"):
+            numero = int(token) if token.isdigit() else None
+            return " ".join(tokens[:posicao]), numero
+    return " ".join(tokens), None
+
+
+def decompor_endereco(endereco):
+    """
+    Separa um endereço completo ("logradouro, número, bairro, cidade") em seus campos.
+
+    Retorna:
+      tuple: (logradouro, bairro, cidade); campos ausentes são "".
+    """
+    partes = [parte.strip() for parte in str(endereco).split(",") if parte.strip()]
+    if len(partes) >= 3:
+        return " ".join(partes[:-2]), partes[-2], partes[-1]
+    if len(partes) == 2:
+        return partes[0], "", partes[1]
+    return "", "", partes[0] if partes else ""
+
+
+class Gazetteer:
+    """
+    Índice em memória do gazetteer, carregado da tabela `gazetteer` do banco de geocodificação.
+    """
+
+    def __init__(self, linhas=()):
+        self.cidades = {}
+        self.bairros = {}
+        self.logradouros = {}
+        self._bairros_por_cidade = {}
+        self._logradouros_por_token = {}
+        for linha in linhas:
+            self._indexar(*linha)
+        self._buscar_logradouro = lru_cache(maxsize=65536)(self._buscar_logradouro_sem_cache)
+
+    def __len__(self):
+        return len(self.cidades) + len(self.bairros) + len(self.logradouros)
+
+    def _indexar(self, cidade, bairro, logradouro, numero_inicio, numero_fim, latitude, longitude):
+        cidade = normalizar_endereco(cidade)
+        bairro = normalizar_endereco(bairro)
+        logradouro, _ = separar_numero(logradouro or "")
+        if not cidade:
+            return
+        if logradouro:
+            self.logradouros.setdefault((cidade, logradouro), []).append(
+                (numero_inicio, numero_fim, latitude, longitude))
+            for token in set(logradouro.split()) - PALAVRAS_GENERICAS:
+                self._logradouros_por_token.setdefault((cidade, token), set()).add(logradouro)
+        elif bairro:
+            self.bairros[(cidade, bairro)] = (latitude, longitude)
+            self._bairros_por_cidade.setdefault(cidade, []).append(bairro)
+        else:
+            self.cidades[cidade] = (latitude, longitude)
+
+    def _buscar_logradouro_sem_cache(self, cidade, nome):
+        """
+        Retorna (nome encontrado, exato) para o logradouro mais parecido da cidade, ou None.
+        """
+        if (cidade, nome) in self.logradouros:
+            return nome, True
+        tokens = set(nome.split()) - PALAVRAS_GENERICAS
+        candidatos = set()
+        for token in tokens:
+            candidatos |= self._logradouros_por_token.get((cidade, token), set())
+        if not candidatos:
+            return None
+        proximos = difflib.get_close_matches(nome, candidatos, n=1, cutoff=SIMILARIDADE_MINIMA)
+        return (proximos[0], False) if proximos else None
+
+    def _coordenadas_logradouro(self, cidade, nome, numero):
+        trechos = self.logradouros[(cidade, nome)]
+        if numero is not None:
+            for inicio, fim, lat, lon in trechos:
+                if inicio is not None and fim is not None and inicio <= numero <= fim:
+                    return lat, lon, True
+        lat = sum(t[2] for t in trechos) / len(trechos)
+        lon = sum(t[3] for t in trechos) / len(trechos)
+        return lat, lon, False
+
+    def geocodificar_campos(self, logradouro, bairro, cidade):
+        """
+        Resolve um endereço pelos campos de logradouro (com número), bairro e cidade,
+        do nível mais preciso (trecho do logradouro) ao menos preciso (cidade).
+
+        Retorna:
+          Geocodigo: Coordenadas e confiança do nível encontrado, ou None.
+        """
+        cidade = normalizar_endereco(cidade)
+        if not cidade:
+            return None
+
+        nome, numero = separar_numero(logradouro or "")
+        if nome:
+            encontrado = self._buscar_logradouro(cidade, nome)
+            if encontrado is not None:
+                nome_encontrado, exato = encontrado
+                lat, lon, no_trecho = self._coordenadas_logradouro(cidade, nome_encontrado, numero)
+                if not exato:
+                    confianca = CONFIANCA_LOGRADOURO_APROXIMADO
+                else:
+                    confianca = CONFIANCA_TRECHO if no_trecho else CONFIANCA_LOGRADOURO
+                return Geocodigo(lat, lon, PROVEDOR_GAZETTEER, confianca)
+
+        bairro = normalizar_endereco(bairro)
+        if bairro:
+            coords = self.bairros.get((cidade, bairro))
+            if coords is None:
+                proximos = difflib.get_close_matches(bairro, self._bairros_por_cidade.get(cidade, []),
+                                                     n=1, cutoff=SIMILARIDADE_MINIMA)
+                coords = self.bairros[(cidade, proximos[0])] if proximos else None
+            if coords is not None:
+                return Geocodigo(coords[0], coords[1], PROVEDOR_GAZETTEER, CONFIANCA_BAIRRO)
+
+        coords = self.cidades.get(cidade)
+        if coords is not None:
+            return Geocodigo(coords[0], coords[1], PROVEDOR_GAZETTEER, CONFIANCA_CIDADE)
+        return None
+
+    def geocodificar(self, endereco):
+        """
+        Resolve um endereço completo no formato "logradouro, número, bairro, cidade".
+        """
+        return self.geocodificar_campos(*decompor_endereco(endereco))
+
+
+def _criar_tabela(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS gazetteer (
+            cidade TEXT NOT NULL,
+            bairro TEXT,
+            logradouro TEXT,
+            numero_inicio INTEGER,
+            numero_fim INTEGER,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL
+        )
+    ''')
+
+
+def importar_gazetteer(caminho_csv, substituir=True):
+    """
+    Importa um arquivo CSV de gazetteer para o banco de geocodificação.
+
+    Como o novo gazetteer pode resolver endereços que antes falharam ou caíram no
+    centroide da cidade, essas entradas (e as do gazetteer anterior) são removidas do cache.
+
+    Parâmetros:
+      caminho_csv (str): Arquivo CSV no formato descrito no módulo.
+      substituir (bool): Se True, descarta o gazetteer importado anteriormente.
+
+    Retorna:
+      int: Quantidade de linhas importadas.
+    """
+    global _gazetteer
+    cache = obter_cache()
+    conn = cache.conexao()
+    importadas = 0
+    with open(caminho_csv, newline="", encoding="utf-8-sig") as arquivo:
+        dialeto = csv.Sniffer().sniff(arquivo.read(4096), delimiters=",;")
+        arquivo.seek(0)
+        leitor = csv.DictReader(arquivo, dialect=dialeto)
+        with conn:
+            _criar_tabela(conn)
+            if substituir:
+                conn.execute("DELETE FROM gazetteer")
+            lote = []
+            for linha in leitor:
+                latitude, longitude = linha.get("latitude"), linha.get("longitude")
+                if not linha.get("cidade") or not latitude or not longitude:
+                    continue
+                lote.append((
+                    linha["cidade"].strip(), (linha.get("bairro") or "").strip(),
+                    (linha.get("logradouro") or "").strip(),
+                    _numero(linha.get("numero_inicio")), _numero(linha.get("numero_fim")),
+                    float(latitude.replace(",", ".")), float(longitude.replace(",", "."))
+                ))
+                if len(lote) >= TAMANHO_LOTE_IMPORTACAO:
+                    conn.executemany("INSERT INTO gazetteer VALUES (?, ?, ?, ?, ?, ?, ?)", lote)
+                    importadas += len(lote)
+                    lote = []
+            if lote:
+                conn.executemany("INSERT INTO gazetteer VALUES (?, ?, ?, ?, ?, ?, ?)", lote)
+                importadas += len(lote)
+    cache.invalidar_provedores([PROVEDOR_GAZETTEER, "centroide_cidade", "nenhum"])
+    with _trava:
+        _gazetteer = None
+    logging.info(f"Gazetteer importado de {caminho_csv}: {importadas} linhas.")
+    return importadas
+
+
+_gazetteer = None
+_trava = threading.Lock()
+
+
+def obter_gazetteer():
+    """
+    Retorna o índice do gazetteer do processo, carregado do banco na primeira chamada.
+    Sem gazetteer importado, o índice fica vazio e não resolve nenhum endereço.
+    """
+    global _gazetteer
+    if _gazetteer is None:
+        with _trava:
+            if _gazetteer is None:
+                conn = obter_cache().conexao()
+                with conn:
+                    _criar_tabela(conn)
+                linhas = conn.execute(
+                    "SELECT cidade, bairro, logradouro, numero_inicio, numero_fim, latitude, longitude FROM gazetteer"
+                )
+                _gazetteer = Gazetteer(linhas)
+    return _gazetteer
@@ -0,0 +1,240 @@
+"""
+Módulo de geocodificação em lote
+
+Resolve muitos endereços de uma vez: remove duplicados (pela chave canônica),
+executa as consultas em paralelo em um pool de threads sobre uma sessão HTTP
+compartilhada (keep-alive) e respeita o limite de requisições por segundo de
+cada provedor, com novas tentativas e espera exponencial em caso de falha.
+
+As URLs dos provedores são configuráveis (OPENCAGE_URL, NOMINATIM_URL), o que
+permite testar contra um servidor HTTP local.
+"""
+
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (OPENCAGE_API_KEY, OPENCAGE_URL, NOMINATIM_URL, GEOCODER_USER_AGENT, GEOCODE_WORKERS,
+                    GEOCODE_LIMITES_POR_SEGUNDO, GEOCODE_TENTATIVAS, GEOCODE_TIMEOUT)
+from normalizacao_enderecos import chave_endereco
+from cache_geocodificacao import Geocodigo
+from progresso import emitir
+
+# Respostas HTTP que indicam falha temporária e justificam nova tentativa
+STATUS_REPETIR = {429, 500, 502, 503, 504}
+
+
+class FalhaConsulta(Exception):
+    """
+    A consulta ao provedor não obteve resposta válida (conexão, HTTP de erro ou tentativas
+    esgotadas). Difere de "endereço não encontrado", que é uma resposta vazia.
+    """
+
+
+class LimitadorTaxa:
+    """
+    Espaça as requisições para não ultrapassar `por_segundo` chamadas por segundo,
+    mesmo quando compartilhado entre várias threads.
+    """
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1.0 / por_segundo if por_segundo and por_segundo > 0 else 0.0
+        self._proxima = 0.0
+        self._trava = threading.Lock()
+
+    def aguardar(self):
+        if not self.intervalo:
+            return
+        with self._trava:
+            agora = time.monotonic()
+            horario = max(agora, self._proxima)
+            self._proxima = horario + self.intervalo
+        if horario > agora:
+            time.sleep(horario - agora)
+
+
+_sessao = None
+_limitadores = {}
+_trava_modulo = threading.Lock()
+
+
+def obter_sessao():
+    """
+    Retorna a sessão HTTP compartilhada do processo, com pool de conexões keep-alive
+    dimensionado para o número de threads de geocodificação.
+    """
+    global _sessao
+    if _sessao is None:
+        with _trava_modulo:
+            if _sessao is None:
+                # requests é carregado só na primeira consulta remota (o cache resolve a maioria)
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                sessao = requests.Session()
+                sessao.headers["User-Agent"] = GEOCODER_USER_AGENT
+                adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=max(GEOCODE_WORKERS, 1))
+                sessao.mount("https://", adaptador)
+                sessao.mount("http://", adaptador)
+                _sessao = sessao
+    return _sessao
+
+
+def obter_limitador(provedor):
+    """
+    Retorna o limitador de taxa compartilhado do provedor (configurado em GEOCODE_LIMITES_POR_SEGUNDO).
+    """
+    with _trava_modulo:
+        if provedor not in _limitadores:
+            _limitadores[provedor] = LimitadorTaxa(GEOCODE_LIMITES_POR_SEGUNDO.get(provedor, 1.0))
+        return _limitadores[provedor]
+
+
+def _requisitar(provedor, url, params, descricao, sessao=None, tentativas=GEOCODE_TENTATIVAS,
+                timeout=GEOCODE_TIMEOUT):
+    """
+    Faz um GET respeitando o limite de taxa do provedor, com novas tentativas e espera exponencial
+    para falhas temporárias (conexão, HTTP 429 e 5xx).
+
+    Retorna:
+      object: Corpo JSON da resposta.
+
+    Lança:
+      FalhaConsulta: se o provedor responder com erro ou as tentativas se esgotarem.
+    """
+    import requests
+
+    sessao = sessao or obter_sessao()
+    limitador = obter_limitador(provedor)
+    for tentativa in range(tentativas):
+        limitador.aguardar()
+        try:
+            response = sessao.get(url, params=params, timeout=timeout)
+        except requests.RequestException as e:
+            logging.warning(f"{provedor}: falha de conexão para '{descricao}' (tentativa {tentativa + 1}): {e}")
+            espera = None
+        else:
+            if response.status_code in STATUS_REPETIR:
+                espera = response.headers.get("Retry-After")
+                logging.warning(f"{provedor}: HTTP {response.status_code} para '{descricao}' (tentativa {tentativa + 1}).")
+            elif response.status_code != 200:
+                logging.error(f"{provedor}: HTTP {response.status_code} para '{descricao}'.")
+                raise FalhaConsulta(f"{provedor}: HTTP {response.status_code}")
+            else:
+                return response.json()
+        if tentativa + 1 < tentativas:
+            try:
+                espera = float(espera)
+            except (TypeError, ValueError):
+                espera = 0.5 * (2 ** tentativa) + random.uniform(0, 0.25)
+            time.sleep(espera)
+    logging.error(f"{provedor}: desistindo de '{descricao}' após {tentativas} tentativas.")
+    raise FalhaConsulta(f"{provedor}: {tentativas} tentativas sem resposta")
+
+
+def geocodificar_opencage(endereco, sessao=None, url=OPENCAGE_URL, api_key=OPENCAGE_API_KEY):
+    """
+    Consulta um endereço na API do OpenCage.
+
+    Retorna:
+      Geocodigo: Coordenadas com a confiança informada pelo OpenCage (0 a 10), ou None se não encontrado.
+
+    Lança:
+      FalhaConsulta: se a consulta falhar.
+    """
+    params = {"q": endereco, "key": api_key, "limit": 1, "no_annotations": 1,
+              "countrycode": "br", "language": "pt"}
+    data = _requisitar("opencage", url, params, endereco, sessao=sessao)
+    resultados = (data or {}).get('results') or []
+    if not resultados:
+        return None
+    location = resultados[0]['geometry']
+    return Geocodigo(location['lat'], location['lng'], "opencage", resultados[0].get('confidence'))
+
+
+def geocodificar_nominatim(endereco, sessao=None, url=NOMINATIM_URL):
+    """
+    Consulta um endereço no Nominatim (OpenStreetMap).
+
+    Retorna:
+      Geocodigo: Coordenadas com confiança derivada da relevância do resultado (0 a 10), ou None se não encontrado.
+
+    Lança:
+      FalhaConsulta: se a consulta falhar.
+    """
+    params = {"q": endereco, "format": "jsonv2", "limit": 1, "countrycodes": "br"}
+    resultados = _requisitar("nominatim", url, params, endereco, sessao=sessao)
+    if not resultados:
+        return None
+    local = resultados[0]
+    confianca = int(round(float(local.get('importance') or 0) * 10))
+    return Geocodigo(float(local['lat']), float(local['lon']), "nominatim", confianca)
+
+
+def consultar_opencage(endereco, sessao=None, url=OPENCAGE_URL, api_key=OPENCAGE_API_KEY):
+    """
+    Consulta um endereço na API do OpenCage, com limite de taxa e novas tentativas.
+
+    Retorna:
+      tuple: (latitude, longitude) ou None se o endereço não for encontrado ou a consulta falhar.
+    """
+    try:
+        geocodigo = geocodificar_opencage(endereco, sessao=sessao, url=url, api_key=api_key)
+    except FalhaConsulta:
+        return None
+    return (geocodigo.latitude, geocodigo.longitude) if geocodigo else None
+
+
+def geocodificar_lote(enderecos, consultar=consultar_opencage, max_workers=GEOCODE_WORKERS, falhas=None):
+    """
+    Geocodifica uma lista de endereços em uma única passada.
+
+    Endereços equivalentes (mesma chave canônica) são consultados uma só vez; as consultas
+    restantes rodam em paralelo, respeitando o limite de taxa do provedor.
+
+    Parâmetros:
+      enderecos (iterable): Endereços a resolver (podem conter repetições).
+      consultar (callable): Função endereço -> coordenadas (ou Geocodigo), ou None se não encontrar;
+        lança FalhaConsulta se a consulta falhar.
+      max_workers (int): Número de consultas simultâneas.
+      falhas (set): Se informado, recebe os endereços cuja consulta falhou (o resultado deles é None).
+
+    Retorna:
+      dict: endereço -> resultado de `consultar`, para cada endereço distinto informado.
+    """
+    def consultar_endereco(endereco):
+        try:
+            return consultar(endereco), False
+        except FalhaConsulta:
+            return None, True
+
+    resultados = {}
+    por_chave = {}
+    for endereco in dict.fromkeys(enderecos):
+        if endereco is not None and str(endereco).strip():
+            por_chave.setdefault(chave_endereco(endereco), []).append(endereco)
+    if not por_chave:
+        return resultados
+
+    representantes = [grupo[0] for grupo in por_chave.values()]
+    inicio = time.monotonic()
+    coordenadas = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(representantes)))) as executor:
+        for consulta in executor.map(consultar_endereco, representantes):
+            coordenadas.append(consulta)
+            emitir(len(coordenadas) / len(representantes), algoritmo="geocodificacao",
+                   iteracao=len(coordenadas), total=len(representantes))
+
+    resolvidos = falhou = 0
+    for grupo, (coords, falha) in zip(por_chave.values(), coordenadas):
+        for endereco in grupo:
+            resultados[endereco] = coords
+            if falha and falhas is not None:
+                falhas.add(endereco)
+        resolvidos += coords is not None
+        falhou += falha
+    logging.info(f"Geocodificação em lote: {len(representantes)} consultas remotas, {resolvidos} resolvidas, "
+                 f"{falhou} com falha em {time.monotonic() - inicio:.1f}s.")
+    return resultados
@@ -1,88 +1,220 @@
 """
 Módulo de geocodificação
 
-Contém funções que convertem endereços em coordenadas.
-Utiliza caching em memória com functools.lru_cache para reduzir chamadas repetitivas.
+Contém funções que convertem endereços em coordenadas por meio de uma cadeia única de provedores:
+cache → coordenadas manuais → gazetteer offline → OpenCage → Nominatim → centroide da cidade.
+
+Cada resultado registra o provedor e a confiança no cache de geocodificação. Falhas também são
+registradas (cache negativo), de modo que um endereço inválido custa uma consulta por período de
+validade, e não uma por execução. Endereços que ficaram sem resposta porque a consulta a algum
+provedor falhou (conexão, HTTP 429/5xx, chave recusada) não entram no cache e são tentados de novo
+na próxima execução.
 """
 
-import os
-import pandas as pd
-import numpy as np
 import logging
-from functools import lru_cache
-from geopy.geocoders import Nominatim
-from config import DATABASE_FOLDER, GEOCODER_USER_AGENT, OPENCAGE_API_KEY
+from cache_geocodificacao import obter_cache, Geocodigo
+from geocodificador_lote import geocodificar_lote, geocodificar_opencage, geocodificar_nominatim
+from gazetteer import obter_gazetteer
+from normalizacao_enderecos import chave_endereco, normalizar_endereco
+from config import GAZETTEER_CONFIANCA_MINIMA
+from progresso import emitir, etapa
+from metricas import registrar_cache
+from perfilamento import secao
+
+# Coordenadas manuais para endereços que nenhum provedor consegue resolver
+COORDENADAS_MANUAIS = {
+    chave_endereco("Rua Araújo Leite, 146, Centro, Piedade, São Paulo, Brasil"): (-23.71241093449893, -47.41796911054548)
+}
+
+# Provedores remotos, na ordem em que são consultados
+PROVEDORES = [geocodificar_opencage, geocodificar_nominatim]
+
+# Estado usado para localizar o centroide das cidades
+UF_PADRAO = "SP"
+
+PROVEDOR_MANUAL = "manual"
+PROVEDOR_CENTROIDE = "centroide_cidade"
+PROVEDOR_NENHUM = "nenhum"
+CONFIANCA_MANUAL = 10
+CONFIANCA_CENTROIDE = 1
+
+def extrair_cidade(endereco):
+    """
+    Retorna a cidade de um endereço no formato "logradouro, bairro, cidade" (última parte), ou None.
+    """
+    partes = [parte.strip() for parte in str(endereco).split(",") if parte.strip()]
+    return partes[-1] if len(partes) > 1 else None
+
+def _consultar_provedores(enderecos, falhas):
+    """
+    Passa os endereços pelos provedores remotos em sequência; cada provedor recebe apenas
+    os endereços que os anteriores não resolveram.
+    
+    Parâmetros:
+      enderecos (list): Endereços a resolver.
+      falhas (set): Recebe os endereços não resolvidos em que a consulta a algum provedor falhou.
+    
+    Retorna:
+      dict: endereço -> Geocodigo, somente para os resolvidos.
+    """
+    resolvidos = {}
+    com_falha = set()
+    faltantes = list(enderecos)
+    for i, provedor in enumerate(PROVEDORES):
+        if not faltantes:
+            break
+        with etapa(inicio=i / len(PROVEDORES), fim=(i + 1) / len(PROVEDORES)):
+            resultados = geocodificar_lote(faltantes, consultar=provedor, falhas=com_falha)
+        for endereco in faltantes:
+            if resultados.get(endereco) is not None:
+                resolvidos[endereco] = resultados[endereco]
+        faltantes = [e for e in faltantes if e not in resolvidos]
+    falhas.update(com_falha.difference(resolvidos))
+    return resolvidos
+
+def _consultar_gazetteer(enderecos):
+    """
+    Resolve offline os endereços que o gazetteer localiza com a confiança mínima configurada.
+    
+    Retorna:
+      dict: endereço -> Geocodigo, somente para os resolvidos.
+    """
+    gazetteer = obter_gazetteer()
+    if not len(gazetteer):
+        return {}
+    resolvidos = {}
+    for endereco in enderecos:
+        geocodigo = gazetteer.geocodificar(endereco)
+        if geocodigo is not None and geocodigo.confianca >= GAZETTEER_CONFIANCA_MINIMA:
+            resolvidos[endereco] = geocodigo
+    return resolvidos
+
+def _centroides_cidades(enderecos, cache, falhas):
+    """
+    Localiza o centroide da cidade de cada endereço: primeiro no gazetteer offline e,
+    na falta dele, consultando "cidade, UF, Brasil" nos provedores (também em cache).
+    
+    Parâmetros:
+      enderecos (list): Endereços sem coordenadas.
+      cache (CacheGeocodificacao): Cache onde os centroides consultados são registrados.
+      falhas (set): Recebe os endereços cuja cidade ficou sem resposta por falha de consulta.
+    
+    Retorna:
+      dict: endereço -> Geocodigo do centroide, somente para os resolvidos.
+    """
+    gazetteer = obter_gazetteer()
+    resultado = {}
+    consultas = {}
+    for endereco in enderecos:
+        cidade = extrair_cidade(endereco)
+        if not cidade:
+            continue
+        centroide = gazetteer.cidades.get(normalizar_endereco(cidade))
+        if centroide is not None:
+            resultado[endereco] = Geocodigo(centroide[0], centroide[1], PROVEDOR_CENTROIDE, CONFIANCA_CENTROIDE)
+        else:
+            consultas[endereco] = f"{cidade}, {UF_PADRAO}, Brasil"
+    if not consultas:
+        return resultado
 
-logging.basicConfig(level=logging.INFO, filename="geocoding.log", filemode="a",
-                    format="%(asctime)s - %(levelname)s - %(message)s")
+    cidades = list(dict.fromkeys(consultas.values()))
+    centroides = cache.consultar_lote(cidades)
+    pendentes = [c for c in cidades if c not in centroides]
+    cidades_com_falha = set()
+    if pendentes:
+        novos = _consultar_provedores(pendentes, cidades_com_falha)
+        for cidade in pendentes:
+            if cidade not in cidades_com_falha:
+                novos.setdefault(cidade, Geocodigo(None, None, PROVEDOR_NENHUM, 0))
+        cache.registrar_lote(novos)
+        centroides.update(novos)
 
-geolocator = Nominatim(user_agent=GEOCODER_USER_AGENT)
+    for endereco, cidade in consultas.items():
+        centroide = centroides.get(cidade)
+        if centroide is not None and centroide.latitude is not None:
+            resultado[endereco] = Geocodigo(centroide.latitude, centroide.longitude,
+                                            PROVEDOR_CENTROIDE, CONFIANCA_CENTROIDE)
+        elif cidade in cidades_com_falha:
+            falhas.add(endereco)
+    return resultado
+
+def geocodificar_enderecos(enderecos):
+    """
+    Resolve vários endereços pela cadeia de provedores, registrando no cache os resultados
+    novos, inclusive os endereços que todos os provedores responderam não encontrar. Os que
+    ficaram sem resposta por falha de consulta são devolvidos, mas não registrados.
+    
+    Parâmetros:
+      enderecos (iterable): Endereços a resolver (podem conter repetições).
+    
+    Retorna:
+      dict: endereço -> Geocodigo; latitude e longitude são None quando nenhuma etapa resolveu.
+    """
+    cache = obter_cache()
+    enderecos = [e for e in dict.fromkeys(enderecos) if e is not None and str(e).strip()]
+    resultados = cache.consultar_lote(enderecos)
+    faltantes = [e for e in enderecos if e not in resultados]
+    registrar_cache("geocodificacao", acertos=len(resultados), faltas=len(faltantes))
+    if not faltantes:
+        return resultados
+
+    novos = {}
+    falhas = set()
+    for endereco in faltantes:
+        manual = COORDENADAS_MANUAIS.get(chave_endereco(endereco))
+        if manual:
+            novos[endereco] = Geocodigo(manual[0], manual[1], PROVEDOR_MANUAL, CONFIANCA_MANUAL)
+    novos.update(_consultar_gazetteer([e for e in faltantes if e not in novos]))
+    emitir(0.1, algoritmo="geocodificacao", do_cache=len(enderecos) - len(faltantes), faltantes=len(faltantes) - len(novos))
+    with etapa(inicio=0.1, fim=0.95):
+        novos.update(_consultar_provedores([e for e in faltantes if e not in novos], falhas))
+    with etapa(inicio=0.95, fim=1.0):
+        novos.update(_centroides_cidades([e for e in faltantes if e not in novos], cache, falhas))
+    for endereco in faltantes:
+        novos.setdefault(endereco, Geocodigo(None, None, PROVEDOR_NENHUM, 0))
+
+    # Centroide ou "nenhum" só vão ao cache quando os provedores de fato responderam vazio
+    cache.registrar_lote({e: g for e, g in novos.items() if e not in falhas})
+    if falhas:
+        logging.warning(f"Geocodificação: {len(falhas)} endereços sem resposta por falha de consulta; "
+                        f"não registrados no cache.")
+    resultados.update(novos)
+    por_provedor = {}
+    for geocodigo in novos.values():
+        por_provedor[geocodigo.provedor] = por_provedor.get(geocodigo.provedor, 0) + 1
+    logging.info(f"Geocodificação: {len(enderecos) - len(faltantes)} endereços do cache; novos por provedor: {por_provedor}.")
+    emitir(1.0, algoritmo="geocodificacao", do_cache=len(enderecos) - len(faltantes), por_provedor=por_provedor)
+    return resultados
 
-@lru_cache(maxsize=128)
 def geocode_endereco(endereco):
     """
-    Converte um endereço em (latitude, longitude).
+    Converte um endereço em (latitude, longitude) pela cadeia de provedores.
     
     Retorna:
       tuple: (latitude, longitude) ou None se não conseguir geocodificar.
     """
-    try:
-        local = geolocator.geocode(endereco)
-        if local:
-            return (local.latitude, local.longitude)
-    except Exception as e:
-        logging.error(f"Erro na geocodificação do endereço '{endereco}': {e}")
-    return None
-
-def converter_enderecos(df, endereco_coluna="Endereço Completo", cache_filename="coordenadas_cache.xlsx"):
+    geocodigo = geocodificar_enderecos([endereco]).get(endereco)
+    if geocodigo is None or geocodigo.latitude is None:
+        return None
+    return (geocodigo.latitude, geocodigo.longitude)
+
+@secao("converter_enderecos")
+def converter_enderecos(df, endereco_coluna="Endereço Completo"):
     """
     Atualiza o DataFrame com as colunas 'Latitude' e 'Longitude' para cada endereço.
     
-    Utiliza um arquivo de cache para evitar geocodificações repetitivas.
-    Atualiza o cache no disco somente se houver novas entradas.
+    Os endereços distintos são resolvidos de uma só vez pela cadeia de provedores
+    (cache primeiro); somente os ausentes do cache geram consultas.
     
     Parâmetros:
       df (DataFrame): DataFrame com os endereços.
       endereco_coluna (str): Nome da coluna de endereços.
-      cache_filename (str): Nome do arquivo de cache.
     
     Retorna:
       DataFrame: com colunas 'Latitude' e 'Longitude' populadas.
     """
-    cache_file = os.path.join(DATABASE_FOLDER, cache_filename)
-    
-    # Tenta carregar cache a partir do disco
-    try:
-        cache_df = pd.read_excel(cache_file, engine="openpyxl")
-        cache = dict(zip(cache_df['Endereço'], zip(cache_df['Latitude'], cache_df['Longitude'])))
-    except Exception as e:
-        logging.info(f"Cache não encontrado ou erro na leitura: {e}")
-        cache = {}
-    
-    latitudes = []
-    longitudes = []
-    for endereco in df[endereco_coluna]:
-        if endereco in cache:
-            lat, lon = cache[endereco]
-        else:
-            latlon = geocode_endereco(endereco)
-            if latlon is None:
-                lat, lon = (np.nan, np.nan)
-            else:
-                lat, lon = latlon
-            cache[endereco] = (lat, lon)
-        latitudes.append(lat)
-        longitudes.append(lon)
-
-    df['Latitude'] = latitudes
-    df['Longitude'] = longitudes
-
-    try:
-        cache_df = pd.DataFrame(list(cache.items()), columns=['Endereço', 'Coordenadas'])
-        cache_df[['Latitude', 'Longitude']] = pd.DataFrame(cache_df['Coordenadas'].tolist(), index=cache_df.index)
-        cache_df.drop(columns=['Coordenadas'], inplace=True)
-        cache_df.to_excel(cache_file, index=False)
-    except Exception as e:
-        logging.error(f"Erro ao atualizar o cache: {e}")
-    
+    resultados = geocodificar_enderecos(df[endereco_coluna].dropna().unique().tolist())
+    geocodigos = df[endereco_coluna].map(resultados)
+    df['Latitude'] = geocodigos.map(lambda g: g.latitude if isinstance(g, Geocodigo) else None).astype(float)
+    df['Longitude'] = geocodigos.map(lambda g: g.longitude if isinstance(g, Geocodigo) else None).astype(float)
     return df
\ No newline at end of file
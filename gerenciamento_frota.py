@@ -1,12 +1,14 @@
 import streamlit as st
 import pandas as pd
 
+from armazenamento import carregar_dataset, salvar_dataset
+
 def cadastrar_caminhoes():
     st.title("Cadastro de Caminhões da Frota")
     
     # Tenta carregar a frota existente ou cria uma nova
     try:
-        caminhoes_df = pd.read_excel("database/caminhoes_frota.xlsx", engine='openpyxl')
+        caminhoes_df = carregar_dataset("frota")
     except FileNotFoundError:
         caminhoes_df = pd.DataFrame(columns=[
             'Placa', 'Transportador', 'Descrição Veículo', 'Capac. Cx', 'Capac. Kg', 'Disponível'
@@ -29,19 +31,19 @@ def cadastrar_caminhoes():
         
         if st.button("Carregar Frota"):
             caminhoes_df = pd.concat([caminhoes_df, novo_caminhoes_df], ignore_index=True)
-            caminhoes_df.to_excel("database/caminhoes_frota.xlsx", index=False)
+            salvar_dataset("frota", caminhoes_df)
             st.success("Frota carregada com sucesso!")
     
     if st.button("Limpar Frota"):
         caminhoes_df = pd.DataFrame(columns=[
             'Placa', 'Transportador', 'Descrição Veículo', 'Capac. Cx', 'Capac. Kg', 'Disponível'
         ])
-        caminhoes_df.to_excel("database/caminhoes_frota.xlsx", index=False)
+        salvar_dataset("frota", caminhoes_df)
         st.success("Frota limpa com sucesso!")
     
     st.subheader("Caminhões Cadastrados")
     edited_caminhoes_df = st.data_editor(caminhoes_df, num_rows="dynamic")
     
     if st.button("Salvar Alterações"):
-        edited_caminhoes_df.to_excel("database/caminhoes_frota.xlsx", index=False)
+        salvar_dataset("frota", edited_caminhoes_df)
         st.success("Alterações salvas com sucesso!")
\ No newline at end of file
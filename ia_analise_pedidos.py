@@ -1,115 +1,175 @@
-import requests
-import streamlit as st
+import sys
 import random
-import networkx as nx
-from itertools import permutations
-from geopy.distance import geodesic
-from sklearn.cluster import KMeans, DBSCAN
-import folium
 from config import endereco_partida, endereco_partida_coords
-import math
+from geocodificador_lote import consultar_opencage
+from geocoding import geocodificar_enderecos
 import pandas as pd
 import logging
+import time
 import numpy as np
+from instancia import RoutingInstance
+from progresso import emitir, ativo as progresso_ativo
+from metricas import cronometrar, registrar_solver
+from perfilamento import secao
+
+# streamlit, networkx, geopy, sklearn e folium (mapas) são importados no primeiro uso: quem só
+# aloca ou resolve rotas (API, linha de comando, processos de trabalho) não paga por eles
+
+def _avisar(mensagem):
+    """
+    Registra o aviso no log e, quando o Streamlit já foi carregado (páginas da interface), também o exibe.
+    """
+    logging.warning(mensagem)
+    st = sys.modules.get("streamlit")
+    if st is not None:
+        st.error(mensagem)
 
 def obter_coordenadas_opencage(endereco):
     """
-    Obtém as coordenadas de um endereço utilizando a API do OpenCage.
+    Obtém as coordenadas de um endereço utilizando a API do OpenCage
+    (sessão HTTP compartilhada, com limite de taxa e novas tentativas).
     """
     try:
-        api_key = "6f522c67add14152926990afbe127384"  # Substitua pela sua chave de API
-        url = f"https://api.opencagedata.com/geocode/v1/json?q={endereco}&key={api_key}"
-        response = requests.get(url)
-        data = response.json()
-        if 'status' in data and data['status']['code'] == 200 and 'results' in data:
-            location = data['results'][0]['geometry']
-            return (location['lat'], location['lng'])
-        else:
-            st.error(f"Não foi possível obter as coordenadas para o endereço: {endereco}.")
-            return None
+        coords = consultar_opencage(endereco)
+        if coords is None:
+            _avisar(f"Não foi possível obter as coordenadas para o endereço: {endereco}.")
+        return coords
     except Exception as e:
-        st.error(f"Erro ao tentar obter as coordenadas: {e}")
+        _avisar(f"Erro ao tentar obter as coordenadas: {e}")
         return None
 
 def obter_coordenadas_com_fallback(endereco, coordenadas_salvas):
     """
-    Retorna as coordenadas salvas para um endereço ou tenta obtê-las via OpenCage.
-    Se não obtiver, utiliza um dicionário de coordenadas manuais pré-definido.
+    Retorna as coordenadas salvas para um endereço ou tenta obtê-las pela cadeia de provedores
+    (cache, coordenadas manuais, OpenCage, Nominatim e centroide da cidade).
     """
     if endereco in coordenadas_salvas:
         return coordenadas_salvas[endereco]
     
-    coords = obter_coordenadas_opencage(endereco)
-    if coords is None:
-        # Exemplo de coordenadas manuais para endereços específicos
-        coordenadas_manuais = {
-            "Rua Araújo Leite, 146, Centro, Piedade, São Paulo, Brasil": (-23.71241093449893, -47.41796911054548)
-        }
-        coords = coordenadas_manuais.get(endereco, (None, None))
+    geocodigo = geocodificar_enderecos([endereco]).get(endereco)
+    coords = (geocodigo.latitude, geocodigo.longitude) if geocodigo is not None else (None, None)
+    if coords == (None, None):
+        _avisar(f"Não foi possível obter as coordenadas para o endereço: {endereco}.")
     
-    if coords:
-        coordenadas_salvas[endereco] = coords
+    coordenadas_salvas[endereco] = coords
     return coords
 
+def obter_coordenadas_lote(enderecos, coordenadas_salvas):
+    """
+    Obtém latitude e longitude de uma coluna inteira de endereços em uma única passada.
+    
+    Os endereços ainda não salvos são deduplicados e resolvidos pela cadeia de provedores
+    (consultas remotas em paralelo). coordenadas_salvas é atualizado.
+    
+    Parâmetros:
+      enderecos (Series): Endereços completos dos pedidos.
+      coordenadas_salvas (dict): endereço -> (latitude, longitude) já conhecidos.
+    
+    Retorna:
+      tuple: (Series de latitudes, Series de longitudes), alinhadas a `enderecos`.
+    """
+    faltantes = [e for e in enderecos.dropna().unique() if e not in coordenadas_salvas]
+    if faltantes:
+        resultados = geocodificar_enderecos(faltantes)
+        nao_encontrados = 0
+        for endereco in faltantes:
+            geocodigo = resultados.get(endereco)
+            coords = (geocodigo.latitude, geocodigo.longitude) if geocodigo is not None else (None, None)
+            nao_encontrados += coords == (None, None)
+            coordenadas_salvas[endereco] = coords
+        if nao_encontrados:
+            _avisar(f"Não foi possível obter as coordenadas de {nao_encontrados} endereço(s).")
+    coords = enderecos.map(coordenadas_salvas)
+    latitudes = coords.map(lambda c: c[0] if isinstance(c, tuple) else None).astype(float)
+    longitudes = coords.map(lambda c: c[1] if isinstance(c, tuple) else None).astype(float)
+    return latitudes, longitudes
+
 def calcular_distancia(coords_1, coords_2):
     """
     Calcula a distância em metros entre duas coordenadas.
     """
+    from geopy.distance import geodesic
+
     if coords_1 and coords_2:
         return geodesic(coords_1, coords_2).meters
     return None
 
-def criar_grafo_tsp(pedidos_df):
+def _instancia(pedidos, caminhoes_df=None):
+    if isinstance(pedidos, RoutingInstance):
+        return pedidos
+    return RoutingInstance.de_dataframes(pedidos, caminhoes_df)
+
+def criar_grafo_tsp(pedidos):
     """
     Cria um grafo (usando NetworkX) para o problema do caixeiro viajante (TSP).
     O nó de partida é definido em config e os demais nós são os endereços únicos da planilha.
+    As distâncias vêm da matriz de distâncias da RoutingInstance (haversine, em metros).
+
+    Parâmetros:
+      pedidos (RoutingInstance ou DataFrame): Pedidos a visitar.
     """
+    import networkx as nx
+
+    instancia = _instancia(pedidos)
+    nos = instancia.nos_rota()
+    distancias = instancia.matriz_distancias()
+    lat = [instancia.deposito[0]] + instancia.latitudes_enderecos.tolist()
+    lon = [instancia.deposito[1]] + instancia.longitudes_enderecos.tolist()
     G = nx.Graph()
-    enderecos = pedidos_df['Endereço Completo'].unique()
-    # Nó de partida
-    G.add_node(endereco_partida, pos=endereco_partida_coords)
-    for endereco in enderecos:
-        coords = (
-            pedidos_df.loc[pedidos_df['Endereço Completo'] == endereco, 'Latitude'].values[0],
-            pedidos_df.loc[pedidos_df['Endereço Completo'] == endereco, 'Longitude'].values[0]
-        )
-        G.add_node(endereco, pos=coords)
-    for (end1, end2) in permutations([endereco_partida] + list(enderecos), 2):
-        distancia = calcular_distancia(G.nodes[end1]['pos'], G.nodes[end2]['pos'])
-        if distancia is not None:
-            G.add_edge(end1, end2, weight=distancia)
+    for no, coords in zip(nos, zip(lat, lon)):
+        G.add_node(no, pos=coords)
+    origens, destinos = np.triu_indices(len(nos), k=1)
+    validas = ~np.isnan(distancias[origens, destinos])
+    G.add_weighted_edges_from(zip([nos[i] for i in origens[validas]], [nos[j] for j in destinos[validas]],
+                                  distancias[origens[validas], destinos[validas]].tolist()))
     return G
 
+@secao("resolver_tsp_genetico")
 def resolver_tsp_genetico(G):
     """
     Resolve o TSP utilizando um algoritmo genético simples.
-    Retorna a melhor rota encontrada e sua distância total.
+    Retorna a melhor rota encontrada, a partir do ponto de partida (nó 0), e sua distância total
+    (que inclui a volta ao ponto de partida).
+
+    Parâmetros:
+      G (RoutingInstance ou nx.Graph): Instância (usa a matriz de distâncias diretamente)
+                                       ou grafo criado por criar_grafo_tsp.
     """
+    if isinstance(G, RoutingInstance):
+        nodes = G.nos_rota()
+        distancias = G.matriz_distancias()
+    else:
+        import networkx as nx
+
+        nodes = list(G.nodes)
+        distancias = nx.to_numpy_array(G, nodelist=nodes, weight='weight')
+    size = len(nodes)
+    if size <= 2:
+        rota = list(range(size))
+        return [nodes[i] for i in rota], float(distancias[rota, np.roll(rota, -1)].sum()) if size else 0.0
+
     def fitness(route):
-        return sum(G.edges[route[i], route[i+1]]['weight'] for i in range(len(route) - 1)) + \
-               G.edges[route[-1], route[0]]['weight']
+        return distancias[route, np.roll(route, -1)].sum()
 
     def mutate(route):
-        i, j = random.sample(range(len(route)), 2)
+        i, j = random.sample(range(size), 2)
         route[i], route[j] = route[j], route[i]
         return route
 
     def crossover(route1, route2):
-        size = len(route1)
         start, end = sorted(random.sample(range(size), 2))
-        child = [None] * size
-        child[start:end] = route1[start:end]
-        pointer = 0
-        for i in range(size):
-            if route2[i] not in child:
-                while child[pointer] is not None:
-                    pointer += 1
-                child[pointer] = route2[i]
-        return child
+        usados = np.zeros(size, dtype=bool)
+        usados[route1[start:end]] = True
+        restantes = route2[~usados[route2]]
+        return np.concatenate((restantes[:start], route1[start:end], restantes[start:]))
 
     def genetic_algorithm(population, generations=1000, mutation_rate=0.01):
-        for _ in range(generations):
-            population = sorted(population, key=lambda route: fitness(route))
+        inicio = time.perf_counter()
+        for generation in range(generations):
+            population = sorted(population, key=fitness)
+            if progresso_ativo():
+                emitir(generation / generations, algoritmo="tsp", iteracao=generation, total=generations,
+                       melhor_custo=float(fitness(population[0])))
             next_generation = population[:2]
             for _ in range(len(population) // 2 - 1):
                 parents = random.sample(population[:10], 2)
@@ -118,22 +178,31 @@ def resolver_tsp_genetico(G):
                     child = mutate(child)
                 next_generation.append(child)
             population = next_generation
-        return population[0], fitness(population[0])
+        melhor_distancia = float(fitness(population[0]))
+        emitir(1.0, algoritmo="tsp", iteracao=generations, total=generations, melhor_custo=melhor_distancia)
+        registrar_solver("tsp", generations, time.perf_counter() - inicio, melhor_distancia)
+        return population[0], melhor_distancia
 
-    nodes = list(G.nodes)
-    population = [random.sample(nodes, len(nodes)) for _ in range(100)]
+    population = [np.random.permutation(size) for _ in range(100)]
     best_route, best_distance = genetic_algorithm(population)
-    return best_route, best_distance
+    # A rota é um ciclo: gira para começar no ponto de partida, sem alterar a distância
+    best_route = np.roll(best_route, -int(np.flatnonzero(best_route == 0)[0]))
+    return [nodes[i] for i in best_route], best_distance
 
-def resolver_vrp(pedidos_df, caminhoes_df):
+def resolver_vrp(pedidos, caminhoes_df=None):
     """
     Resolve o problema do VRP utilizando OR-Tools.
     
-    O algoritmo constrói uma matriz de distâncias com base nas coordenadas dos pedidos.
+    O algoritmo usa a matriz de distâncias (em metros) da RoutingInstance, com o endereço de
+    partida como depósito e os endereços distintos dos pedidos como nós.
     O número de veículos é determinado pelo número de caminhões disponíveis.
     
+    Parâmetros:
+      pedidos (RoutingInstance ou DataFrame): Instância com pedidos e caminhões, ou DataFrame
+                                              de pedidos acompanhado de caminhoes_df.
+
     Retorna:
-      dict: Rotas para cada veículo, ou
+      dict: Rotas (lista de endereços) para cada veículo, ou
       str: Mensagem de erro se a solução não for encontrada ou se OR-Tools não estiver instalado.
     """
     try:
@@ -141,20 +210,15 @@ def resolver_vrp(pedidos_df, caminhoes_df):
     except ImportError:
         return "Erro: OR-Tools não está instalado. Instale com: pip3 install ortools"
 
-    # Obtenha as coordenadas dos pedidos
-    coords = list(zip(pedidos_df['Latitude'], pedidos_df['Longitude']))
-    if not coords:
+    instancia = _instancia(pedidos, caminhoes_df)
+    if instancia.num_pedidos == 0:
         return "Sem pedidos para roteirização."
 
-    depot = 0  # Usando o primeiro pedido (ou defina um depot específico)
-
-    def calcular_dist(i, j):
-        return int(math.sqrt((coords[i][0] - coords[j][0])**2 + (coords[i][1] - coords[j][1])**2) * 1000)
+    depot = 0  # Endereço de partida
+    distance_matrix = np.nan_to_num(instancia.matriz_distancias()).round().astype(np.int64).tolist()
+    N = len(distance_matrix)
 
-    N = len(coords)
-    distance_matrix = [[calcular_dist(i, j) for j in range(N)] for i in range(N)]
-
-    num_vehicles = len(pedidos_df)
+    num_vehicles = instancia.num_caminhoes
     if num_vehicles < 1:
         return "Nenhum caminhão disponível para a roteirização."
 
@@ -174,62 +238,91 @@ def resolver_vrp(pedidos_df, caminhoes_df):
     search_parameters = pywrapcp.DefaultRoutingSearchParameters()
     search_parameters.first_solution_strategy = (routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
 
+    # Emite um evento a cada solução melhor encontrada pela busca
+    solucoes = 0
+    def ao_encontrar_solucao():
+        nonlocal solucoes
+        solucoes += 1
+        emitir(None, algoritmo="vrp", iteracao=solucoes, melhor_custo=float(routing.CostVar().Value()))
+    routing.AddAtSolutionCallback(ao_encontrar_solucao)
+
+    emitir(0.0, algoritmo="vrp")
+    inicio = time.perf_counter()
     solution = routing.SolveWithParameters(search_parameters)
+    registrar_solver("vrp", solucoes, time.perf_counter() - inicio,
+                     solution.ObjectiveValue() if solution else None)
+    emitir(1.0, algoritmo="vrp", iteracao=solucoes,
+           melhor_custo=float(solution.ObjectiveValue()) if solution else None)
     if solution:
+        nos = instancia.nos_rota()
         routes = {}
         for vehicle_id in range(num_vehicles):
             index = routing.Start(vehicle_id)
             route = []
             while not routing.IsEnd(index):
                 node = manager.IndexToNode(index)
-                route.append(pedidos_df.iloc[node]['Endereço Completo'])
+                if node != depot:
+                    route.append(nos[node])
                 index = solution.Value(routing.NextVar(index))
             routes[f"Veículo {vehicle_id + 1}"] = route
         return routes
     else:
         return "Não foi encontrada solução para o problema VRP."
 
+@cronometrar("alocacao")
+@secao("otimizar_aproveitamento_frota")
 def otimizar_aproveitamento_frota(pedidos_df, caminhoes_df, percentual_frota, max_pedidos, n_clusters):
     """
-    Otimiza a alocação dos pedidos aos caminhões disponíveis, agrupando os pedidos em regiões,
-    atribuindo números de carga e placas.
+    Otimiza a alocação dos pedidos aos caminhões disponíveis, agrupando os pedidos em regiões
+    (quando ainda não há a coluna 'Regiao'), atribuindo números de carga e placas.
+
+    Cada caminhão recebe, em ordem aleatória, até `max_pedidos` pedidos ainda não alocados da região
+    que caibam na sua capacidade restante. Pesos e capacidades vêm dos arrays da RoutingInstance;
+    as colunas 'Carga' e 'Placa' são gravadas no DataFrame uma única vez, ao final.
     """
-    # Inicializa as colunas
-    pedidos_df['Carga'] = 0
-    pedidos_df['Placa'] = ""
-    carga_numero = 1
-    
-    # Ajusta a capacidade dos caminhões conforme o percentual informado
-    caminhoes_df['Capac. Kg'] *= (percentual_frota / 100)
-    caminhoes_df['Capac. Cx'] *= (percentual_frota / 100)
     # Filtra somente caminhões com disponibilidade "Ativo"
     caminhoes_df = caminhoes_df[caminhoes_df['Disponível'] == 'Ativo']
     
-    # Agrupa os pedidos em regiões
-    pedidos_df = agrupar_por_regiao(pedidos_df, n_clusters=n_clusters)
-    
-    for regiao in pedidos_df['Regiao'].unique():
-        pedidos_regiao = pedidos_df[pedidos_df['Regiao'] == regiao]
-        for _, caminhao in caminhoes_df.iterrows():
-            capacidade_peso = caminhao['Capac. Kg']
-            capacidade_caixas = caminhao['Capac. Cx']
-            pedidos_alocados = pedidos_regiao[
-                (pedidos_regiao['Peso dos Itens'] <= capacidade_peso) &
-                (pedidos_regiao['Qtde. dos Itens'] <= capacidade_caixas)
-            ]
-            pedidos_alocados = pedidos_alocados.sample(n=min(max_pedidos, len(pedidos_alocados)))
-            if not pedidos_alocados.empty:
-                pedidos_df.loc[pedidos_alocados.index, 'Carga'] = carga_numero
-                pedidos_df.loc[pedidos_alocados.index, 'Placa'] = caminhao['Placa']
-                capacidade_peso -= pedidos_alocados['Peso dos Itens'].sum()
-                capacidade_caixas -= pedidos_alocados['Qtde. dos Itens'].sum()
+    # Agrupa os pedidos em regiões, se ainda não vierem agrupados (o Dashboard agrupa antes)
+    if 'Regiao' not in pedidos_df.columns:
+        pedidos_df = agrupar_por_regiao(pedidos_df, n_clusters=n_clusters)
+    instancia = RoutingInstance.de_dataframes(pedidos_df, caminhoes_df)
+
+    # Ajusta a capacidade dos caminhões conforme o percentual informado
+    capacidades_kg = instancia.capacidades_kg * (percentual_frota / 100)
+    capacidades_cx = instancia.capacidades_cx * (percentual_frota / 100)
+
+    cargas = np.zeros(instancia.num_pedidos, dtype=np.int32)
+    placas = np.full(instancia.num_pedidos, "", dtype=object)
+    regioes = pd.factorize(pedidos_df['Regiao'])[0]
+    carga_numero = 1
+
+    for regiao in np.unique(regioes):
+        da_regiao = regioes == regiao
+        for caminhao in range(instancia.num_caminhoes):
+            candidatos = np.flatnonzero(da_regiao & (cargas == 0)
+                                        & (instancia.pesos <= capacidades_kg[caminhao])
+                                        & (instancia.caixas <= capacidades_cx[caminhao]))
+            if candidatos.size == 0:
+                continue
+            candidatos = np.random.permutation(candidatos)
+            cabem = ((np.cumsum(instancia.pesos[candidatos]) <= capacidades_kg[caminhao])
+                     & (np.cumsum(instancia.caixas[candidatos]) <= capacidades_cx[caminhao]))
+            alocados = candidatos[cabem][:max_pedidos]
+            if alocados.size:
+                cargas[alocados] = carga_numero
+                placas[alocados] = instancia.placas[caminhao]
                 carga_numero += 1
-    
-    if pedidos_df['Placa'].isnull().any() or pedidos_df['Carga'].isnull().any():
-        st.error("Não foi possível atribuir placas ou números de carga a alguns pedidos.")
+
+    pedidos_df['Carga'] = cargas
+    pedidos_df['Placa'] = placas
+    if (cargas == 0).any():
+        _avisar(f"Não foi possível atribuir placas ou números de carga a {int((cargas == 0).sum())} pedidos.")
     
     return pedidos_df
 
+@cronometrar("agrupamento")
+@secao("agrupar_por_regiao")
 def agrupar_por_regiao(pedidos_df, metodo='kmeans', n_clusters=3, eps=0.01, min_samples=2):
     """
     Agrupa os pedidos em regiões utilizando o nome da cidade e, dentro de cada cidade,
@@ -245,6 +338,8 @@ def agrupar_por_regiao(pedidos_df, metodo='kmeans', n_clusters=3, eps=0.01, min_
     Returns:
         pd.DataFrame: DataFrame com a coluna 'Regiao' indicando o cluster de cada pedido.
     """
+    from sklearn.cluster import KMeans, DBSCAN
+
     if pedidos_df.empty:
         raise ValueError("O DataFrame de pedidos está vazio.")
 
@@ -256,7 +351,7 @@ def agrupar_por_regiao(pedidos_df, metodo='kmeans', n_clusters=3, eps=0.01, min_
     regiao_id = 0
 
     # Agrupa os pedidos por cidade
-    for cidade, grupo_cidade in pedidos_df.groupby('Cidade de Entrega'):
+    for cidade, grupo_cidade in pedidos_df.groupby('Cidade de Entrega', observed=True):
         coords = grupo_cidade[['Latitude', 'Longitude']].values
 
         if metodo == 'kmeans':
@@ -277,21 +372,11 @@ def agrupar_por_regiao(pedidos_df, metodo='kmeans', n_clusters=3, eps=0.01, min_
 
     return pedidos_df
 
-def criar_mapa(pedidos_df):
+def criar_mapa(pedidos_df, cor_por="Placa"):
     """
-    Cria e retorna um mapa Folium com marcadores para cada pedido e para o endereço de partida.
+    Cria e retorna um mapa Folium com os pedidos (agrupados no cliente e coloridos por Placa ou Regiao),
+    as rotas por caminhão e o endereço de partida.
     """
-    mapa = folium.Map(location=endereco_partida_coords, zoom_start=12)
-    for _, row in pedidos_df.iterrows():
-        popup_text = f"<b>Placa: {row['Placa']}</b><br>Endereço: {row['Endereço Completo']}"
-        folium.Marker(
-            location=[row['Latitude'], row['Longitude']],
-            popup=popup_text,
-            icon=folium.Icon(color='blue')
-        ).add_to(mapa)
-    folium.Marker(
-        location=endereco_partida_coords,
-        popup="Endereço de Partida",
-        icon=folium.Icon(color='red')
-    ).add_to(mapa)
-    return mapa
+    from mapas import gerar_mapa
+
+    return gerar_mapa(pedidos_df, cor_por=cor_por, deposito=endereco_partida_coords)
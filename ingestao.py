@@ -0,0 +1,176 @@
+"""
+Módulo de ingestão de planilhas
+
+Lê planilhas de pedidos e caminhões em modo somente leitura (openpyxl read_only),
+linha a linha, extraindo apenas as colunas usadas pelo sistema. As linhas são acumuladas
+em lotes, convertidas de uma vez para os tipos do esquema (esquema.py) e gravadas no
+armazenamento em Parquet, de modo que o consumo de memória não depende do tamanho do arquivo.
+"""
+
+import os
+import logging
+from collections import namedtuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from armazenamento import caminho_dataset
+from esquema import aplicar_esquema, tipo_arrow
+
+# Colunas de cada conjunto: (obrigatórias, opcionais). As demais colunas da planilha são ignoradas.
+COLUNAS_PEDIDOS = (
+    ["Endereço de Entrega", "Bairro de Entrega", "Cidade de Entrega"],
+    ["Nº Pedido", "Cód. Cliente", "Nome Cliente", "Grupo Cliente", "Placa", "Nº Carga", "N° Carga",
+     "Qtde. dos Itens", "Peso dos Itens", "Latitude", "Longitude"],
+)
+COLUNAS_CAMINHOES = (
+    ["Placa", "Capac. Kg", "Capac. Cx", "Disponível"],
+    ["Transportador", "Descrição Veículo"],
+)
+ESPECIFICACOES = {
+    "pedidos": COLUNAS_PEDIDOS,
+    "ia": COLUNAS_PEDIDOS,
+    "caminhoes": COLUNAS_CAMINHOES,
+    "frota": COLUNAS_CAMINHOES,
+}
+
+TAMANHO_LOTE = 10000
+
+# Quantidade máxima de mensagens de erro guardadas no resumo
+MAX_ERROS_REPORTADOS = 50
+
+ResumoIngestao = namedtuple("ResumoIngestao", ["linhas_validas", "linhas_invalidas", "erros"])
+
+
+def _esquema_arrow(colunas):
+    """
+    Esquema Arrow fixo para as colunas, garantindo o mesmo tipo em todos os lotes.
+    """
+    return pa.schema([pa.field(coluna, tipo_arrow(coluna)) for coluna in colunas])
+
+
+def _validar_linha(valores, colunas, obrigatorias):
+    """
+    Verifica as colunas obrigatórias de uma linha; a conversão de tipos é feita por lote.
+
+    Retorna:
+      tuple: (linha, mensagem de erro ou None).
+    """
+    linha = {}
+    for coluna, valor in zip(colunas, valores):
+        if isinstance(valor, str):
+            valor = valor.strip() or None
+        if valor is None and coluna in obrigatorias:
+            return None, f"coluna '{coluna}' vazia"
+        linha[coluna] = valor
+    return linha, None
+
+
+def ingerir_planilha(arquivo, nome_dataset, tamanho_lote=TAMANHO_LOTE, progresso=None, destino=None):
+    """
+    Converte uma planilha Excel no conjunto de dados `nome_dataset`, em fluxo.
+
+    Parâmetros:
+      arquivo (str ou arquivo): Caminho ou arquivo enviado (.xlsx/.xlsm).
+      nome_dataset (str): Conjunto de destino ("pedidos", "caminhoes", "frota" ou "ia").
+      tamanho_lote (int): Linhas válidas acumuladas antes de cada gravação.
+      progresso (callable): Chamado como progresso(linhas_lidas, total_estimado) a cada lote;
+                            total_estimado pode ser None se a planilha não informar suas dimensões.
+      destino (str): Arquivo Parquet de saída; por padrão, o do conjunto `nome_dataset`.
+
+    Retorna:
+      ResumoIngestao: Quantidade de linhas válidas e inválidas e as primeiras mensagens de erro.
+
+    Lança:
+      ValueError: Se faltarem colunas obrigatórias ou a planilha estiver vazia.
+    """
+    from openpyxl import load_workbook
+
+    obrigatorias, opcionais = ESPECIFICACOES[nome_dataset]
+    workbook = load_workbook(arquivo, read_only=True, data_only=True)
+    temporario = None
+    try:
+        planilha = workbook.active
+        linhas = planilha.iter_rows(values_only=True)
+        try:
+            cabecalho = [str(c).strip() if c is not None else "" for c in next(linhas)]
+        except StopIteration:
+            raise ValueError("A planilha está vazia.")
+
+        faltantes = [c for c in obrigatorias if c not in cabecalho]
+        if faltantes:
+            raise ValueError(f"As seguintes colunas necessárias não foram encontradas: {', '.join(faltantes)}")
+        colunas = [c for c in obrigatorias + opcionais if c in cabecalho]
+        indices = [cabecalho.index(c) for c in colunas]
+        esquema = _esquema_arrow(colunas)
+        total_estimado = planilha.max_row - 1 if planilha.max_row else None
+
+        destino = destino or caminho_dataset(nome_dataset)
+        os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+        temporario = f"{destino}.{os.getpid()}.tmp"
+        validas, invalidas, erros, lote, numeros = 0, 0, [], [], []
+
+        def gravar_lote():
+            nonlocal validas, invalidas
+            tabela, rejeitadas, erros_lote = _tabela(lote, numeros, colunas, obrigatorias, esquema)
+            escritor.write_table(tabela)
+            validas += tabela.num_rows
+            invalidas += rejeitadas
+            erros.extend(erros_lote[:MAX_ERROS_REPORTADOS - len(erros)])
+
+        with pq.ParquetWriter(temporario, esquema) as escritor:
+            for numero, valores in enumerate(linhas, start=2):
+                if valores is None or all(v is None for v in valores):
+                    continue
+                selecionados = [valores[i] if i < len(valores) else None for i in indices]
+                linha, erro = _validar_linha(selecionados, colunas, obrigatorias)
+                if erro:
+                    invalidas += 1
+                    if len(erros) < MAX_ERROS_REPORTADOS:
+                        erros.append(f"Linha {numero}: {erro}")
+                    continue
+                lote.append(linha)
+                numeros.append(numero)
+                if len(lote) >= tamanho_lote:
+                    gravar_lote()
+                    lote, numeros = [], []
+                    if progresso:
+                        progresso(numero - 1, total_estimado)
+            if lote:
+                gravar_lote()
+        os.replace(temporario, destino)
+    finally:
+        workbook.close()
+        if temporario and os.path.exists(temporario):
+            os.remove(temporario)
+
+    if progresso:
+        progresso(validas + invalidas, validas + invalidas)
+    if invalidas:
+        logging.warning(f"Ingestão de '{nome_dataset}': {invalidas} linhas inválidas ignoradas.")
+    logging.info(f"Ingestão de '{nome_dataset}': {validas} linhas gravadas.")
+    return ResumoIngestao(validas, invalidas, erros)
+
+
+def _tabela(lote, numeros, colunas, obrigatorias, esquema):
+    """
+    Converte um lote de linhas para os tipos do esquema, de forma vetorizada.
+    O índice é o número da linha na planilha, para que as mensagens de erro apontem a linha certa.
+    Linhas com valor não numérico em uma coluna numérica obrigatória são descartadas.
+
+    Retorna:
+      tuple: (Table Arrow, quantidade de linhas descartadas, mensagens de erro).
+    """
+    df = pd.DataFrame(lote, columns=colunas, index=numeros)
+    erros = []
+    validas = pd.Series(True, index=df.index)
+    for coluna in obrigatorias:
+        if pa.types.is_integer(esquema.field(coluna).type) or pa.types.is_floating(esquema.field(coluna).type):
+            valores = df[coluna].astype("string").str.replace(",", ".", regex=False)
+            invalidos = pd.to_numeric(valores, errors="coerce").isna()
+            erros.extend(f"Linha {numero}: valor inválido em '{coluna}': {df.at[numero, coluna]!r}"
+                         for numero in df.index[invalidos & validas])
+            validas &= ~invalidos
+    df, erros_conversao = aplicar_esquema(df[validas])
+    return pa.Table.from_pandas(df, schema=esquema, preserve_index=False), int((~validas).sum()), erros + erros_conversao
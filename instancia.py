@@ -0,0 +1,161 @@
+"""
+Módulo da instância de roteirização
+
+Reúne, em arrays NumPy, tudo o que os algoritmos de otimização usam: coordenadas, pesos,
+caixas e endereços dos pedidos, capacidades e placas dos caminhões e o ponto de partida.
+A instância é montada uma vez por execução a partir dos DataFrames; os algoritmos (algoritmo
+genético, TSP, VRP e alocação da frota) trabalham sobre os arrays, sem indexar DataFrames
+dentro dos laços. A matriz de distâncias é calculada apenas quando solicitada.
+"""
+
+import numpy as np
+import pandas as pd
+
+from config import endereco_partida, endereco_partida_coords
+from metricas import registrar_cache
+
+RAIO_TERRA_M = 6371008.8
+
+
+def distancias_haversine(lat_1, lon_1, lat_2, lon_2):
+    """
+    Distância em metros (fórmula de haversine) entre os pontos, com broadcasting do NumPy.
+    """
+    lat_1, lon_1, lat_2, lon_2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat_1, lon_1, lat_2, lon_2))
+    a = (np.sin((lat_2 - lat_1) / 2) ** 2
+         + np.cos(lat_1) * np.cos(lat_2) * np.sin((lon_2 - lon_1) / 2) ** 2)
+    return 2 * RAIO_TERRA_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _coluna(df, coluna, tipo, padrao=0):
+    if df is None or coluna not in df.columns:
+        return np.full(0 if df is None else len(df), padrao, dtype=tipo)
+    return pd.to_numeric(df[coluna], errors="coerce").fillna(padrao).to_numpy(dtype=tipo)
+
+
+class RoutingInstance:
+    """
+    Instância de roteirização em estrutura de arrays.
+
+    Pedidos (arrays de tamanho n):
+      ids_pedidos   rótulos do índice do DataFrame de pedidos
+      latitudes, longitudes (float64), pesos (float32), caixas (int32)
+      ids_enderecos índice (int32) do endereço do pedido em `enderecos`
+
+    Endereços distintos (arrays de tamanho k): enderecos e as coordenadas da primeira
+    ocorrência de cada endereço.
+
+    Caminhões (arrays de tamanho m): ids_caminhoes, placas, capacidades_kg, capacidades_cx.
+    """
+
+    __slots__ = ("ids_pedidos", "latitudes", "longitudes", "pesos", "caixas", "ids_enderecos",
+                 "enderecos", "latitudes_enderecos", "longitudes_enderecos",
+                 "ids_caminhoes", "placas", "capacidades_kg", "capacidades_cx",
+                 "deposito", "nome_deposito", "_distancias")
+
+    def __init__(self, ids_pedidos, latitudes, longitudes, pesos, caixas, enderecos_pedidos,
+                 ids_caminhoes=(), placas=(), capacidades_kg=(), capacidades_cx=(),
+                 deposito=endereco_partida_coords, nome_deposito=endereco_partida):
+        self.ids_pedidos = np.asarray(ids_pedidos)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.pesos = np.asarray(pesos, dtype=np.float32)
+        self.caixas = np.asarray(caixas, dtype=np.int32)
+
+        codigos, enderecos = pd.factorize(pd.Series(enderecos_pedidos, dtype="string").fillna(""))
+        self.ids_enderecos = codigos.astype(np.int32)
+        self.enderecos = np.asarray(enderecos, dtype=object)
+        primeiros = np.unique(self.ids_enderecos, return_index=True)[1]
+        self.latitudes_enderecos = self.latitudes[primeiros]
+        self.longitudes_enderecos = self.longitudes[primeiros]
+
+        self.ids_caminhoes = np.asarray(ids_caminhoes)
+        self.placas = np.asarray(placas, dtype=object)
+        self.capacidades_kg = np.asarray(capacidades_kg, dtype=np.float32)
+        self.capacidades_cx = np.asarray(capacidades_cx, dtype=np.float32)
+        self.deposito = (float(deposito[0]), float(deposito[1]))
+        self.nome_deposito = nome_deposito
+        self._distancias = None
+
+    @classmethod
+    def de_dataframes(cls, pedidos_df, caminhoes_df=None, **kwargs):
+        """
+        Monta a instância a partir dos DataFrames de pedidos e (opcionalmente) caminhões.
+        Pesos e caixas ausentes contam como 0; os endereços vêm de 'Endereço Completo'.
+        """
+        if 'Endereço Completo' in pedidos_df.columns:
+            enderecos = pedidos_df['Endereço Completo']
+        else:
+            enderecos = pedidos_df.index.astype(str)
+        caminhoes = {}
+        if caminhoes_df is not None:
+            caminhoes = dict(
+                ids_caminhoes=caminhoes_df.index.to_numpy(),
+                placas=(caminhoes_df['Placa'].astype(object).to_numpy() if 'Placa' in caminhoes_df.columns
+                        else caminhoes_df.index.astype(str).to_numpy()),
+                capacidades_kg=_coluna(caminhoes_df, 'Capac. Kg', np.float32),
+                capacidades_cx=_coluna(caminhoes_df, 'Capac. Cx', np.float32),
+            )
+        return cls(
+            pedidos_df.index.to_numpy(),
+            _coluna(pedidos_df, 'Latitude', np.float64, np.nan),
+            _coluna(pedidos_df, 'Longitude', np.float64, np.nan),
+            _coluna(pedidos_df, 'Peso dos Itens', np.float32),
+            _coluna(pedidos_df, 'Qtde. dos Itens', np.int32),
+            enderecos,
+            **caminhoes, **kwargs,
+        )
+
+    @property
+    def num_pedidos(self):
+        return len(self.ids_pedidos)
+
+    @property
+    def num_caminhoes(self):
+        return len(self.ids_caminhoes)
+
+    @property
+    def num_enderecos(self):
+        return len(self.enderecos)
+
+    def subinstancia(self, posicoes):
+        """
+        Instância apenas com os pedidos nas posições (ou máscara booleana) informadas,
+        mantendo os mesmos caminhões e ponto de partida.
+        """
+        return RoutingInstance(self.ids_pedidos[posicoes], self.latitudes[posicoes], self.longitudes[posicoes],
+                               self.pesos[posicoes], self.caixas[posicoes],
+                               self.enderecos[self.ids_enderecos[posicoes]],
+                               self.ids_caminhoes, self.placas, self.capacidades_kg, self.capacidades_cx,
+                               self.deposito, self.nome_deposito)
+
+    def nos_rota(self):
+        """
+        Rótulos dos nós usados nas rotas: o ponto de partida (nó 0) seguido dos endereços distintos.
+        """
+        return [self.nome_deposito] + self.enderecos.tolist()
+
+    def matriz_distancias(self):
+        """
+        Matriz (k + 1) x (k + 1) de distâncias em metros entre o ponto de partida (nó 0)
+        e os endereços distintos (nós 1..k). Calculada na primeira chamada e reaproveitada.
+        """
+        if self._distancias is not None:
+            registrar_cache("distancias", acertos=1)
+        else:
+            registrar_cache("distancias", faltas=1)
+            lat = np.concatenate(([self.deposito[0]], self.latitudes_enderecos))
+            lon = np.concatenate(([self.deposito[1]], self.longitudes_enderecos))
+            self._distancias = distancias_haversine(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+        return self._distancias
+
+    def cargas(self, atribuicao):
+        """
+        Peso e caixas totais por caminhão para uma atribuição (array com a posição do caminhão de cada pedido).
+
+        Retorna:
+          tuple: (array de pesos, array de caixas), ambos de tamanho num_caminhoes.
+        """
+        peso = np.bincount(atribuicao, weights=self.pesos, minlength=self.num_caminhoes)
+        caixas = np.bincount(atribuicao, weights=self.caixas, minlength=self.num_caminhoes)
+        return peso, caixas
@@ -0,0 +1,130 @@
+"""
+Módulo de logs
+
+Configuração única do logging do sistema, chamada pelos pontos de entrada (api.py, main.py e
+o processo de trabalho das tarefas) no lugar de um basicConfig por módulo:
+
+- o logger raiz recebe um QueueHandler: quem registra (o algoritmo genético, o TSP, as
+  requisições) apenas enfileira o registro, e a escrita no arquivo acontece na thread de um
+  QueueListener;
+- cada linha do arquivo é um objeto JSON (horario, nivel, modulo, mensagem, execucao e os
+  campos passados em `extra`), ou texto simples com LOG_FORMATO=texto;
+- `execucao` identifica a roteirização que gerou o registro (o ID da tarefa em /jobs), para
+  filtrar os logs de uma execução entre várias simultâneas.
+"""
+
+import json
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+from config import LOG_ARQUIVO, LOG_NIVEL, LOG_FORMATO
+
+FORMATO_TEXTO = "%(asctime)s - %(levelname)s - %(execucao)s - %(module)s - %(message)s"
+
+# Atributos padrão de um LogRecord; os demais vieram de `extra` e vão para o JSON
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "execucao"}
+
+_execucao = contextvars.ContextVar("execucao_log", default=None)
+_ouvinte = None
+_trava = threading.Lock()
+
+
+class FiltroExecucao(logging.Filter):
+    """
+    Anota o registro com o ID da execução atual (na thread de quem registra, antes da fila).
+    """
+
+    def filter(self, record):
+        record.execucao = _execucao.get()
+        return True
+
+
+class FormatadorJSON(logging.Formatter):
+    """
+    Formata o registro como uma linha JSON.
+    """
+
+    def format(self, record):
+        linha = {
+            "horario": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "nivel": record.levelname,
+            "modulo": record.module,
+            "mensagem": record.getMessage(),
+            "execucao": getattr(record, "execucao", None),
+        }
+        linha.update((chave, valor) for chave, valor in vars(record).items() if chave not in _ATRIBUTOS_PADRAO)
+        if record.exc_info:
+            linha["excecao"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            linha["excecao"] = record.exc_text
+        return json.dumps(linha, ensure_ascii=False, default=str)
+
+
+class _QueueHandlerEstruturado(QueueHandler):
+    # O QueueHandler padrão junta a exceção à mensagem; aqui ela vai à parte, em exc_text
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configurar_logging(arquivo=LOG_ARQUIVO, nivel=LOG_NIVEL, formato=LOG_FORMATO):
+    """
+    Configura o logger raiz do processo (uma única vez; as chamadas seguintes não fazem nada).
+
+    Parâmetros:
+      arquivo (str): Arquivo de log (em modo append; vários processos podem compartilhá-lo).
+      nivel (str): Nível mínimo (DEBUG, INFO, WARNING...).
+      formato (str): "json" ou "texto".
+    """
+    global _ouvinte
+    with _trava:
+        if _ouvinte is not None:
+            return
+        # delay: o arquivo só é aberto no primeiro registro
+        destino = logging.FileHandler(arquivo, mode="a", encoding="utf-8", delay=True)
+        destino.setFormatter(FormatadorJSON() if formato == "json" else logging.Formatter(FORMATO_TEXTO))
+        fila = queue.SimpleQueue()
+        _ouvinte = QueueListener(fila, destino, respect_handler_level=True)
+        manipulador = _QueueHandlerEstruturado(fila)
+        manipulador.addFilter(FiltroExecucao())
+        raiz = logging.getLogger()
+        raiz.setLevel(nivel)
+        raiz.addHandler(manipulador)
+        _ouvinte.start()
+        # Esvazia a fila antes de o processo terminar
+        atexit.register(_ouvinte.stop)
+
+
+@contextmanager
+def execucao(identificador=None):
+    """
+    Dentro do bloco, os registros levam o ID da execução. Sem identificador, mantém o da
+    execução atual ou gera um novo.
+
+    Retorna (no `as`):
+      str: ID da execução.
+    """
+    identificador = identificador or _execucao.get() or uuid.uuid4().hex[:12]
+    token = _execucao.set(identificador)
+    try:
+        yield identificador
+    finally:
+        _execucao.reset(token)
+
+
+def execucao_atual():
+    """
+    ID da execução atual, ou None fora de um bloco `execucao`.
+    """
+    return _execucao.get()
@@ -1,32 +1,118 @@
+import os
+import json
+import hashlib
+from contextlib import nullcontext
+
 import streamlit as st
 import pandas as pd
 from streamlit_folium import folium_static
 import requests
-import time
 
 from gerenciamento_frota import cadastrar_caminhoes
-from subir_pedidos import processar_pedidos, salvar_coordenadas
+from subir_pedidos import processar_pedidos, carregar_coordenadas, salvar_coordenadas
+from armazenamento import carregar_dataset, salvar_dataset
+from exportacao import FORMATOS, exportar
 import ia_analise_pedidos as ia
+from roteamento import resolver_rotas_por_carga
+import progresso
+from logs import configurar_logging, execucao
+from perfilamento import perfilar, arquivos_perfil
+
+# ---------- Etapas do Dashboard ----------
+# O Streamlit reexecuta o script inteiro a cada interação. Cada etapa abaixo fica em cache,
+# indexada pela chave da etapa anterior mais os próprios parâmetros (ver chave_etapa); os
+# DataFrames vão em argumentos com "_", que o Streamlit não hasheia. Assim, mudar max_pedidos
+# recalcula só a alocação e o TSP, e mudar n_clusters, do agrupamento em diante.
+
+# Resultados do TSP guardados por sessão (os mais antigos saem primeiro)
+TSP_SESSAO_MAX = 8
+
+def chave_etapa(*partes):
+    """
+    Chave de cache de uma etapa: hash da chave da etapa anterior e dos parâmetros da etapa.
+    """
+    return hashlib.blake2b(json.dumps(partes, default=str).encode(), digest_size=16).hexdigest()
+
+def hash_frota(caminhoes_df):
+    """
+    Hash do conteúdo da frota, para que editar o cadastro invalide a alocação, o mapa e o TSP.
+    """
+    return [list(map(str, caminhoes_df.columns)), int(pd.util.hash_pandas_object(caminhoes_df, index=False).sum())]
 
-# Exemplo de função para definir a ordem de entrega por carga
-def definir_ordem_por_carga(pedidos_df, ordem_tsp):
-    """
-    Define a coluna 'Ordem de Entrega TSP' com base na ordem definida pelo TSP,
-    agrupando os pedidos por 'Carga' e atribuindo uma sequência para cada entrega.
-    """
-    rota_indices = {endereco: idx for idx, endereco in enumerate(ordem_tsp)}
-    pedidos_df['Ordem de Entrega TSP'] = ""
-    for carga in pedidos_df['Carga'].unique():
-        mask = pedidos_df['Carga'] == carga
-        df_carga = pedidos_df.loc[mask].copy()
-        df_carga = df_carga.sort_values(
-            by='Endereço Completo', 
-            key=lambda col: col.map(lambda x: rota_indices.get(x, float('inf')))
-        )
-        for seq, idx in enumerate(df_carga.index, start=1):
-            pedidos_df.at[idx, 'Ordem de Entrega TSP'] = f"{carga}-{seq}"
+@st.cache_data(show_spinner="Obtendo coordenadas...", max_entries=4)
+def etapa_coordenadas(chave_pedidos, _pedidos_df):
+    """
+    Pedidos com Latitude e Longitude; os endereços novos são geocodificados e salvos no cache.
+    """
+    pedidos_df = _pedidos_df.copy()
+    coordenadas_salvas = carregar_coordenadas(pedidos_df['Endereço Completo'])
+    pedidos_df['Latitude'], pedidos_df['Longitude'] = ia.obter_coordenadas_lote(
+        pedidos_df['Endereço Completo'], coordenadas_salvas
+    )
+    pedidos_df['Latitude'] = pedidos_df['Latitude'].fillna(0)
+    pedidos_df['Longitude'] = pedidos_df['Longitude'].fillna(0)
+    salvar_coordenadas(coordenadas_salvas)
     return pedidos_df
 
+@st.cache_data(show_spinner="Agrupando pedidos por região...", max_entries=16)
+def etapa_agrupamento(chave_agrupamento, _pedidos_df, n_clusters):
+    """
+    Pedidos com peso, agrupados em regiões (coluna 'Regiao').
+    """
+    pedidos_df = _pedidos_df[_pedidos_df['Peso dos Itens'] > 0]
+    return ia.agrupar_por_regiao(pedidos_df, metodo='kmeans', n_clusters=n_clusters)
+
+@st.cache_data(show_spinner="Alocando pedidos aos caminhões...", max_entries=16)
+def etapa_alocacao(chave_alocacao, _pedidos_df, _caminhoes_df, percentual_frota, max_pedidos, n_clusters):
+    """
+    Pedidos agrupados com 'Carga' e 'Placa' (a frota entra em chave_alocacao, ver hash_frota).
+    """
+    return ia.otimizar_aproveitamento_frota(_pedidos_df.copy(), _caminhoes_df, percentual_frota, max_pedidos, n_clusters)
+
+@st.cache_resource(max_entries=8)
+def etapa_mapa(chave_alocacao, _pedidos_df):
+    """
+    Mapa Folium dos pedidos alocados (guardado como objeto: não é copiado a cada interação).
+    """
+    return ia.criar_mapa(_pedidos_df)
+
+def etapa_tsp(chave_alocacao, pedidos_df):
+    """
+    Rota TSP de cada carga (caminhão), a partir do ponto de partida, e a ordem de entrega.
+
+    Fica em session_state, e não em st.cache_data: durante o cálculo, os eventos de progresso
+    atualizam a barra criada fora da função, o que o cache do Streamlit não permite reproduzir.
+
+    Retorna:
+      tuple: (pedidos com 'Ordem de Entrega TSP', lista de roteamento.RotaCarga).
+    """
+    guardados = st.session_state.setdefault("tsp", {})
+    if chave_alocacao not in guardados:
+        if len(guardados) >= TSP_SESSAO_MAX:
+            guardados.pop(next(iter(guardados)))
+        with progresso.etapa("tsp por carga"):
+            guardados[chave_alocacao] = resolver_rotas_por_carga(pedidos_df)
+    return guardados[chave_alocacao]
+
+@st.cache_data(show_spinner="Gerando planilha...", max_entries=8)
+def etapa_exportacao(chave, _pedidos_df, formato, por_placa=False):
+    """
+    Arquivo exportado (bytes) dos pedidos, no formato escolhido.
+    """
+    return exportar(_pedidos_df, formato, por_placa=por_placa)
+
+def atualizar_barra(barra, evento):
+    """
+    Atualiza a barra de progresso do Streamlit com um evento de progresso (ver progresso.py).
+    """
+    if evento["fracao"] is None:
+        return
+    texto = f"{evento['etapa'] or 'Roteirização'}: {evento['fracao']:.0%}"
+    if evento.get("melhor_custo") is not None:
+        texto += f" · melhor distância {evento['melhor_custo'] / 1000:.1f} km"
+    texto += f" · {evento['decorrido']:.0f}s"
+    barra.progress(min(max(evento["fracao"], 0.0), 1.0), text=texto)
+
 def main():
     st.title("Roteirizador de Pedidos")
     
@@ -60,18 +146,8 @@ def main():
         if pedidos_result is None:
             st.info("Aguardando envio da planilha de pedidos.")
         else:
-            pedidos_df, coordenadas_salvas = pedidos_result
-            
-            with st.spinner("Obtendo coordenadas..."):
-                pedidos_df['Latitude'] = pedidos_df['Endereço Completo'].apply(
-                    lambda x: ia.obter_coordenadas_com_fallback(x, coordenadas_salvas)[0]
-                )
-                pedidos_df['Longitude'] = pedidos_df['Endereço Completo'].apply(
-                    lambda x: ia.obter_coordenadas_com_fallback(x, coordenadas_salvas)[1]
-                )
-            pedidos_df['Latitude'] = pedidos_df['Latitude'].fillna(0)
-            pedidos_df['Longitude'] = pedidos_df['Longitude'].fillna(0)
-            salvar_coordenadas(coordenadas_salvas)
+            pedidos_df, chave_pedidos = pedidos_result
+            pedidos_df = etapa_coordenadas(chave_pedidos, pedidos_df)
             
             st.dataframe(pedidos_df)
             st.write("Cabeçalho da planilha:", list(pedidos_df.columns))
@@ -93,104 +169,123 @@ def main():
             **Aplicar VRP:**  
             Distribui os pedidos entre os veículos disponíveis, respeitando as restrições de capacidade e minimizando a distância percorrida.
             """)
-            
+
+            gerar_perfil = st.checkbox("Gerar perfil desta execução (tempo e memória por etapa)")
+
+            # Depois do primeiro clique, a roteirização acompanha os controles acima (até chegar outra
+            # planilha): as etapas em cache fazem as interações seguintes recalcularem só o necessário
             if st.button("Roteirizar Pedidos"):
-                st.write("Roteirização em execução...")
-                progress_bar = st.empty()
-                for progresso in range(100):
-                    time.sleep(0.05)
-                    progress_bar.progress(progresso + 1)
-                
-                pedidos_df = pedidos_df[pedidos_df['Peso dos Itens'] > 0]
+                st.session_state["roteirizar"] = chave_pedidos
+            if st.session_state.get("roteirizar") == chave_pedidos:
+                barra_progresso = st.progress(0.0, text="Roteirização em execução...")
+                ouvinte = progresso.limitar(lambda evento: atualizar_barra(barra_progresso, evento), 0.2)
+                with execucao(), perfilar() if gerar_perfil else nullcontext() as sessao_perfil, \
+                        progresso.acompanhar(ouvinte):
+                    try:
+                        caminhoes_df = carregar_dataset("frota")
+                    except FileNotFoundError:
+                        st.error("Nenhum caminhão cadastrado. Cadastre a frota na opção 'Cadastro da Frota'.")
+                        return
                 
-                try:
-                    caminhoes_df = pd.read_excel("database/caminhoes_frota.xlsx", engine="openpyxl")
-                except FileNotFoundError:
-                    st.error("Nenhum caminhão cadastrado. Cadastre a frota na opção 'Cadastro da Frota'.")
-                    return
-                
-                # Verifica se o DataFrame contém as colunas necessárias
-                required_columns = ['Latitude', 'Longitude', 'Cidade de Entrega']
-                if not all(col in pedidos_df.columns for col in required_columns):
-                    st.error(f"As colunas necessárias {required_columns} não foram encontradas no DataFrame.")
-                    st.stop()
-
-                # Verifica se há valores nulos nas colunas de coordenadas
-                if pedidos_df[required_columns].isnull().any().any():
-                    st.error("O DataFrame contém valores nulos nas colunas de coordenadas ou cidade. Verifique os dados e tente novamente.")
-                    st.stop()
-
-                # Agrupamento por cidade e coordenadas
-                try:
-                    pedidos_df = ia.agrupar_por_regiao(pedidos_df, metodo='kmeans', n_clusters=n_clusters)
-                    st.write("Pedidos agrupados por região:")
-                    st.dataframe(pedidos_df[['Cidade de Entrega', 'Latitude', 'Longitude', 'Regiao']])
-                except Exception as e:
-                    st.error(f"Erro ao agrupar pedidos por região: {e}")
-                    st.stop()
+                    # Verifica se o DataFrame contém as colunas necessárias
+                    required_columns = ['Latitude', 'Longitude', 'Cidade de Entrega']
+                    if not all(col in pedidos_df.columns for col in required_columns):
+                        st.error(f"As colunas necessárias {required_columns} não foram encontradas no DataFrame.")
+                        st.stop()
+
+                    # Verifica se há valores nulos nas colunas de coordenadas
+                    if pedidos_df[required_columns].isnull().any().any():
+                        st.error("O DataFrame contém valores nulos nas colunas de coordenadas ou cidade. Verifique os dados e tente novamente.")
+                        st.stop()
+
+                    # Agrupamento por cidade e coordenadas
+                    chave_agrupamento = chave_etapa(chave_pedidos, n_clusters)
+                    try:
+                        pedidos_df = etapa_agrupamento(chave_agrupamento, pedidos_df, n_clusters)
+                        st.write("Pedidos agrupados por região:")
+                        st.dataframe(pedidos_df[['Cidade de Entrega', 'Latitude', 'Longitude', 'Regiao']])
+                        progresso.emitir(0.1, algoritmo="agrupamento")
+                    except Exception as e:
+                        st.error(f"Erro ao agrupar pedidos por região: {e}")
+                        st.stop()
                 
-                # Otimização da frota com base nas coordenadas
-                pedidos_df = ia.otimizar_aproveitamento_frota(pedidos_df, caminhoes_df, percentual_frota, max_pedidos, n_clusters)
+                    # Otimização da frota com base nas coordenadas
+                    chave_alocacao = chave_etapa(chave_agrupamento, hash_frota(caminhoes_df), percentual_frota, max_pedidos)
+                    pedidos_df = etapa_alocacao(chave_alocacao, pedidos_df, caminhoes_df, percentual_frota, max_pedidos,
+                                                n_clusters)
+                    progresso.emitir(0.25, algoritmo="alocacao")
                 
-                # Relatório de alocação por região
-                alocacao_report = pedidos_df.groupby(['Regiao', 'Placa']).agg({
-                    'Peso dos Itens': 'sum',
-                    'Qtde. dos Itens': 'sum',
-                    'Regiao': 'count'
-                }).rename(columns={'Regiao': 'Total de Pedidos'})
+                    # Relatório de alocação por região
+                    alocacao_report = pedidos_df.groupby(['Regiao', 'Placa'], observed=True).agg({
+                        'Peso dos Itens': 'sum',
+                        'Qtde. dos Itens': 'sum',
+                        'Regiao': 'count'
+                    }).rename(columns={'Regiao': 'Total de Pedidos'})
                 
-                # Relatório de alocação por região
-                st.write("Relatório de Alocação por Região e Veículo:")
-                st.dataframe(alocacao_report)
-
-                # Ajusta o estilo do mapa para ocupar 100% da largura
-                st.markdown(
-                    """
-                    <style>
-                    .folium-map {
-                        width: 100% !important;
-                        height: 700px !important;
-                    }
-                    </style>
-                    """,
-                    unsafe_allow_html=True
-                )
+                    # Relatório de alocação por região
+                    st.write("Relatório de Alocação por Região e Veículo:")
+                    st.dataframe(alocacao_report)
 
-                # Exibe o mapa
-                mapa = ia.criar_mapa(pedidos_df)
-                folium_static(mapa)
-                
-                if aplicar_tsp:
-                    for regiao in pedidos_df['Regiao'].unique():
-                        pedidos_regiao = pedidos_df[pedidos_df['Regiao'] == regiao]
-                        if not pedidos_regiao.empty:
-                            G = ia.criar_grafo_tsp(pedidos_regiao)
-                            melhor_rota, menor_distancia = ia.resolver_tsp_genetico(G)
-                            st.write(f"Melhor rota TSP para a região {regiao}:")
-                            st.write("\n".join(melhor_rota))
-                            st.write(f"Menor distância TSP para a região {regiao}: {menor_distancia}")
-                            
-                            # Define a ordem de entrega baseada no campo 'Carga'
-                            pedidos_df = definir_ordem_por_carga(pedidos_df, melhor_rota)
+                    # Ajusta o estilo do mapa para ocupar 100% da largura
+                    st.markdown(
+                        """
+                        <style>
+                        .folium-map {
+                            width: 100% !important;
+                            height: 700px !important;
+                        }
+                        </style>
+                        """,
+                        unsafe_allow_html=True
+                    )
+
+                    # Exibe o mapa
+                    folium_static(etapa_mapa(chave_alocacao, pedidos_df))
+                    progresso.emitir(0.3, algoritmo="mapa")
                 
+                    if aplicar_tsp:
+                        with progresso.etapa(inicio=0.3):
+                            pedidos_df, rotas = etapa_tsp(chave_alocacao, pedidos_df)
+                        for rota in rotas:
+                            st.write(f"Melhor rota TSP para a carga {rota.carga} ({rota.placa}):")
+                            st.write("\n".join(rota.rota))
+                            st.write(f"Menor distância TSP para a carga {rota.carga}: {rota.distancia / 1000:.1f} km")
+                    progresso.emitir(1.0)
+                barra_progresso.progress(1.0, text="Roteirização concluída.")
+
+                if sessao_perfil is not None:
+                    st.markdown("### Perfil da execução")
+                    for nome, caminho in arquivos_perfil(os.path.basename(sessao_perfil.pasta)).items():
+                        with open(caminho, "rb") as arquivo:
+                            conteudo = arquivo.read()
+                        if nome.endswith(".txt"):
+                            with st.expander("Relatório de tempo e memória"):
+                                st.code(conteudo.decode("utf-8"), language=None)
+                        st.download_button(label=f"Baixar {nome}", data=conteudo, file_name=nome)
+
                 st.write("Dados dos Pedidos:")
                 st.dataframe(pedidos_df)
-                                            
-                output_file_path = "database/roterizacao_resultado.xlsx"
-                pedidos_df.to_excel(output_file_path, index=False)
-                st.write(f"Arquivo salvo: {output_file_path}")
-                with open(output_file_path, "rb") as file:
-                    st.download_button(
-                        "Baixar planilha",
-                        data=file,
-                        file_name="roterizacao_resultado.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
+
+                # O resultado só é regravado quando muda, não a cada interação
+                chave_resultado = chave_etapa(chave_alocacao, aplicar_tsp)
+                if st.session_state.get("resultado_salvo") != chave_resultado:
+                    salvar_dataset("resultado", pedidos_df)
+                    st.session_state["resultado_salvo"] = chave_resultado
+                st.write("Resultado da roteirização salvo.")
+                formato = st.radio("Formato do arquivo", list(FORMATOS), horizontal=True)
+                por_placa = formato == "xlsx" and st.checkbox("Uma aba por placa, na ordem de entrega", value=True)
+                nome_arquivo, mime = FORMATOS[formato]
+                st.download_button(
+                    "Baixar planilha",
+                    data=etapa_exportacao(chave_resultado, pedidos_df, formato, por_placa=por_placa),
+                    file_name=nome_arquivo,
+                    mime=mime
+                )
                     
             st.markdown("**Edite a planilha de Pedidos, se necessário:**")
             dados_editados = st.data_editor(pedidos_df, num_rows="dynamic")
             if st.button("Salvar alterações na planilha"):
-                dados_editados.to_excel("database/Pedidos.xlsx", index=False)
+                salvar_dataset("pedidos", dados_editados)
                 st.success("Planilha editada e salva com sucesso!")
     
     elif menu_opcao == "Cadastro da Frota":
@@ -206,37 +301,32 @@ def main():
         if pedidos_result is None:
             st.info("Aguardando envio da planilha de pedidos.")
         else:
-            pedidos_df, coordenadas_salvas = pedidos_result
-            with st.spinner("Obtendo coordenadas..."):
-                pedidos_df['Latitude'] = pedidos_df['Endereço Completo'].apply(
-                    lambda x: ia.obter_coordenadas_com_fallback(x, coordenadas_salvas)[0]
-                )
-                pedidos_df['Longitude'] = pedidos_df['Endereço Completo'].apply(
-                    lambda x: ia.obter_coordenadas_com_fallback(x, coordenadas_salvas)[1]
-                )
-            pedidos_df['Latitude'] = pedidos_df['Latitude'].fillna(0)
-            pedidos_df['Longitude'] = pedidos_df['Longitude'].fillna(0)
-            salvar_coordenadas(coordenadas_salvas)
+            pedidos_df, chave_pedidos = pedidos_result
+            pedidos_df = etapa_coordenadas(chave_pedidos, pedidos_df)
             
             st.dataframe(pedidos_df)
             if st.button("Salvar alterações na planilha"):
-                pedidos_df.to_excel("database/Pedidos.xlsx", index=False)
+                salvar_dataset("pedidos", pedidos_df)
                 st.success("Planilha editada e salva com sucesso!")
-            with open("database/Pedidos.xlsx", "rb") as file:
-                st.download_button(
-                    "Baixar planilha de Pedidos",
-                    data=file,
-                    file_name="Pedidos.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
+            st.download_button(
+                "Baixar planilha de Pedidos",
+                data=etapa_exportacao(chave_pedidos, pedidos_df, "xlsx"),
+                file_name="Pedidos.xlsx",
+                mime=FORMATOS["xlsx"][1]
+            )
         
     elif menu_opcao == "API REST":
         st.header("Interação com API REST")
         st.write("Teste os endpoints:")
         st.markdown("""
-        - **POST /upload**: Faz upload dos arquivos (Pedidos.xlsx, Caminhoes.xlsx, IA.xlsx).
-        - **GET /resultado**: Retorna a solução do algoritmo genético.
+        - **POST /upload**: Faz upload dos arquivos (Pedidos.xlsx, Caminhoes.xlsx, IA.xlsx) e retorna o ID das versões.
+        - **GET /resultado**: Retorna a solução do algoritmo genético (`?pedidos=<versão>&caminhoes=<versão>` opcionais).
         - **GET /mapa**: Exibe o mapa interativo.
+        - **POST /jobs**: Enfileira a roteirização e retorna o ID da tarefa.
+        - **GET /jobs/&lt;id&gt;**: Situação, progresso e resultado da tarefa (**DELETE** cancela).
+        - **GET /jobs/&lt;id&gt;/eventos**: Progresso da tarefa em tempo real (Server-Sent Events).
+        - **GET /metrics**: Métricas no formato do Prometheus.
+        - **GET /resultado/exportar**: Baixa o último resultado (xlsx, csv ou parquet).
         """)
         if st.button("Testar /resultado"):
             try:
@@ -246,4 +336,5 @@ def main():
                 st.error(f"Erro na requisição: {e}")
 
 if __name__ == "__main__":
+    configurar_logging()
     main()
\ No newline at end of file
@@ -0,0 +1,212 @@
+"""
+Módulo de mapas
+
+Gera os mapas interativos (Folium) dos pedidos sem um marcador Python por pedido: os pontos
+são agregados por coordenada (pedidos no mesmo endereço viram um único ponto com a contagem)
+e enviados ao navegador como um único vetor compacto, desenhado em canvas e agrupado no
+cliente (FastMarkerCluster). As cores seguem a Placa ou a Regiao, e as rotas de cada caminhão
+são desenhadas como linhas a partir do endereço de partida, na ordem de entrega.
+
+O HTML gerado fica em cache em disco (MAPAS_CACHE_DIR), indexado pelo hash dos pontos exibidos.
+"""
+
+import json
+import hashlib
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from cache_resultados import CacheResultados
+from config import MAPAS_CACHE_DIR, MAPAS_CACHE_MAX_MB
+from exportacao import COLUNA_ORDEM, ordem_de_entrega
+
+PALETA = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#17becf",
+          "#bcbd22", "#393b79", "#637939", "#8c6d31", "#843c39", "#7b4173", "#3182bd", "#e6550d"]
+COR_SEM_GRUPO = "#7f7f7f"
+
+# Casas decimais das coordenadas enviadas ao navegador (5 casas ~ 1 m)
+CASAS_DECIMAIS = 5
+
+# Colunas que definem o conteúdo do mapa (usadas no hash do cache)
+COLUNAS_MAPA = ["Latitude", "Longitude", "Endereço Completo", "Placa", "Regiao", COLUNA_ORDEM]
+
+# Desenha cada ponto como círculo em canvas; o popup é montado só ao ser aberto
+CALLBACK_PONTO = """
+function (row) {
+    var marcador = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 6, weight: 1, color: "#333", fillColor: CORES[row[2]], fillOpacity: 0.85
+    });
+    marcador.bindPopup(function () {
+        var div = document.createElement("div");
+        var titulo = document.createElement("b");
+        titulo.textContent = ROTULO + ": " + ROTULOS[row[2]];
+        div.appendChild(titulo);
+        div.appendChild(document.createElement("br"));
+        div.appendChild(document.createTextNode("Endereço: " + row[4]));
+        div.appendChild(document.createElement("br"));
+        div.appendChild(document.createTextNode("Pedidos: " + row[3]));
+        return div;
+    });
+    return marcador;
+}
+"""
+
+
+def _cores(valores):
+    """
+    Códigos, rótulos e cores de uma coluna categórica (ausentes usam COR_SEM_GRUPO).
+    """
+    codigos, categorias = pd.factorize(valores, sort=True)
+    rotulos = [str(categoria) for categoria in categorias] + ["Sem grupo"]
+    cores = [PALETA[i % len(PALETA)] for i in range(len(categorias))] + [COR_SEM_GRUPO]
+    codigos = np.where(codigos < 0, len(categorias), codigos)
+    return codigos, rotulos, cores
+
+
+def agregar_pontos(pedidos_df, cor_por=None):
+    """
+    Agrega os pedidos por coordenada (arredondada) e grupo de cor.
+
+    Retorna:
+      tuple: (DataFrame com Latitude, Longitude, cor, pedidos e endereco; rótulos; cores).
+    """
+    latitudes = pd.to_numeric(pedidos_df["Latitude"], errors="coerce").to_numpy(dtype=float)
+    longitudes = pd.to_numeric(pedidos_df["Longitude"], errors="coerce").to_numpy(dtype=float)
+    validos = np.isfinite(latitudes) & np.isfinite(longitudes)
+
+    if cor_por and cor_por in pedidos_df.columns:
+        codigos, rotulos, cores = _cores(pedidos_df[cor_por].to_numpy()[validos])
+    else:
+        codigos, rotulos, cores = np.zeros(int(validos.sum()), dtype=int), ["Pedidos"], [PALETA[0]]
+
+    if "Endereço Completo" in pedidos_df.columns:
+        enderecos = pedidos_df["Endereço Completo"].astype("string").fillna("").to_numpy()[validos]
+    else:
+        enderecos = np.full(int(validos.sum()), "")
+
+    pontos = pd.DataFrame({
+        "Latitude": latitudes[validos].round(CASAS_DECIMAIS),
+        "Longitude": longitudes[validos].round(CASAS_DECIMAIS),
+        "cor": codigos,
+        "endereco": enderecos,
+    })
+    pontos = (pontos.groupby(["Latitude", "Longitude", "cor"], sort=False)
+              .agg(pedidos=("endereco", "size"), endereco=("endereco", "first"))
+              .reset_index())
+    return pontos, rotulos, cores
+
+
+def _rotas(pedidos_df, deposito):
+    """
+    Sequência de coordenadas de cada Placa, na ordem de entrega, saindo e voltando ao depósito.
+    """
+    if COLUNA_ORDEM not in pedidos_df.columns or "Placa" not in pedidos_df.columns:
+        return {}
+    ordenado = pedidos_df.iloc[ordem_de_entrega(pedidos_df)]
+    ordenado = ordenado[ordenado[COLUNA_ORDEM].notna() & ordenado["Placa"].notna()]
+    coordenadas = ordenado[["Latitude", "Longitude"]].apply(pd.to_numeric, errors="coerce")
+    ordenado = ordenado[coordenadas.notna().all(axis=1).to_numpy()]
+    rotas = {}
+    for placa, grupo in ordenado.groupby("Placa", sort=True, observed=True):
+        pontos = grupo[["Latitude", "Longitude"]].to_numpy(dtype=float).round(CASAS_DECIMAIS)
+        # Pedidos consecutivos no mesmo endereço não acrescentam vértices à linha
+        repetidos = np.r_[False, (np.diff(pontos, axis=0) == 0).all(axis=1)]
+        pontos = pontos[~repetidos]
+        if deposito is not None:
+            pontos = np.vstack([deposito, pontos, deposito])
+        rotas[placa] = pontos.tolist()
+    return rotas
+
+
+def gerar_mapa(pedidos_df, cor_por="Placa", deposito=None, zoom_start=12):
+    """
+    Gera o mapa dos pedidos em uma única camada agrupada no cliente.
+
+    Parâmetros:
+      pedidos_df (DataFrame): Pedidos com Latitude e Longitude (e, opcionalmente, Endereço Completo,
+                              Placa, Regiao e Ordem de Entrega TSP).
+      cor_por (str): Coluna que define a cor dos pontos ("Placa" ou "Regiao"); ignorada se ausente.
+      deposito (tuple): Coordenadas (lat, lon) do endereço de partida, marcado no mapa e usado como
+                        início e fim das rotas.
+      zoom_start (int): Zoom inicial.
+
+    Retorna:
+      folium.Map: Mapa com os pontos e, se houver ordem de entrega, as rotas por Placa.
+    """
+    # Folium só é carregado ao gerar um mapa (não quando o HTML vem do cache)
+    import folium
+    from folium.plugins import FastMarkerCluster
+
+    pontos, rotulos, cores = agregar_pontos(pedidos_df, cor_por)
+    if deposito is not None:
+        centro = list(deposito)
+    elif len(pontos):
+        centro = [float(pontos["Latitude"].mean()), float(pontos["Longitude"].mean())]
+    else:
+        return folium.Map(location=[0, 0], zoom_start=2)
+
+    mapa = folium.Map(location=centro, zoom_start=zoom_start, prefer_canvas=True)
+    rotulo = cor_por if cor_por and cor_por in pedidos_df.columns else "Grupo"
+    callback = (f"(function () {{ var CORES = {json.dumps(cores)}; var ROTULOS = {json.dumps(rotulos)}; "
+                f"var ROTULO = {json.dumps(rotulo)}; return {CALLBACK_PONTO.strip()}; }})()")
+    dados = pontos[["Latitude", "Longitude", "cor", "pedidos", "endereco"]].to_numpy().tolist()
+    FastMarkerCluster(dados, callback=callback, name="Pedidos", disableClusteringAtZoom=16,
+                      chunkedLoading=True).add_to(mapa)
+
+    if "Placa" in pedidos_df.columns:
+        cor_da_placa = dict(zip(rotulos, cores)) if rotulo == "Placa" else {}
+        for placa, coordenadas in _rotas(pedidos_df, deposito).items():
+            folium.PolyLine(coordenadas, color=cor_da_placa.get(str(placa), "#444"), weight=3, opacity=0.7,
+                            tooltip=f"Placa: {placa}").add_to(mapa)
+
+    if deposito is not None:
+        folium.Marker(location=list(deposito), popup="Endereço de Partida",
+                      icon=folium.Icon(color="red")).add_to(mapa)
+    return mapa
+
+
+def chave_mapa(pedidos_df, cor_por="Placa", deposito=None):
+    """
+    Hash (hex) do conteúdo do mapa: colunas exibidas dos pedidos e opções de desenho.
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    presentes = [coluna for coluna in COLUNAS_MAPA if coluna in pedidos_df.columns]
+    hasher.update(json.dumps([presentes, cor_por, deposito, len(pedidos_df)], default=str).encode())
+    if presentes and len(pedidos_df):
+        hasher.update(pd.util.hash_pandas_object(pedidos_df[presentes], index=False).to_numpy().tobytes())
+    return hasher.hexdigest()
+
+
+_cache = None
+_trava_modulo = threading.Lock()
+
+
+def _obter_cache():
+    global _cache
+    if _cache is None:
+        with _trava_modulo:
+            if _cache is None:
+                _cache = CacheResultados(MAPAS_CACHE_DIR, int(MAPAS_CACHE_MAX_MB * 1e6), nome="mapas")
+    return _cache
+
+
+def mapa_html(pedidos_df, cor_por="Placa", deposito=None, chave=None):
+    """
+    HTML completo do mapa, servido do cache quando os mesmos pontos já foram desenhados.
+
+    Parâmetros:
+      chave (str): Hash já calculado por chave_mapa, para evitar recalculá-lo.
+
+    Retorna:
+      str: Página HTML do mapa.
+    """
+    chave = chave or chave_mapa(pedidos_df, cor_por, deposito)
+    guardado = _obter_cache().obter(chave)
+    if guardado is not None:
+        return guardado["html"]
+    html = gerar_mapa(pedidos_df, cor_por=cor_por, deposito=deposito).get_root().render()
+    _obter_cache().guardar(chave, {"html": html})
+    logging.info(f"Mapa gerado e guardado em cache ({chave}, {len(html) / 1e6:.1f} MB).")
+    return html
@@ -1,27 +1,25 @@
+import logging
+
 import numpy as np
 import pandas as pd
-from geopy.distance import geodesic
-from sklearn.cluster import KMeans, DBSCAN
-import streamlit as st
-import logging
 
-logging.basicConfig(level=logging.INFO, filename="roterizacao.log", filemode="a",
-                    format="%(asctime)s - %(levelname)s - %(message)s")
+from armazenamento import carregar_dataset
 
 def calcular_distancia(coord1, coord2):
     """
     Calcula a distância em km entre duas coordenadas.
     """
+    from geopy.distance import geodesic
+
     try:
         return geodesic(coord1, coord2).km
     except Exception as e:
-        st.write(f"Erro calculando distância: {e}")
+        logging.warning(f"Erro calculando distância: {e}")
         return float('inf')
 
-@st.cache_data
 def gerar_matriz_distancias(pedidos_df):
     """
-    Gera e armazena em cache a matriz de distâncias com base nas coordenadas dos pedidos.
+    Gera a matriz de distâncias com base nas coordenadas dos pedidos.
     """
     coords = list(zip(pedidos_df['Latitude'], pedidos_df['Longitude']))
     n = len(coords)
@@ -34,11 +32,13 @@ def gerar_matriz_distancias(pedidos_df):
                 matriz[i][j] = 0
     return matriz
 
-def tsp_nearest_neighbor(pedidos_df):
+def tsp_nearest_neighbor(pedidos_df, matriz=None):
     """
     Aplica a heurística do vizinho mais próximo para TSP e retorna a ordem dos índices.
+    A matriz de distâncias é gerada a partir dos pedidos se não for informada.
     """
-    matriz = gerar_matriz_distancias(pedidos_df)
+    if matriz is None:
+        matriz = gerar_matriz_distancias(pedidos_df)
     n = len(matriz)
     if n == 0:
         return []
@@ -91,6 +91,8 @@ def agrupar_por_regiao(pedidos_df, metodo='kmeans', n_clusters=3, eps=0.01, min_
     """
     Agrupa os pedidos em regiões utilizando K-Means ou DBSCAN com base em Latitude e Longitude.
     """
+    from sklearn.cluster import KMeans, DBSCAN
+
     if pedidos_df.empty:
         pedidos_df['Regiao'] = []
         return pedidos_df
@@ -109,66 +111,77 @@ def agrupar_por_regiao(pedidos_df, metodo='kmeans', n_clusters=3, eps=0.01, min_
 
     return pedidos_df
 
-# Bloco de interface Streamlit para testes do TSP
-try:
-    pedidos_df = pd.read_excel("database/roterizacao_resultado.xlsx", engine="openpyxl")
-except Exception as e:
-    st.error("Planilha de Pedidos não encontrada. Envie a planilha de pedidos.")
-    pedidos_df = pd.DataFrame()
-
-# Validação de dados
-required_columns = ['Latitude', 'Longitude', 'Peso dos Itens', 'Qtde. dos Itens']
-if not all(col in pedidos_df.columns for col in required_columns):
-    st.error(f"As colunas necessárias {required_columns} não foram encontradas no DataFrame.")
-    st.stop()
-
-if pedidos_df[required_columns].isnull().any().any():
-    st.error("O DataFrame contém valores nulos. Verifique os dados e tente novamente.")
-    st.stop()
-
-if st.button("Roteirizar Pedidos"):
-    st.write("Roteirização em execução...")
-    st.write("Aguarde, estamos agrupando os pedidos por regiões...")
-    
-    # Escolha do método de agrupamento
-    metodo = st.selectbox("Escolha o método de agrupamento:", ["kmeans", "dbscan"])
-    if metodo == "kmeans":
-        n_clusters = st.slider("Número de Clusters (K-Means):", min_value=2, max_value=10, value=3)
-        pedidos_df = agrupar_por_regiao(pedidos_df, metodo=metodo, n_clusters=n_clusters)
-    elif metodo == "dbscan":
-        eps = st.slider("Distância Máxima (DBSCAN - eps):", min_value=0.001, max_value=0.1, value=0.01, step=0.001)
-        min_samples = st.slider("Mínimo de Pontos por Cluster (DBSCAN):", min_value=1, max_value=10, value=2)
-        pedidos_df = agrupar_por_regiao(pedidos_df, metodo=metodo, eps=eps, min_samples=min_samples)
-
-    st.write("Pedidos agrupados com sucesso!")
-    
-    # Relatório de clusters
-    cluster_report = pedidos_df.groupby('Regiao').agg({
-        'Peso dos Itens': 'sum',
-        'Qtde. dos Itens': 'sum',
-        'Regiao': 'count'
-    }).rename(columns={'Regiao': 'Total de Pedidos'})
-
-    st.write("Relatório de Clusters:")
-    st.dataframe(cluster_report)
-    
-    # Seleciona os pedidos da região 0 para rodar o TSP
-    pedidos_regiao = pedidos_df[pedidos_df['Regiao'] == 0].reset_index(drop=True)
-    if not pedidos_regiao.empty:
-        st.write("Calculando a rota otimizada...")
-        
-        # Ordena os pedidos por peso, quantidade de itens e coordenadas
-        pedidos_regiao = pedidos_regiao.sort_values(
-            by=['Peso dos Itens', 'Qtde. dos Itens', 'Latitude', 'Longitude'], 
-            ascending=[False, False, True, True]
-        )
-        
-        rota = tsp_nearest_neighbor(pedidos_regiao)
-        matriz = gerar_matriz_distancias(pedidos_regiao)
-        rota_otimizada = otimizacao_2opt(rota, matriz)
-        distancia_total = route_distance(rota_otimizada, matriz)
-        rota_enderecos = " → ".join(pedidos_regiao.loc[i, 'Endereço Completo'] for i in rota_otimizada)
-        st.success(f"Rota Otimizada: {rota_enderecos}")
-        st.info(f"Distância Total da Rota: {distancia_total:.2f} km")
-    else:
-        st.error("Não há pedidos na região selecionada para roteirização.")
\ No newline at end of file
+
+def main():
+    """
+    Interface Streamlit para testes do TSP (streamlit run melhorias_roterizacao.py).
+    Fica fora do nível do módulo para que importar as funções acima não desenhe widgets.
+    """
+    import streamlit as st
+
+    # Validação de dados
+    required_columns = ['Latitude', 'Longitude', 'Peso dos Itens', 'Qtde. dos Itens']
+
+    try:
+        pedidos_df = carregar_dataset("resultado", colunas=required_columns + ['Endereço Completo'])
+    except Exception as e:
+        st.error("Planilha de Pedidos não encontrada. Envie a planilha de pedidos.")
+        pedidos_df = pd.DataFrame()
+    if not all(col in pedidos_df.columns for col in required_columns):
+        st.error(f"As colunas necessárias {required_columns} não foram encontradas no DataFrame.")
+        st.stop()
+
+    if pedidos_df[required_columns].isnull().any().any():
+        st.error("O DataFrame contém valores nulos. Verifique os dados e tente novamente.")
+        st.stop()
+
+    if st.button("Roteirizar Pedidos"):
+        st.write("Roteirização em execução...")
+        st.write("Aguarde, estamos agrupando os pedidos por regiões...")
+
+        # Escolha do método de agrupamento
+        metodo = st.selectbox("Escolha o método de agrupamento:", ["kmeans", "dbscan"])
+        if metodo == "kmeans":
+            n_clusters = st.slider("Número de Clusters (K-Means):", min_value=2, max_value=10, value=3)
+            pedidos_df = agrupar_por_regiao(pedidos_df, metodo=metodo, n_clusters=n_clusters)
+        elif metodo == "dbscan":
+            eps = st.slider("Distância Máxima (DBSCAN - eps):", min_value=0.001, max_value=0.1, value=0.01, step=0.001)
+            min_samples = st.slider("Mínimo de Pontos por Cluster (DBSCAN):", min_value=1, max_value=10, value=2)
+            pedidos_df = agrupar_por_regiao(pedidos_df, metodo=metodo, eps=eps, min_samples=min_samples)
+
+        st.write("Pedidos agrupados com sucesso!")
+
+        # Relatório de clusters
+        cluster_report = pedidos_df.groupby('Regiao').agg({
+            'Peso dos Itens': 'sum',
+            'Qtde. dos Itens': 'sum',
+            'Regiao': 'count'
+        }).rename(columns={'Regiao': 'Total de Pedidos'})
+
+        st.write("Relatório de Clusters:")
+        st.dataframe(cluster_report)
+
+        # Seleciona os pedidos da região 0 para rodar o TSP
+        pedidos_regiao = pedidos_df[pedidos_df['Regiao'] == 0].reset_index(drop=True)
+        if not pedidos_regiao.empty:
+            st.write("Calculando a rota otimizada...")
+
+            # Ordena os pedidos por peso, quantidade de itens e coordenadas
+            pedidos_regiao = pedidos_regiao.sort_values(
+                by=['Peso dos Itens', 'Qtde. dos Itens', 'Latitude', 'Longitude'], 
+                ascending=[False, False, True, True]
+            )
+
+            matriz = gerar_matriz_distancias(pedidos_regiao)
+            rota = tsp_nearest_neighbor(pedidos_regiao, matriz)
+            rota_otimizada = otimizacao_2opt(rota, matriz)
+            distancia_total = route_distance(rota_otimizada, matriz)
+            rota_enderecos = " → ".join(pedidos_regiao.loc[i, 'Endereço Completo'] for i in rota_otimizada)
+            st.success(f"Rota Otimizada: {rota_enderecos}")
+            st.info(f"Distância Total da Rota: {distancia_total:.2f} km")
+        else:
+            st.error("Não há pedidos na região selecionada para roteirização.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Módulo de métricas
+
+Contadores, medidores e histogramas em memória, exportados no formato de texto do Prometheus
+pelo endpoint /metrics da API. Registrar um valor custa uma atualização de dict sob uma trava,
+o que permite manter as métricas sempre ligadas.
+
+Métricas do sistema:
+  roteirizador_etapa_segundos{etapa}: duração das etapas do pipeline (histograma);
+  roteirizador_etapa_erros_total{etapa}: etapas interrompidas por exceção;
+  roteirizador_cache_consultas_total{cache, resultado}: acertos e faltas dos caches
+    (geocodificacao, distancias, resultados, mapas, datasets);
+  roteirizador_solver_iteracoes_total{algoritmo}, roteirizador_solver_segundos{algoritmo}:
+    iterações e duração dos algoritmos (a taxa de iterações por segundo sai da razão entre os dois);
+  roteirizador_solver_melhor_custo{algoritmo}: melhor custo (ou fitness) da última execução;
+  roteirizador_http_requisicoes_total{endpoint, metodo, status} e roteirizador_http_segundos{endpoint}.
+
+As tarefas da API rodam em outros processos: o processo de trabalho devolve suas métricas
+(instantaneo) junto com a tarefa e o servidor as soma às suas (incorporar).
+"""
+
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+# Limites (em segundos) dos histogramas de duração
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_trava = threading.Lock()
+_metricas = {}
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = list(zip(nomes, valores)) + ([extra] if extra else [])
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+def _formatar_numero(valor):
+    if math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+    return repr(float(valor))
+
+
+class Metrica:
+    """
+    Base das métricas: nome, texto de ajuda e nomes dos rótulos; os valores ficam por combinação de rótulos.
+    """
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+
+    def _chave(self, rotulos):
+        return tuple(str(rotulos.get(nome, "")) for nome in self.rotulos)
+
+    def zerar(self):
+        with _trava:
+            self._valores.clear()
+
+
+class Contador(Metrica):
+    tipo = "counter"
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with _trava:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def _linhas(self):
+        for chave, valor in self._valores.items():
+            yield f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}"
+
+    def _somar(self, valores):
+        for chave, valor in valores:
+            chave = tuple(chave)
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+
+class Medidor(Contador):
+    tipo = "gauge"
+
+    def definir(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with _trava:
+            self._valores[chave] = valor
+
+    def _somar(self, valores):
+        # Medidores guardam o último valor, não uma soma
+        for chave, valor in valores:
+            self._valores[tuple(chave)] = valor
+
+
+class Histograma(Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), limites=LIMITES_SEGUNDOS):
+        super().__init__(nome, ajuda, rotulos)
+        self.limites = tuple(limites)
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with _trava:
+            contagens = self._valores.get(chave)
+            if contagens is None:
+                # Contagem por faixa (a última é +Inf) seguida da soma dos valores
+                contagens = self._valores[chave] = [0] * (len(self.limites) + 1) + [0.0]
+            for i, limite in enumerate(self.limites):
+                if valor <= limite:
+                    contagens[i] += 1
+                    break
+            else:
+                contagens[len(self.limites)] += 1
+            contagens[-1] += valor
+
+    def _linhas(self):
+        for chave, contagens in self._valores.items():
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (math.inf,), contagens):
+                acumulado += contagem
+                rotulos = _formatar_rotulos(self.rotulos, chave, ("le", _formatar_numero(limite)))
+                yield f"{self.nome}_bucket{rotulos} {acumulado}"
+            yield f"{self.nome}_sum{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(contagens[-1])}"
+            yield f"{self.nome}_count{_formatar_rotulos(self.rotulos, chave)} {acumulado}"
+
+    def _somar(self, valores):
+        for chave, contagens in valores:
+            chave = tuple(chave)
+            atuais = self._valores.get(chave)
+            self._valores[chave] = list(contagens) if atuais is None else [a + b for a, b in zip(atuais, contagens)]
+
+
+def _registrar(classe, nome, ajuda, rotulos=(), **opcoes):
+    with _trava:
+        metrica = _metricas.get(nome)
+        if metrica is None:
+            metrica = _metricas[nome] = classe(nome, ajuda, rotulos, **opcoes)
+        return metrica
+
+
+def contador(nome, ajuda, rotulos=()):
+    """
+    Retorna o contador `nome`, criando-o na primeira chamada.
+    """
+    return _registrar(Contador, nome, ajuda, rotulos)
+
+
+def medidor(nome, ajuda, rotulos=()):
+    """
+    Retorna o medidor (gauge) `nome`, criando-o na primeira chamada.
+    """
+    return _registrar(Medidor, nome, ajuda, rotulos)
+
+
+def histograma(nome, ajuda, rotulos=(), limites=LIMITES_SEGUNDOS):
+    """
+    Retorna o histograma `nome`, criando-o na primeira chamada.
+    """
+    return _registrar(Histograma, nome, ajuda, rotulos, limites=limites)
+
+
+ETAPA_SEGUNDOS = histograma("roteirizador_etapa_segundos", "Duração das etapas do pipeline.", ["etapa"])
+ETAPA_ERROS = contador("roteirizador_etapa_erros_total", "Etapas interrompidas por exceção.", ["etapa"])
+CACHE_CONSULTAS = contador("roteirizador_cache_consultas_total", "Consultas aos caches, por resultado.",
+                           ["cache", "resultado"])
+SOLVER_ITERACOES = contador("roteirizador_solver_iteracoes_total", "Iterações executadas pelos algoritmos.",
+                            ["algoritmo"])
+SOLVER_SEGUNDOS = histograma("roteirizador_solver_segundos", "Duração das execuções dos algoritmos.",
+                             ["algoritmo"])
+SOLVER_MELHOR_CUSTO = medidor("roteirizador_solver_melhor_custo",
+                              "Melhor custo (ou fitness) da última execução de cada algoritmo.", ["algoritmo"])
+
+
+@contextmanager
+def cronometrar(etapa):
+    """
+    Mede a duração do bloco em roteirizador_etapa_segundos; exceções também contam em
+    roteirizador_etapa_erros_total.
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        ETAPA_ERROS.inc(etapa=etapa)
+        raise
+    finally:
+        ETAPA_SEGUNDOS.observar(time.perf_counter() - inicio, etapa=etapa)
+
+
+def registrar_cache(cache, acertos=0, faltas=0):
+    """
+    Soma acertos e faltas de um cache em roteirizador_cache_consultas_total.
+    """
+    if acertos:
+        CACHE_CONSULTAS.inc(acertos, cache=cache, resultado="acerto")
+    if faltas:
+        CACHE_CONSULTAS.inc(faltas, cache=cache, resultado="falta")
+
+
+def registrar_solver(algoritmo, iteracoes, segundos, melhor_custo=None):
+    """
+    Registra uma execução de algoritmo: iterações, duração e melhor custo encontrado.
+    """
+    SOLVER_ITERACOES.inc(iteracoes, algoritmo=algoritmo)
+    SOLVER_SEGUNDOS.observar(segundos, algoritmo=algoritmo)
+    if melhor_custo is not None:
+        SOLVER_MELHOR_CUSTO.definir(float(melhor_custo), algoritmo=algoritmo)
+
+
+def texto_prometheus():
+    """
+    Todas as métricas no formato de texto do Prometheus (versão 0.0.4).
+    """
+    linhas = []
+    with _trava:
+        for metrica in _metricas.values():
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica._linhas())
+    return "\n".join(linhas) + "\n"
+
+
+def instantaneo():
+    """
+    Valores de todas as métricas em uma estrutura serializável (para enviar entre processos).
+    """
+    with _trava:
+        return {nome: [[list(chave), list(valor) if isinstance(valor, list) else valor]
+                       for chave, valor in metrica._valores.items()]
+                for nome, metrica in _metricas.items() if metrica._valores}
+
+
+def incorporar(valores):
+    """
+    Soma às métricas deste processo os valores de um instantaneo de outro processo.
+    Métricas desconhecidas neste processo são ignoradas.
+    """
+    with _trava:
+        for nome, itens in (valores or {}).items():
+            metrica = _metricas.get(nome)
+            if metrica is not None:
+                metrica._somar(itens)
+
+
+def zerar():
+    """
+    Zera todas as métricas (usado pelo processo de trabalho no início de cada tarefa).
+    """
+    for metrica in list(_metricas.values()):
+        metrica.zerar()
@@ -0,0 +1,142 @@
+"""
+Módulo de normalização de endereços
+
+Converte endereços escritos de formas diferentes ("R. Araújo Leite,146" e
+"Rua Araujo Leite, 146") em uma mesma forma canônica e em uma chave estável,
+usada pelos caches de geocodificação e de distâncias.
+"""
+
+import re
+import hashlib
+import unicodedata
+
+# Abreviações comuns em logradouros, bairros e cidades -> forma por extenso
+ABREVIACOES = {
+    "r": "rua",
+    "av": "avenida",
+    "avd": "avenida",
+    "al": "alameda",
+    "tv": "travessa",
+    "trav": "travessa",
+    "est": "estrada",
+    "estr": "estrada",
+    "rod": "rodovia",
+    "pc": "praca",
+    "pca": "praca",
+    "pq": "parque",
+    "jd": "jardim",
+    "jds": "jardins",
+    "jard": "jardim",
+    "vl": "vila",
+    "res": "residencial",
+    "cj": "conjunto",
+    "conj": "conjunto",
+    "chac": "chacara",
+    "lot": "loteamento",
+    "dist": "distrito",
+    "sta": "santa",
+    "sto": "santo",
+    "dr": "doutor",
+    "dra": "doutora",
+    "prof": "professor",
+    "profa": "professora",
+    "eng": "engenheiro",
+    "cel": "coronel",
+    "cap": "capitao",
+    "ten": "tenente",
+    "sgt": "sargento",
+    "mal": "marechal",
+    "gal": "general",
+    "gen": "general",
+    "pres": "presidente",
+    "gov": "governador",
+    "ver": "vereador",
+    "dep": "deputado",
+    "com": "comendador",
+    "pe": "padre",
+    "n": "",
+    "no": "",
+    "nro": "",
+    "num": "",
+}
+
+# Sufixos de estado/país que não ajudam a distinguir endereços
+SUFIXOS_IGNORADOS = {"brasil", "brazil", "sp"}
+
+_RE_PONTO_MILHAR = re.compile(r"(?<=\d)\.(?=\d{3}\b)")
+_RE_SEM_NUMERO = re.compile(r"\bs\s*/\s*n[º°o]?\b")
+_RE_NAO_ALFANUM = re.compile(r"[^0-9a-z]+")
+_RE_ZEROS_ESQUERDA = re.compile(r"\b0+(?=\d)")
+
+
+def remover_acentos(texto):
+    """
+    Remove acentos e cedilhas, mantendo apenas caracteres ASCII.
+    """
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+
+
+def normalizar_endereco(endereco):
+    """
+    Gera a forma canônica de um endereço.
+
+    - Converte para minúsculas e remove acentos e pontuação.
+    - Expande abreviações (R. -> rua, Jd -> jardim, ...).
+    - Padroniza números ("1.109" -> "1109", "nº 0146" -> "146", "s/n" -> "sn").
+    - Descarta sufixos de estado/país ("- SP", "Brasil").
+
+    Parâmetros:
+      endereco (str): Endereço em texto livre.
+
+    Retorna:
+      str: Endereço canônico (tokens separados por um espaço) ou "" se vazio.
+    """
+    if endereco is None:
+        return ""
+    texto = remover_acentos(str(endereco)).lower()
+    texto = texto.replace("º", "").replace("°", "")
+    texto = _RE_PONTO_MILHAR.sub("", texto)
+    texto = _RE_SEM_NUMERO.sub(" sn ", texto)
+    texto = _RE_NAO_ALFANUM.sub(" ", texto)
+    texto = _RE_ZEROS_ESQUERDA.sub("", texto)
+
+    tokens = []
+    for token in texto.split():
+        token = ABREVIACOES.get(token, token)
+        if token:
+            tokens.extend(token.split())
+    while tokens and tokens[-1] in SUFIXOS_IGNORADOS:
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def chave_endereco(endereco):
+    """
+    Retorna a chave estável (hash hexadecimal de 32 caracteres) da forma canônica do endereço.
+    Endereços equivalentes geram a mesma chave em qualquer processo ou execução.
+    """
+    canonico = normalizar_endereco(endereco)
+    return hashlib.blake2b(canonico.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def montar_endereco_completo(df, colunas=("Endereço de Entrega", "Bairro de Entrega", "Cidade de Entrega")):
+    """
+    Monta a coluna de endereço completo a partir das colunas de logradouro, bairro e cidade.
+    Partes vazias são omitidas e os espaços extras removidos, de forma vetorizada.
+
+    Parâmetros:
+      df (DataFrame): Pedidos.
+      colunas (tuple): Colunas a concatenar, na ordem.
+
+    Retorna:
+      Series: Endereços no formato "logradouro, bairro, cidade".
+    """
+    partes = [
+        df[coluna].astype("string").str.strip().str.replace(r"\s+", " ", regex=True).fillna("")
+        for coluna in colunas
+    ]
+    completo = partes[0]
+    for parte in partes[1:]:
+        separador = (completo != "") & (parte != "")
+        completo = completo + separador.map({True: ", ", False: ""}) + parte
+    return completo.astype(object)
@@ -2,74 +2,62 @@
 Módulo de otimização
 
 Contém funções do algoritmo genético para otimização de cargas.
+
+Cada solução é um array com a posição do caminhão atribuído a cada pedido da
+RoutingInstance (ver instancia.py); pesos e caixas por caminhão são somados com
+np.bincount, sem indexar DataFrames a cada avaliação.
 """
 
-import random
-import numpy as np
+import time
 import logging
 
-logging.basicConfig(level=logging.INFO, filename="optimization.log", filemode="a",
-                    format="%(asctime)s - %(levelname)s - %(message)s")
+import numpy as np
+
+from instancia import RoutingInstance
+from progresso import emitir
+from metricas import registrar_solver
+from perfilamento import secao
+from config import LOG_INTERVALO_GERACOES
 
-def populacao_inicial(pedidos_df, caminhoes_df, tamanho=50):
+def populacao_inicial(instancia, tamanho=50, rng=None):
     """
     Cria uma população inicial aleatória de soluções.
     
-    Cada solução é um dicionário mapeando IDs de pedidos a IDs de caminhões.
+    Cada solução é um array de tamanho num_pedidos com a posição do caminhão de cada pedido.
     """
-    population = []
-    pedidos_ids = pedidos_df.index.tolist()
-    caminhoes_ids = caminhoes_df.index.tolist()
-    for _ in range(tamanho):
-        sol = {pedido: random.choice(caminhoes_ids) for pedido in pedidos_ids}
-        population.append(sol)
-    logging.info(f"População inicial criada com {tamanho} soluções.")
+    rng = rng or np.random.default_rng()
+    population = [rng.integers(0, instancia.num_caminhoes, size=instancia.num_pedidos, dtype=np.int32)
+                  for _ in range(tamanho)]
+    logging.info("População inicial criada com %d soluções.", tamanho)
     return population
 
-def avaliacao_fitness(solucao, pedidos_df, caminhoes_df):
+def _excedidos(solucao, instancia):
+    peso_total, volume_total = instancia.cargas(solucao)
+    excedidos = (peso_total > instancia.capacidades_kg) | (volume_total > instancia.capacidades_cx)
+    return peso_total, volume_total, excedidos
+
+def avaliacao_fitness(solucao, instancia):
     """
     Calcula o fitness de uma solução considerando peso, volume e capacidade.
     
     Retorna:
       float: Valor de fitness.
     """
-    fitness = 0
-    capacidade_excedida = False
-    for caminhao_id in caminhoes_df.index:
-        pedidos_caminhao = [pedido for pedido, caminhao in solucao.items() if caminhao == caminhao_id]
-        peso_total = pedidos_df.loc[pedidos_caminhao, "Peso dos Itens"].sum()
-        volume_total = pedidos_df.loc[pedidos_caminhao, "Qtde. dos Itens"].sum()
-        capacidade_peso = caminhoes_df.loc[caminhao_id, "Capac. Kg"]
-        capacidade_volume = caminhoes_df.loc[caminhao_id, "Capac. Cx"]
-
-        # Penaliza soluções que excedem a capacidade do caminhão
-        if peso_total > capacidade_peso or volume_total > capacidade_volume:
-            capacidade_excedida = True
-            fitness -= 1000  # Penalidade alta para soluções inválidas
-        else:
-            fitness += peso_total + volume_total  # Maximiza o uso da capacidade
-
-    if capacidade_excedida:
-        logging.warning("Solução com capacidade excedida encontrada.")
+    peso_total, volume_total, excedidos = _excedidos(solucao, instancia)
+    # Penaliza com -1000 cada caminhão que excede a capacidade; os demais somam o uso da capacidade
+    fitness = float(np.sum((peso_total + volume_total)[~excedidos])) - 1000.0 * int(excedidos.sum())
+    if excedidos.any():
+        logging.debug("Solução com capacidade excedida encontrada.")
     return fitness
 
-def validar_solucao(solucao, pedidos_df, caminhoes_df):
+def validar_solucao(solucao, instancia):
     """
     Valida se a solução respeita as restrições de capacidade dos caminhões.
     
     Retorna:
       bool: True se a solução for válida, False caso contrário.
     """
-    for caminhao_id in caminhoes_df.index:
-        pedidos_caminhao = [pedido for pedido, caminhao in solucao.items() if caminhao == caminhao_id]
-        peso_total = pedidos_df.loc[pedidos_caminhao, "Peso dos Itens"].sum()
-        volume_total = pedidos_df.loc[pedidos_caminhao, "Qtde. dos Itens"].sum()
-        capacidade_peso = caminhoes_df.loc[caminhao_id, "Capac. Kg"]
-        capacidade_volume = caminhoes_df.loc[caminhao_id, "Capac. Cx"]
-
-        if peso_total > capacidade_peso or volume_total > capacidade_volume:
-            return False
-    return True
+    return not _excedidos(solucao, instancia)[2].any()
 
 def selecionar(population, fitnesses, num=10):
     """
@@ -78,59 +66,84 @@ def selecionar(population, fitnesses, num=10):
     Retorna:
       list: Subconjunto da população.
     """
-    sorted_population = [sol for _, sol in sorted(zip(fitnesses, population), key=lambda x: x[0], reverse=True)]
-    logging.info(f"Selecionadas as {num} melhores soluções.")
-    return sorted_population[:num]
+    ordem = np.argsort(fitnesses, kind="stable")[::-1][:num]
+    logging.debug("Selecionadas as %d melhores soluções.", num)
+    return [population[i] for i in ordem]
 
-def cruzar(sol1, sol2):
+def cruzar(sol1, sol2, rng=None):
     """
-    Realiza crossover entre duas soluções.
+    Realiza crossover uniforme entre duas soluções.
     """
-    filho = {}
-    for key in sol1.keys():
-        filho[key] = sol1[key] if random.random() < 0.5 else sol2[key]
-    logging.debug("Crossover realizado entre duas soluções.")
-    return filho
+    rng = rng or np.random.default_rng()
+    return np.where(rng.random(len(sol1)) < 0.5, sol1, sol2)
 
-def mutacao(solucao, caminhoes_ids, taxa=0.1):
+def mutacao(solucao, num_caminhoes, taxa=0.1, rng=None):
     """
     Aplica mutação à solução, alterando mapeamentos aleatórios.
     """
-    for pedido in solucao.keys():
-        if random.random() < taxa:
-            solucao[pedido] = random.choice(caminhoes_ids)
-    logging.debug("Mutação aplicada a uma solução.")
+    rng = rng or np.random.default_rng()
+    mutados = rng.random(len(solucao)) < taxa
+    solucao[mutados] = rng.integers(0, num_caminhoes, size=int(mutados.sum()), dtype=solucao.dtype)
     return solucao
 
-def run_genetic_algorithm(pedidos_df, caminhoes_df, geracoes=100, tamanho_pop=50):
+@secao("run_genetic_algorithm")
+def run_genetic_algorithm(pedidos, caminhoes_df=None, geracoes=100, tamanho_pop=50, semente=None, progresso=None):
     """
     Executa o algoritmo genético e retorna a melhor solução encontrada.
+
+    Parâmetros:
+      pedidos (RoutingInstance ou DataFrame): Instância já montada ou DataFrame de pedidos
+                                              (neste caso, caminhoes_df é obrigatório).
+      semente (int): Semente do gerador aleatório, para execuções reprodutíveis.
+      progresso (callable): Chamado como progresso(geracao, geracoes, melhor_fitness) ao fim de cada
+                            geração; uma exceção lançada por ele interrompe o algoritmo. A cada geração
+                            também é emitido um evento de progresso (ver progresso.py).
     
     Retorna:
-      dict: Contendo a solução e o fitness.
+      dict: Contendo a solução (ID do pedido -> ID do caminhão) e o fitness.
     """
-    population = populacao_inicial(pedidos_df, caminhoes_df, tamanho=tamanho_pop)
+    instancia = pedidos if isinstance(pedidos, RoutingInstance) else RoutingInstance.de_dataframes(pedidos, caminhoes_df)
+    if instancia.num_caminhoes == 0 or instancia.num_pedidos == 0:
+        return {"solucao": {}, "fitness": 0.0}
+    inicio = time.perf_counter()
+    rng = np.random.default_rng(semente)
+    population = populacao_inicial(instancia, tamanho=tamanho_pop, rng=rng)
     melhor_solucao = None
     melhor_fitness = -np.inf
 
     for geracao in range(geracoes):
-        fitnesses = [avaliacao_fitness(sol, pedidos_df, caminhoes_df) for sol in population]
+        fitnesses = [avaliacao_fitness(sol, instancia) for sol in population]
+        indice_melhor = int(np.argmax(fitnesses))
+        if fitnesses[indice_melhor] > melhor_fitness:
+            melhor_fitness = fitnesses[indice_melhor]
+            melhor_solucao = population[indice_melhor].copy()
+
         melhores = selecionar(population, fitnesses, num=10)
         nova_pop = []
         for _ in range(tamanho_pop):
-            sol1, sol2 = random.sample(melhores, 2)
-            filho = cruzar(sol1, sol2)
-            filho = mutacao(filho, caminhoes_df.index.tolist())
-            if validar_solucao(filho, pedidos_df, caminhoes_df):
+            if len(melhores) > 1:
+                i, j = rng.choice(len(melhores), size=2, replace=False)
+                filho = cruzar(melhores[i], melhores[j], rng=rng)
+            else:
+                filho = melhores[0].copy()
+            filho = mutacao(filho, instancia.num_caminhoes, rng=rng)
+            if validar_solucao(filho, instancia):
                 nova_pop.append(filho)
-        population = nova_pop
-
-        melhor_iter = max(fitnesses)
-        if melhor_iter > melhor_fitness:
-            melhor_fitness = melhor_iter
-            melhor_solucao = population[fitnesses.index(melhor_iter)]
-
-        logging.info(f"Geração {geracao + 1}/{geracoes}: Melhor fitness = {melhor_fitness:.2f}")
-
-    logging.info("Algoritmo genético concluído.")
-    return {"solucao": melhor_solucao, "fitness": melhor_fitness}
\ No newline at end of file
+        # Sem filhos válidos, a próxima geração parte das melhores soluções atuais
+        population = nova_pop or melhores
+
+        # Amostrado: registrar toda geração custa uma fração visível das execuções longas
+        if (geracao + 1) % LOG_INTERVALO_GERACOES == 0 or geracao + 1 == geracoes:
+            logging.info("Geração %d/%d: melhor fitness = %.2f", geracao + 1, geracoes, melhor_fitness,
+                         extra={"geracao": geracao + 1, "melhor_fitness": float(melhor_fitness)})
+        emitir((geracao + 1) / geracoes, algoritmo="algoritmo_genetico", iteracao=geracao + 1, total=geracoes,
+               melhor_fitness=float(melhor_fitness))
+        if progresso:
+            progresso(geracao + 1, geracoes, melhor_fitness)
+
+    duracao = time.perf_counter() - inicio
+    logging.info("Algoritmo genético concluído em %.2f s.", duracao,
+                 extra={"geracoes": geracoes, "segundos": round(duracao, 3), "melhor_fitness": float(melhor_fitness)})
+    registrar_solver("algoritmo_genetico", geracoes, duracao, melhor_fitness)
+    solucao = dict(zip(instancia.ids_pedidos.tolist(), instancia.ids_caminhoes[melhor_solucao].tolist()))
+    return {"solucao": solucao, "fitness": melhor_fitness}
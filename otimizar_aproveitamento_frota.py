@@ -1,65 +1,65 @@
+import numpy as np
+import pandas as pd
 import streamlit as st
 from agrupar_por_regiao import agrupar_por_regiao
+from instancia import RoutingInstance
 
 def otimizar_aproveitamento_frota(pedidos_df, caminhoes_df, percentual_frota, max_pedidos, n_clusters=3, metodo='kmeans'):
-    # Inicializa as colunas de alocação
-    pedidos_df['Carga'] = 0
-    pedidos_df['Placa'] = ""
-    carga_numero = 1
-    
-    # Ajusta a capacidade da frota com base no percentual informado
-    caminhoes_df['Capac. Kg'] *= (percentual_frota / 100)
-    caminhoes_df['Capac. Cx'] *= (percentual_frota / 100)
     # Filtra somente os caminhões disponíveis ("Sim")
     caminhoes_df = caminhoes_df[caminhoes_df['Disponível'] == 'Sim']
     
     # Agrupa os pedidos por região utilizando o método e os clusters informados
     pedidos_df = agrupar_por_regiao(pedidos_df, metodo=metodo, n_clusters=n_clusters)
+    instancia = RoutingInstance.de_dataframes(pedidos_df, caminhoes_df)
+
+    # Ajusta a capacidade da frota com base no percentual informado
+    capacidades_kg = instancia.capacidades_kg * (percentual_frota / 100)
+    capacidades_cx = instancia.capacidades_cx * (percentual_frota / 100)
+
+    # Inicializa as colunas de alocação (gravadas no DataFrame ao final)
+    cargas = np.zeros(instancia.num_pedidos, dtype=np.int32)
+    placas = np.full(instancia.num_pedidos, "", dtype=object)
+    carga_numero = 1
+
+    # Ordena os pedidos por peso e quantidade de itens (priorizando os maiores)
+    ordem = np.lexsort((-instancia.caixas, -instancia.pesos))
+    regioes, nomes_regioes = pd.factorize(pedidos_df['Regiao'])
     
     # Para cada região, aloca os pedidos aos caminhões disponíveis
-    for regiao in pedidos_df['Regiao'].unique():
+    for codigo, regiao in enumerate(nomes_regioes):
         st.write(f"Alocando pedidos para a região {regiao}...")
-        pedidos_regiao = pedidos_df[pedidos_df['Regiao'] == regiao]
+        da_regiao = ordem[regioes[ordem] == codigo]
         
-        # Ordena os pedidos por peso e quantidade de itens (priorizando os maiores)
-        pedidos_regiao = pedidos_regiao.sort_values(by=['Peso dos Itens', 'Qtde. dos Itens'], ascending=False)
-        
-        for _, caminhao in caminhoes_df.iterrows():
-            capacidade_peso = caminhao['Capac. Kg']
-            capacidade_caixas = caminhao['Capac. Cx']
+        for caminhao in range(instancia.num_caminhoes):
+            placa = instancia.placas[caminhao]
             
-            # Seleciona pedidos que cabem nas capacidades do caminhão
-            pedidos_alocados = pedidos_regiao[
-                (pedidos_regiao['Peso dos Itens'] <= capacidade_peso) & 
-                (pedidos_regiao['Qtde. dos Itens'] <= capacidade_caixas)
-            ]
+            # Seleciona pedidos ainda não alocados que cabem nas capacidades do caminhão
+            candidatos = da_regiao[(cargas[da_regiao] == 0)
+                                   & (instancia.pesos[da_regiao] <= capacidades_kg[caminhao])
+                                   & (instancia.caixas[da_regiao] <= capacidades_cx[caminhao])]
             
-            # Ordena os pedidos para maximizar o aproveitamento do caminhão
-            pedidos_alocados = pedidos_alocados.sort_values(by=['Peso dos Itens', 'Qtde. dos Itens'], ascending=False)
-            pedidos_alocados = pedidos_alocados.head(max_pedidos)
+            # Mantém os maiores pedidos enquanto couberem na capacidade restante
+            cabem = ((np.cumsum(instancia.pesos[candidatos]) <= capacidades_kg[caminhao])
+                     & (np.cumsum(instancia.caixas[candidatos]) <= capacidades_cx[caminhao]))
+            alocados = candidatos[cabem][:max_pedidos]
             
-            if not pedidos_alocados.empty:
-                pedidos_df.loc[pedidos_alocados.index, 'Carga'] = carga_numero
-                pedidos_df.loc[pedidos_alocados.index, 'Placa'] = caminhao['Placa']
-                
-                # Atualiza as capacidades do caminhão
-                capacidade_peso -= pedidos_alocados['Peso dos Itens'].sum()
-                capacidade_caixas -= pedidos_alocados['Qtde. dos Itens'].sum()
+            if alocados.size:
+                cargas[alocados] = carga_numero
+                placas[alocados] = placa
                 carga_numero += 1
-                
-                # Verifica se o caminhão foi sobrecarregado
-                if capacidade_peso < 0 or capacidade_caixas < 0:
-                    st.error(f"O caminhão {caminhao['Placa']} foi sobrecarregado. Verifique os dados.")
             else:
-                st.warning(f"Nenhum pedido foi alocado para o caminhão {caminhao['Placa']} na região {regiao}.")
+                st.warning(f"Nenhum pedido foi alocado para o caminhão {placa} na região {regiao}.")
+
+    pedidos_df['Carga'] = cargas
+    pedidos_df['Placa'] = placas
     
     # Verifica se houve erro na alocação
-    if pedidos_df['Placa'].isnull().any() or pedidos_df['Carga'].isnull().any():
+    if (cargas == 0).any():
         st.error("Não foi possível atribuir placas ou números de carga a alguns pedidos. Verifique os dados e tente novamente.")
     
     # Relatório final
     total_pedidos = len(pedidos_df)
-    pedidos_alocados = len(pedidos_df[pedidos_df['Placa'] != ""])
+    pedidos_alocados = int((cargas > 0).sum())
     st.success(f"Pedidos alocados: {pedidos_alocados}/{total_pedidos} ({(pedidos_alocados / total_pedidos) * 100:.2f}%)")
     
-    return pedidos_df
\ No newline at end of file
+    return pedidos_df
@@ -0,0 +1,174 @@
+"""
+Módulo de perfilamento
+
+Modo de diagnóstico, ligado por requisição (?perfilar=1, "perfilar": true em /jobs) ou por
+execução no Streamlit, que registra onde o tempo e a memória foram gastos:
+
+- cProfile de toda a execução (thread atual), salvo em perfil.prof (abra com pstats ou snakeviz);
+- tracemalloc, com o pico de memória de cada seção marcada com `secao` (geocodificação,
+  agrupamento, alocação, algoritmo genético, TSP) e os pontos do código que mais alocaram;
+- relatorio.txt, com as seções, as funções mais custosas e as maiores alocações.
+
+Os arquivos ficam em PERFIS_DIR/<id>, ao lado do resultado da tarefa, para anexar a chamados.
+Com o modo desligado, `secao` apenas consulta uma variável de contexto e chama a função
+original: nenhum perfilador ou rastreamento de memória fica ativo.
+
+O tracemalloc é global ao processo: execuções perfiladas simultâneas (por exemplo, duas
+requisições ?perfilar=1 no servidor com threads) são serializadas, para que o pico de memória de
+uma não entre no relatório da outra nem uma desligue o rastreamento enquanto a outra mede.
+"""
+
+import io
+import os
+import time
+import uuid
+import pstats
+import cProfile
+import functools
+import threading
+import contextvars
+import tracemalloc
+from contextlib import contextmanager
+
+from config import PERFIS_DIR
+
+# Quadros de pilha guardados por alocação no tracemalloc (mais quadros, mais custo)
+QUADROS_TRACEMALLOC = 5
+# Linhas de cada tabela do relatório
+LINHAS_RELATORIO = 30
+
+ARQUIVO_PROFILE = "perfil.prof"
+ARQUIVO_RELATORIO = "relatorio.txt"
+
+_sessao = contextvars.ContextVar("sessao_perfilamento", default=None)
+# Uma execução perfilada por vez no processo (reentrante: perfilar dentro de perfilar na mesma thread)
+_trava_perfil = threading.RLock()
+
+
+class SessaoPerfil:
+    """
+    Dados de uma execução perfilada: seções (nome, duração, pico de memória) e perfilador.
+    """
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self.secoes = []
+        self.perfilador = cProfile.Profile()
+        self._picos = []
+
+    def entrar(self, nome):
+        """
+        Abre uma seção e retorna sua posição em `secoes`.
+        """
+        # O pico acumulado até aqui pertence à seção externa
+        if self._picos:
+            self._picos[-1] = max(self._picos[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self.secoes.append([nome, len(self._picos), 0.0, 0, 0])
+        self._picos.append(0)
+        return len(self.secoes) - 1
+
+    def sair(self, posicao, duracao, memoria_inicial):
+        atual, pico = tracemalloc.get_traced_memory()
+        pico = max(pico, self._picos.pop())
+        if self._picos:
+            self._picos[-1] = max(self._picos[-1], pico)
+        self.secoes[posicao][2:] = [duracao, pico - memoria_inicial, atual - memoria_inicial]
+
+
+@contextmanager
+def perfilar(identificador=None, pasta=PERFIS_DIR):
+    """
+    Perfila o bloco (cProfile + tracemalloc) e grava perfil.prof e relatorio.txt em pasta/identificador.
+    Se outra execução perfilada estiver em andamento no processo, aguarda ela terminar.
+
+    Parâmetros:
+      identificador (str): Nome da pasta do perfil (por exemplo, o ID da tarefa); gerado se None.
+
+    Retorna (no `as`):
+      SessaoPerfil: Sessão, cujo atributo `pasta` indica onde os arquivos foram gravados.
+    """
+    sessao = SessaoPerfil(os.path.join(pasta, identificador or uuid.uuid4().hex))
+    with _trava_perfil:
+        ja_rastreando = tracemalloc.is_tracing()
+        if not ja_rastreando:
+            tracemalloc.start(QUADROS_TRACEMALLOC)
+        token = _sessao.set(sessao)
+        memoria_inicial = tracemalloc.get_traced_memory()[0]
+        inicio = time.perf_counter()
+        posicao = sessao.entrar("total")
+        sessao.perfilador.enable()
+        try:
+            yield sessao
+        finally:
+            sessao.perfilador.disable()
+            sessao.sair(posicao, time.perf_counter() - inicio, memoria_inicial)
+            _sessao.reset(token)
+            instantaneo = tracemalloc.take_snapshot()
+            if not ja_rastreando:
+                tracemalloc.stop()
+            _gravar(sessao, instantaneo)
+
+
+def secao(nome):
+    """
+    Decorador que marca a função como seção do perfil (duração e pico de memória próprios).
+    Sem perfilamento ativo, chama a função diretamente.
+    """
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            sessao = _sessao.get()
+            if sessao is None:
+                return funcao(*args, **kwargs)
+            memoria_inicial = tracemalloc.get_traced_memory()[0]
+            inicio = time.perf_counter()
+            posicao = sessao.entrar(nome)
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                sessao.sair(posicao, time.perf_counter() - inicio, memoria_inicial)
+        return envoltorio
+    return decorador
+
+
+def ativo():
+    """
+    Indica se há um perfilamento em andamento no contexto atual.
+    """
+    return _sessao.get() is not None
+
+
+def _mb(valor):
+    return f"{valor / 1e6:10.2f} MB"
+
+
+def _gravar(sessao, instantaneo):
+    os.makedirs(sessao.pasta, exist_ok=True)
+    sessao.perfilador.dump_stats(os.path.join(sessao.pasta, ARQUIVO_PROFILE))
+
+    texto = io.StringIO()
+    texto.write("Seções (duração, pico de memória acima do início da seção, memória retida ao fim)\n")
+    for nome, nivel, duracao, pico, retida in sessao.secoes:
+        texto.write(f"{'  ' * nivel}{nome:<{40 - 2 * nivel}} {duracao:10.3f} s {_mb(pico)} {_mb(retida)}\n")
+
+    texto.write(f"\nFunções com maior tempo acumulado (cProfile, {LINHAS_RELATORIO} primeiras)\n")
+    estatisticas = pstats.Stats(sessao.perfilador, stream=texto)
+    estatisticas.sort_stats("cumulative").print_stats(LINHAS_RELATORIO)
+
+    texto.write(f"\nMaiores alocações ainda vivas ao fim da execução (tracemalloc, {LINHAS_RELATORIO} primeiras)\n")
+    instantaneo = instantaneo.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    for estatistica in instantaneo.statistics("lineno")[:LINHAS_RELATORIO]:
+        texto.write(f"{_mb(estatistica.size)} {estatistica.count:8d} blocos  {estatistica.traceback}\n")
+
+    with open(os.path.join(sessao.pasta, ARQUIVO_RELATORIO), "w", encoding="utf-8") as arquivo:
+        arquivo.write(texto.getvalue())
+
+
+def arquivos_perfil(identificador, pasta=PERFIS_DIR):
+    """
+    Arquivos do perfil gravado com o identificador (nome -> caminho), ou {} se não existir.
+    """
+    pasta_perfil = os.path.abspath(os.path.join(pasta, os.path.basename(str(identificador))))
+    return {nome: os.path.join(pasta_perfil, nome) for nome in (ARQUIVO_PROFILE, ARQUIVO_RELATORIO)
+            if os.path.exists(os.path.join(pasta_perfil, nome))}
@@ -0,0 +1,222 @@
+"""
+Módulo do pipeline de roteirização
+
+Executa, de ponta a ponta, o cálculo servido pela API: leitura dos conjuntos de pedidos e
+caminhões, geocodificação, pré-processamento e algoritmo genético. É usado tanto pelo
+endpoint síncrono /resultado quanto pelas tarefas assíncronas de /jobs (tarefas.py),
+que acompanham o andamento pelo callback de progresso.
+
+Os conjuntos usados são os atuais ou, se indicadas, versões específicas enviadas ao /upload (datasets.py).
+
+Os resultados ficam no cache de resultados (cache_resultados.py), indexados pelo hash das
+entradas já geocodificadas: executar de novo com os mesmos pedidos, coordenadas, frota e
+parâmetros não recalcula nada, e um endereço que passe a resolver para outras coordenadas
+(gazetteer importado, cache de geocodificação expirado) gera uma nova chave.
+"""
+
+import logging
+
+from armazenamento import carregar_dataset
+from cache_resultados import hash_entradas, obter_cache_resultados
+from datasets import obter_registro
+from geocoding import converter_enderecos
+from instancia import RoutingInstance
+from normalizacao_enderecos import montar_endereco_completo
+from optimization import run_genetic_algorithm
+from preprocessor import preprocessar_dados
+from progresso import acompanhar, emitir, etapa
+from metricas import cronometrar
+from logs import execucao
+
+COLUNAS_OBRIGATORIAS_PEDIDOS = ["Endereço de Entrega", "Bairro de Entrega", "Cidade de Entrega", "Peso dos Itens"]
+COLUNAS_OBRIGATORIAS_CAMINHOES = ["Placa", "Capac. Kg", "Capac. Cx", "Disponível"]
+
+# Conjuntos que podem ser indicados por versão, junto dos parâmetros
+CONJUNTOS_VERSIONADOS = ("pedidos", "caminhoes")
+
+# Parâmetros aceitos pelo pipeline e seus valores padrão
+PARAMETROS_PADRAO = {
+    "geracoes": 100,
+    "tamanho_pop": 50,
+    "semente": None,
+}
+
+# Fração do progresso total concluída ao fim de cada etapa, na ordem de execução
+PROGRESSO_ETAPAS = {
+    "leitura": 0.05,
+    "geocodificacao": 0.35,
+    "preprocessamento": 0.4,
+    "otimizacao": 1.0,
+}
+
+
+def normalizar_parametros(parametros=None):
+    """
+    Completa os parâmetros com os valores padrão, validando os tipos.
+
+    Lança:
+      ValueError: Se houver parâmetros desconhecidos ou valores inválidos.
+    """
+    parametros = dict(parametros or {})
+    desconhecidos = set(parametros) - set(PARAMETROS_PADRAO)
+    if desconhecidos:
+        raise ValueError(f"Parâmetros desconhecidos: {', '.join(sorted(desconhecidos))}")
+    resultado = dict(PARAMETROS_PADRAO)
+    for nome, valor in parametros.items():
+        if valor is None:
+            continue
+        try:
+            valor = int(valor)
+        except (TypeError, ValueError):
+            raise ValueError(f"Valor inválido para '{nome}': {valor!r}")
+        if nome != "semente" and valor < 1:
+            raise ValueError(f"'{nome}' deve ser maior que zero.")
+        resultado[nome] = valor
+    return resultado
+
+
+def separar_versoes(argumentos=None):
+    """
+    Separa as versões de conjuntos (chaves "pedidos" e "caminhoes") dos parâmetros do algoritmo.
+
+    Retorna:
+      tuple: (parâmetros, versões).
+    """
+    parametros = dict(argumentos or {})
+    versoes = {nome: parametros.pop(nome) for nome in CONJUNTOS_VERSIONADOS if nome in parametros}
+    return parametros, {nome: versao for nome, versao in versoes.items() if versao}
+
+
+def ler_dataset(nome, colunas_obrigatorias, versao=None):
+    """
+    Lê um conjunto de dados (o atual ou a versão indicada) e valida as colunas obrigatórias.
+
+    Lança:
+      FileNotFoundError: Se o conjunto ou a versão não existir.
+      ValueError: Se a versão for inválida ou faltar alguma coluna obrigatória.
+    """
+    df = obter_registro().obter(versao, nome) if versao else carregar_dataset(nome)
+    faltantes = [coluna for coluna in colunas_obrigatorias if coluna not in df.columns]
+    if faltantes:
+        raise ValueError(f"Colunas obrigatórias não encontradas em '{nome}': {', '.join(faltantes)}")
+    return df
+
+
+def carregar_entradas(versoes=None):
+    """
+    Lê e valida os conjuntos de pedidos e caminhões.
+
+    Parâmetros:
+      versoes (dict): Versão de cada conjunto ("pedidos", "caminhoes"); os ausentes usam o conjunto atual.
+
+    Retorna:
+      tuple: (pedidos_df, caminhoes_df).
+    """
+    versoes = versoes or {}
+    return (ler_dataset("pedidos", COLUNAS_OBRIGATORIAS_PEDIDOS, versoes.get("pedidos")),
+            ler_dataset("caminhoes", COLUNAS_OBRIGATORIAS_CAMINHOES, versoes.get("caminhoes")))
+
+
+def geocodificar_pedidos(pedidos_df):
+    """
+    Cópia dos pedidos com 'Endereço Completo', 'Latitude' e 'Longitude' resolvidos pela cadeia
+    de geocodificação (cache primeiro).
+    """
+    pedidos_df = pedidos_df.copy()
+    pedidos_df["Endereço Completo"] = montar_endereco_completo(pedidos_df)
+    return converter_enderecos(pedidos_df)
+
+
+def chave_roteirizacao(parametros=None, entradas=None, geocodificadas=False):
+    """
+    Chave do resultado (hash das entradas geocodificadas e dos parâmetros normalizados), usada no
+    cache e como ETag.
+
+    Parâmetros:
+      geocodificadas (bool): Se True, os pedidos de `entradas` já passaram por geocodificar_pedidos.
+    """
+    pedidos_df, caminhoes_df = entradas or carregar_entradas()
+    if not geocodificadas:
+        pedidos_df = geocodificar_pedidos(pedidos_df)
+    return hash_entradas(pedidos_df, caminhoes_df, normalizar_parametros(parametros))
+
+
+def executar_roteirizacao(parametros=None, progresso=None, entradas=None, usar_cache=True, versoes=None,
+                          geocodificadas=False):
+    """
+    Executa o pipeline de roteirização sobre os conjuntos "pedidos" e "caminhoes".
+
+    Os eventos de progresso (ver progresso.py) são emitidos para o ouvinte registrado com
+    progresso.acompanhar, com as frações divididas entre as etapas de PROGRESSO_ETAPAS.
+    Os logs da execução levam o ID da execução atual (ver logs.execucao) ou um novo.
+
+    Parâmetros:
+      parametros (dict): geracoes, tamanho_pop e semente do algoritmo genético (ver PARAMETROS_PADRAO).
+      progresso (callable): Atalho para acompanhar o progresso: chamado como progresso(fracao, etapa)
+                            com a fração concluída (0 a 1); uma exceção lançada por ele interrompe o
+                            pipeline (cancelamento).
+      entradas (tuple): (pedidos_df, caminhoes_df) já carregados por carregar_entradas.
+      usar_cache (bool): Se True, consulta e alimenta o cache de resultados.
+      versoes (dict): Versões dos conjuntos a usar, quando `entradas` não for informado.
+      geocodificadas (bool): Se True, os pedidos de `entradas` já passaram por geocodificar_pedidos.
+
+    Retorna:
+      dict: Melhor solução ("solucao": ID do pedido -> ID do caminhão) e seu "fitness".
+    """
+    if progresso is None:
+        with execucao(), cronometrar("roteirizacao"):
+            return _executar(parametros, entradas, usar_cache, versoes, geocodificadas)
+
+    def ouvinte(evento):
+        if evento["fracao"] is not None:
+            progresso(evento["fracao"], evento["etapa"])
+
+    with execucao(), acompanhar(ouvinte), cronometrar("roteirizacao"):
+        return _executar(parametros, entradas, usar_cache, versoes, geocodificadas)
+
+
+def _trecho(nome):
+    """
+    Trecho (inicio, fim) do progresso total ocupado pela etapa.
+    """
+    nomes = list(PROGRESSO_ETAPAS)
+    posicao = nomes.index(nome)
+    inicio = PROGRESSO_ETAPAS[nomes[posicao - 1]] if posicao else 0.0
+    return inicio, PROGRESSO_ETAPAS[nome]
+
+
+def _executar(parametros, entradas, usar_cache, versoes, geocodificadas=False):
+    parametros = normalizar_parametros(parametros)
+
+    with etapa("leitura", *_trecho("leitura")), cronometrar("leitura"):
+        pedidos_df, caminhoes_df = entradas or carregar_entradas(versoes)
+        emitir(1.0, pedidos=len(pedidos_df), caminhoes=len(caminhoes_df))
+
+    # A chave cobre as coordenadas resolvidas, por isso é calculada depois da geocodificação
+    with etapa("geocodificacao", *_trecho("geocodificacao")), cronometrar("geocodificacao"):
+        if not geocodificadas:
+            pedidos_df = geocodificar_pedidos(pedidos_df)
+        chave = hash_entradas(pedidos_df, caminhoes_df, parametros)
+        solucao = obter_cache_resultados().obter(chave) if usar_cache else None
+        emitir(1.0)
+    if solucao is not None:
+        logging.info("Roteirização servida do cache de resultados (%s).", chave, extra={"chave": chave})
+        with etapa("cache", inicio=1.0):
+            pass  # o início da etapa já emite o evento de conclusão (fracao 1)
+        return solucao
+
+    with etapa("preprocessamento", *_trecho("preprocessamento")), cronometrar("preprocessamento"):
+        pedidos_df = preprocessar_dados(pedidos_df)
+        instancia = RoutingInstance.de_dataframes(pedidos_df, caminhoes_df)
+        emitir(1.0)
+
+    with etapa("otimizacao", *_trecho("otimizacao")), cronometrar("otimizacao"):
+        solucao = run_genetic_algorithm(instancia, geracoes=parametros["geracoes"],
+                                        tamanho_pop=parametros["tamanho_pop"], semente=parametros["semente"])
+    logging.info("Roteirização concluída: %d pedidos, %d caminhões.", instancia.num_pedidos, instancia.num_caminhoes,
+                 extra={"chave": chave, "fitness": solucao["fitness"]})
+    # Na forma serializada em JSON, igual à lida do cache
+    solucao = {"solucao": {str(k): v for k, v in solucao["solucao"].items()}, "fitness": solucao["fitness"]}
+    if usar_cache:
+        obter_cache_resultados().guardar(chave, solucao)
+    return solucao
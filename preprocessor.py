@@ -1,34 +1,52 @@
 """
 Módulo de pré-processamento
 
-Realiza a validação, limpeza e normalização dos dados recebidos nas planilhas.
+Realiza a validação, a conversão de tipos e a normalização dos dados recebidos nas planilhas.
+Os tipos vêm do esquema declarado em esquema.py; as colunas originais mantêm suas unidades
+(kg, caixas, graus) e as versões normalizadas são gravadas em colunas separadas.
 """
 
 import pandas as pd
 import numpy as np
 import logging
 
-logging.basicConfig(level=logging.INFO, filename="preprocessor.log", filemode="a",
-                    format="%(asctime)s - %(levelname)s - %(message)s")
+from esquema import ESQUEMA_GERAL, aplicar_esquema
 
-def preprocessar_dados(df):
+# Colunas que recebem uma versão normalizada (0 a 1) em "<coluna> (normalizado)"
+COLUNAS_NORMALIZADAS = ['Peso dos Itens', 'Volume', 'Distância']
+
+
+def coluna_normalizada(coluna):
+    """
+    Nome da coluna que guarda a versão normalizada de `coluna`.
+    """
+    return f"{coluna} (normalizado)"
+
+
+def preprocessar_dados(df, esquema=ESQUEMA_GERAL):
     """
     Pré-processa os dados:
-      - Preenche valores faltantes.
-      - Converte colunas para numérico.
-      - Normaliza colunas, se aplicável.
+      - Converte as colunas para os tipos do esquema (vetorizado), sem preencher ausentes com 0.
+      - Registra os valores inválidos encontrados, também disponíveis em df.attrs["erros_validacao"].
+      - Adiciona as versões normalizadas das colunas em COLUNAS_NORMALIZADAS, sem alterar as originais.
     
     Parâmetros:
       df (DataFrame): Dados a serem processados.
+      esquema (dict): Tipos das colunas (por padrão, Pedidos e Caminhões).
     
     Retorna:
       DataFrame: Dados pré-processados.
     """
-    df.fillna(0, inplace=True)
-    for coluna in ['Peso dos Itens', 'Volume', 'Distância']:
+    df, erros = aplicar_esquema(df, esquema)
+    for erro in erros:
+        logging.warning(erro)
+    df.attrs["erros_validacao"] = erros
+
+    for coluna in COLUNAS_NORMALIZADAS:
         if coluna in df.columns:
-            df[coluna] = pd.to_numeric(df[coluna], errors="coerce")
-            max_val = df[coluna].max()
-            if max_val and max_val > 0:
-                df[coluna] = df[coluna] / max_val
-    return df
\ No newline at end of file
+            valores = pd.to_numeric(df[coluna], errors="coerce").astype(np.float32)
+            max_val = valores.max()
+            if pd.notna(max_val) and max_val > 0:
+                valores = valores / np.float32(max_val)
+            df[coluna_normalizada(coluna)] = valores
+    return df
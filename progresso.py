@@ -0,0 +1,108 @@
+"""
+Módulo de progresso
+
+Os algoritmos (geocodificação, algoritmo genético, TSP e VRP) emitem eventos de progresso
+estruturados com `emitir`, sem saber quem os acompanha. Quem executa o cálculo registra um
+ouvinte com `acompanhar` (a barra de progresso do Streamlit, a tarefa da API que grava o
+evento no banco para o endpoint SSE) e divide o intervalo 0-1 entre as etapas com `etapa`.
+Fora de um bloco `acompanhar`, `emitir` não faz nada.
+
+Cada evento é um dict serializável em JSON com, no mínimo:
+  etapa: nome da etapa atual (ou do algoritmo, se não houver etapa);
+  fracao: fração concluída do cálculo todo (0 a 1), ou None se desconhecida;
+  decorrido: segundos desde o início do acompanhamento;
+e os dados informados pelo algoritmo, como iteracao, total e melhor_custo.
+Uma exceção lançada pelo ouvinte interrompe o algoritmo (usado no cancelamento de tarefas).
+"""
+
+import time
+import contextvars
+from collections import namedtuple
+from contextlib import contextmanager
+
+Escopo = namedtuple("Escopo", ["ouvinte", "etapa", "inicio", "fim", "t0"])
+
+_escopo = contextvars.ContextVar("escopo_progresso", default=None)
+
+
+@contextmanager
+def acompanhar(ouvinte):
+    """
+    Encaminha ao ouvinte, como ouvinte(evento), os eventos emitidos dentro do bloco (na mesma thread).
+    """
+    token = _escopo.set(Escopo(ouvinte, None, 0.0, 1.0, time.monotonic()))
+    try:
+        yield
+    finally:
+        _escopo.reset(token)
+
+
+@contextmanager
+def etapa(nome=None, inicio=0.0, fim=1.0):
+    """
+    Dentro do bloco, as frações emitidas (0 a 1) ocupam o trecho [inicio, fim] do intervalo atual.
+
+    Parâmetros:
+      nome (str): Nome da etapa; None mantém o da etapa atual.
+      inicio (float): Início do trecho, relativo ao intervalo atual.
+      fim (float): Fim do trecho, relativo ao intervalo atual.
+    """
+    escopo = _escopo.get()
+    if escopo is None:
+        yield
+        return
+    largura = escopo.fim - escopo.inicio
+    token = _escopo.set(escopo._replace(etapa=nome or escopo.etapa,
+                                        inicio=escopo.inicio + largura * inicio,
+                                        fim=escopo.inicio + largura * fim))
+    try:
+        emitir(0.0)
+        yield
+    finally:
+        _escopo.reset(token)
+
+
+def ativo():
+    """
+    Indica se há um ouvinte acompanhando o progresso (para evitar calcular dados só usados nos eventos).
+    """
+    return _escopo.get() is not None
+
+
+def emitir(fracao=None, **dados):
+    """
+    Emite um evento de progresso.
+
+    Parâmetros:
+      fracao (float): Fração concluída da etapa atual (0 a 1), ou None se desconhecida.
+      **dados: Dados do algoritmo (por exemplo, algoritmo, iteracao, total, melhor_custo).
+    """
+    escopo = _escopo.get()
+    if escopo is None:
+        return
+    evento = {
+        "etapa": escopo.etapa or dados.get("algoritmo"),
+        "fracao": None if fracao is None else round(escopo.inicio + (escopo.fim - escopo.inicio) * fracao, 4),
+        "decorrido": round(time.monotonic() - escopo.t0, 3),
+    }
+    evento.update(dados)
+    escopo.ouvinte(evento)
+
+
+def limitar(ouvinte, intervalo):
+    """
+    Envolve o ouvinte para repassar no máximo um evento a cada `intervalo` segundos; mudanças de
+    etapa e o fim do cálculo (fracao >= 1) são sempre repassados.
+    """
+    ultimo = {"instante": float("-inf"), "etapa": None}
+
+    def ouvinte_limitado(evento):
+        agora = time.monotonic()
+        fracao = evento.get("fracao")
+        if (agora - ultimo["instante"] < intervalo and evento.get("etapa") == ultimo["etapa"]
+                and not (fracao is not None and fracao >= 1)):
+            return
+        ultimo["instante"], ultimo["etapa"] = agora, evento.get("etapa")
+        ouvinte(evento)
+
+    return ouvinte_limitado
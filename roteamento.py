@@ -0,0 +1,120 @@
+"""
+Módulo de roteamento por carga
+
+Depois da alocação (ia_analise_pedidos.otimizar_aproveitamento_frota), cada carga é a rota de
+um caminhão: sai do ponto de partida, visita os endereços dos seus pedidos e volta. As rotas são
+problemas TSP pequenos e independentes (até max_pedidos endereços cada), resolvidos em paralelo
+em um pool de processos (ROTAS_WORKERS) com o algoritmo genético de resolver_tsp_genetico.
+
+A ordem de entrega ('Ordem de Entrega TSP', "carga-sequência") é gravada no DataFrame de uma
+vez só, a partir da posição de cada endereço na rota da sua carga. Pedidos sem carga (0) ficam
+sem ordem.
+"""
+
+import random
+import threading
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from config import ROTAS_WORKERS
+from exportacao import COLUNA_ORDEM
+from instancia import RoutingInstance
+from progresso import emitir, etapa
+
+RotaCarga = namedtuple("RotaCarga", ["carga", "placa", "rota", "distancia"])
+
+
+def _resolver_carga(instancia, semente=None):
+    """
+    Resolve o TSP de uma carga (executado no processo de trabalho).
+
+    Parâmetros:
+      instancia (RoutingInstance): Subinstância da carga.
+      semente (int): Se informada, reinicia os geradores aleatórios antes de resolver, para que
+                     o resultado não dependa do processo nem da ordem em que as cargas rodam.
+
+    Retorna:
+      tuple: (rota a partir do ponto de partida, distância em metros incluindo a volta a ele).
+    """
+    from ia_analise_pedidos import resolver_tsp_genetico
+
+    if semente is not None:
+        random.seed(semente)
+        np.random.seed(semente)
+    return resolver_tsp_genetico(instancia)
+
+
+def resolver_rotas_por_carga(pedidos_df, paralelo=True, semente=None):
+    """
+    Resolve a rota de cada carga e grava a ordem de entrega.
+
+    Parâmetros:
+      pedidos_df (DataFrame): Pedidos alocados, com 'Carga', 'Placa', 'Endereço Completo',
+                              'Latitude' e 'Longitude'.
+      paralelo (bool): Se False (ou com uma carga só), resolve as cargas neste processo.
+      semente (int): Semente base; cada carga usa semente + número da carga, com ou sem paralelismo.
+
+    Retorna:
+      tuple: (cópia de pedidos_df com 'Ordem de Entrega TSP', lista de RotaCarga por carga).
+    """
+    pedidos_df = pedidos_df.copy()
+    instancia = RoutingInstance.de_dataframes(pedidos_df)
+    cargas = pd.to_numeric(pedidos_df['Carga'], errors="coerce").fillna(0).to_numpy(dtype=np.int64)
+    placas = pedidos_df['Placa'].to_numpy() if 'Placa' in pedidos_df.columns else np.full(len(pedidos_df), "")
+    numeros = np.unique(cargas[cargas > 0])
+    subinstancias = {int(carga): instancia.subinstancia(cargas == carga) for carga in numeros}
+
+    solucoes = {}
+    sementes = {carga: None if semente is None else semente + carga for carga in subinstancias}
+    if paralelo and ROTAS_WORKERS > 1 and len(subinstancias) > 1:
+        futuros = {obter_pool().submit(_resolver_carga, sub, sementes[carga]): carga for carga, sub in subinstancias.items()}
+        for concluidas, futuro in enumerate(as_completed(futuros), start=1):
+            solucoes[futuros[futuro]] = futuro.result()
+            emitir(concluidas / len(futuros), algoritmo="tsp", iteracao=concluidas, total=len(futuros))
+    else:
+        # Cada carga ocupa uma parte igual do progresso (o TSP emite seus próprios eventos)
+        for posicao, (carga, sub) in enumerate(subinstancias.items()):
+            with etapa(inicio=posicao / len(subinstancias), fim=(posicao + 1) / len(subinstancias)):
+                solucoes[carga] = _resolver_carga(sub, sementes[carga])
+
+    # Posição, na rota da sua carga, do endereço de cada pedido (o ponto de partida é a posição 0)
+    posicoes = np.full(len(pedidos_df), np.inf)
+    rotas = []
+    for carga, (rota, distancia) in sorted(solucoes.items()):
+        sub = subinstancias[carga]
+        posicao_no = {no: posicao for posicao, no in enumerate(rota)}
+        posicoes_enderecos = np.array([posicao_no[endereco] for endereco in sub.enderecos], dtype=np.float64)
+        mascara = cargas == carga
+        posicoes[mascara] = posicoes_enderecos[sub.ids_enderecos]
+        rotas.append(RotaCarga(carga, placas[mascara][0], rota, distancia))
+
+    # Sequência dentro da carga: ordena por (carga, posição na rota, ordem original) e numera a partir de 1
+    ordem = np.lexsort((np.arange(len(pedidos_df)), posicoes, cargas))
+    sequencia = np.empty(len(pedidos_df), dtype=np.int64)
+    sequencia[ordem] = pd.Series(cargas[ordem]).groupby(cargas[ordem]).cumcount().to_numpy() + 1
+    rotulos = pd.Series(cargas).astype(str) + "-" + pd.Series(sequencia).astype(str)
+    pedidos_df[COLUNA_ORDEM] = np.where(cargas > 0, rotulos.to_numpy(), "")
+    return pedidos_df, rotas
+
+
+_pool = None
+_trava_modulo = threading.Lock()
+
+
+def obter_pool():
+    """
+    Retorna o pool de processos das rotas, criado na primeira chamada e mantido entre execuções
+    (cada processo importa os algoritmos uma única vez).
+    """
+    global _pool
+    if _pool is None:
+        with _trava_modulo:
+            if _pool is None:
+                # "spawn" evita herdar threads do Streamlit ou do servidor no processo de trabalho
+                _pool = ProcessPoolExecutor(max_workers=ROTAS_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _pool
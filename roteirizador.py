@@ -0,0 +1,238 @@
+"""
+Roteirizador em linha de comando
+
+Planeja o dia sem interface (sem Streamlit nem Flask), para lotes noturnos e agendamentos:
+ingestão → geocodificação → agrupamento → alocação → rotas por carga → exportação.
+
+Uso:
+  python roteirizador.py Pedidos.xlsx --frota caminhoes_frota.xlsx --saida resultados
+  python roteirizador.py pedidos_do_dia/ --paralelo 4 --regioes 3 --max-pedidos 12 --formato csv
+
+Cada planilha gera <saida>/<nome>_roteirizado.<formato> e imprime no stdout uma linha JSON
+com o resumo (pedidos, cargas, distância) e o tempo de cada etapa. Diretórios são expandidos
+para as planilhas (.xlsx/.xlsm) que contêm, processadas em paralelo em --paralelo processos.
+O código de saída é 1 se alguma planilha falhar.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from armazenamento import carregar_dataset
+from exportacao import FORMATOS, exportar
+from ingestao import ingerir_planilha
+from logs import configurar_logging, execucao
+from metricas import cronometrar
+from normalizacao_enderecos import montar_endereco_completo
+
+EXTENSOES_PLANILHA = (".xlsx", ".xlsm")
+SUFIXO_SAIDA = "_roteirizado"
+
+
+@contextmanager
+def _etapa(tempos, nome):
+    inicio = time.perf_counter()
+    with cronometrar(nome):
+        yield
+    tempos[nome] = round(time.perf_counter() - inicio, 3)
+
+
+def listar_planilhas(entradas):
+    """
+    Expande as entradas (arquivos ou diretórios) na lista de planilhas a processar.
+
+    Lança:
+      FileNotFoundError: Se alguma entrada não existir.
+    """
+    planilhas = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            planilhas.extend(sorted(os.path.join(entrada, nome) for nome in os.listdir(entrada)
+                                    if nome.lower().endswith(EXTENSOES_PLANILHA) and not nome.startswith("~$")))
+        elif os.path.isfile(entrada):
+            planilhas.append(entrada)
+        else:
+            raise FileNotFoundError(f"Entrada não encontrada: {entrada}")
+    return planilhas
+
+
+def _ler_planilha(caminho, nome_dataset):
+    # A ingestão grava Parquet; aqui em um diretório temporário, sem tocar nos conjuntos do sistema
+    with tempfile.TemporaryDirectory() as pasta:
+        destino = os.path.join(pasta, f"{nome_dataset}.parquet")
+        resumo = ingerir_planilha(caminho, nome_dataset, destino=destino)
+        return pd.read_parquet(destino, engine="pyarrow"), resumo
+
+
+def carregar_frota(caminho=None):
+    """
+    Frota a usar: a planilha informada ou, sem ela, a frota cadastrada no sistema.
+    """
+    if caminho:
+        return _ler_planilha(caminho, "frota")[0]
+    return carregar_dataset("frota")
+
+
+def roteirizar_planilha(caminho, frota_df, opcoes, paralelo_rotas=True):
+    """
+    Executa o pipeline completo sobre uma planilha de pedidos e grava o resultado.
+
+    Parâmetros:
+      caminho (str): Planilha de pedidos.
+      frota_df (DataFrame): Caminhões ('Placa', 'Capac. Kg', 'Capac. Cx', 'Disponível').
+      opcoes (dict): saida, formato, por_placa, metodo, regioes, percentual_frota, max_pedidos,
+                     rotas e semente (ver main).
+      paralelo_rotas (bool): Resolve as rotas das cargas no pool de processos (roteamento.py).
+
+    Retorna:
+      dict: Resumo da execução, com o tempo (s) de cada etapa em "tempos".
+    """
+    import ia_analise_pedidos as ia
+    from geocoding import converter_enderecos
+    from roteamento import resolver_rotas_por_carga
+
+    if opcoes["semente"] is not None:
+        random.seed(opcoes["semente"])
+        np.random.seed(opcoes["semente"])
+    tempos = {}
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    with execucao() as id_execucao:
+        with _etapa(tempos, "ingestao"):
+            pedidos_df, resumo_ingestao = _ler_planilha(caminho, "pedidos")
+
+        with _etapa(tempos, "geocodificacao"):
+            pedidos_df["Endereço Completo"] = montar_endereco_completo(pedidos_df)
+            # Coordenadas já presentes na planilha são mantidas; só as faltantes são geocodificadas
+            for coluna in ("Latitude", "Longitude"):
+                if coluna not in pedidos_df.columns:
+                    pedidos_df[coluna] = np.nan
+            faltantes = pedidos_df[["Latitude", "Longitude"]].isna().any(axis=1)
+            if faltantes.any():
+                geocodificados = converter_enderecos(pedidos_df[faltantes].copy())
+                pedidos_df.loc[faltantes, ["Latitude", "Longitude"]] = geocodificados[["Latitude", "Longitude"]]
+
+        # Pedidos sem coordenadas ou sem peso não entram na roteirização, mas seguem na planilha de saída
+        roteirizaveis = (pedidos_df["Latitude"].notna() & pedidos_df["Longitude"].notna()
+                         & (pd.to_numeric(pedidos_df.get("Peso dos Itens"), errors="coerce").fillna(0) > 0))
+        alocados = pedidos_df[roteirizaveis]
+        rotas = []
+        if len(alocados):
+            with _etapa(tempos, "agrupamento"):
+                alocados = ia.agrupar_por_regiao(alocados, metodo=opcoes["metodo"], n_clusters=opcoes["regioes"])
+
+            with _etapa(tempos, "alocacao"):
+                alocados = ia.otimizar_aproveitamento_frota(alocados, frota_df, opcoes["percentual_frota"],
+                                                            opcoes["max_pedidos"], opcoes["regioes"])
+
+            if opcoes["rotas"]:
+                with _etapa(tempos, "rotas"):
+                    alocados, rotas = resolver_rotas_por_carga(alocados, paralelo=paralelo_rotas,
+                                                               semente=opcoes["semente"])
+        resultado_df = pd.concat([alocados, pedidos_df[~roteirizaveis]]).sort_index()
+
+        with _etapa(tempos, "exportacao"):
+            os.makedirs(opcoes["saida"], exist_ok=True)
+            destino = os.path.join(opcoes["saida"], f"{nome}{SUFIXO_SAIDA}.{opcoes['formato']}")
+            with open(destino, "wb") as arquivo:
+                exportar(resultado_df, opcoes["formato"], destino=arquivo, por_placa=opcoes["por_placa"])
+
+        cargas = pd.to_numeric(resultado_df.get("Carga"), errors="coerce").fillna(0)
+        resumo = {
+            "arquivo": caminho,
+            "saida": destino,
+            "execucao": id_execucao,
+            "pedidos": int(len(resultado_df)),
+            "linhas_invalidas": resumo_ingestao.linhas_invalidas,
+            "nao_roteirizados": int((~roteirizaveis).sum()),
+            "sem_carga": int((cargas == 0).sum()),
+            "cargas": int(cargas[cargas > 0].nunique()),
+            "distancia_km": round(sum(rota.distancia for rota in rotas) / 1000, 1) if rotas else None,
+            "tempos": tempos,
+        }
+        logging.info("Planilha %s roteirizada em %.1f s.", caminho, sum(tempos.values()),
+                     extra={chave: valor for chave, valor in resumo.items() if chave != "execucao"})
+    return resumo
+
+
+def _roteirizar_com_erro(caminho, frota_df, opcoes, paralelo_rotas):
+    # Falhas viram um resumo com "erro", para que uma planilha ruim não interrompa o lote
+    try:
+        return roteirizar_planilha(caminho, frota_df, opcoes, paralelo_rotas)
+    except Exception as e:
+        logging.exception("Falha ao roteirizar %s.", caminho)
+        return {"arquivo": caminho, "erro": str(e)}
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        prog="roteirizador",
+        description="Roteiriza planilhas de pedidos sem interface: ingestão, geocodificação, agrupamento, "
+                    "alocação da frota, rotas por carga e exportação.")
+    parser.add_argument("entradas", nargs="+", help="Planilhas de pedidos (.xlsx) ou diretórios com planilhas.")
+    parser.add_argument("--frota", help="Planilha da frota; por padrão, a frota cadastrada no sistema.")
+    parser.add_argument("--saida", default="resultados", help="Diretório dos resultados (padrão: %(default)s).")
+    parser.add_argument("--formato", choices=list(FORMATOS), default="xlsx", help="Formato dos resultados.")
+    parser.add_argument("--por-placa", action="store_true", help="No Excel, uma aba por placa na ordem de entrega.")
+    parser.add_argument("--metodo", choices=["kmeans", "dbscan"], default="kmeans", help="Agrupamento em regiões.")
+    parser.add_argument("--regioes", type=int, default=1, help="Regiões por cidade no K-Means (padrão: %(default)s).")
+    parser.add_argument("--percentual-frota", type=float, default=100,
+                        help="Capacidade da frota a usar, em %% (padrão: %(default)s).")
+    parser.add_argument("--max-pedidos", type=int, default=12, help="Pedidos por veículo (padrão: %(default)s).")
+    parser.add_argument("--sem-rotas", dest="rotas", action="store_false", help="Não calcula as rotas por carga.")
+    parser.add_argument("--semente", type=int, help="Semente dos algoritmos, para execuções reprodutíveis.")
+    parser.add_argument("--paralelo", type=int, default=min(4, os.cpu_count() or 1),
+                        help="Planilhas processadas ao mesmo tempo (padrão: %(default)s).")
+    return parser
+
+
+def main(argv=None):
+    """
+    Ponto de entrada da linha de comando.
+
+    Retorna:
+      int: Código de saída (0 se todas as planilhas foram roteirizadas).
+    """
+    argumentos = criar_parser().parse_args(argv)
+    configurar_logging()
+    try:
+        planilhas = listar_planilhas(argumentos.entradas)
+        frota_df = carregar_frota(argumentos.frota)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"roteirizador: {e}", file=sys.stderr)
+        return 2
+    opcoes = {chave: getattr(argumentos, chave) for chave in
+              ("saida", "formato", "por_placa", "metodo", "regioes", "percentual_frota", "max_pedidos", "rotas",
+               "semente")}
+
+    falhas = 0
+    if len(planilhas) > 1 and argumentos.paralelo > 1:
+        # Uma planilha por processo; dentro de cada uma, as rotas são resolvidas no próprio processo
+        with ProcessPoolExecutor(max_workers=min(argumentos.paralelo, len(planilhas)),
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=configurar_logging) as pool:
+            futuros = [pool.submit(_roteirizar_com_erro, caminho, frota_df, opcoes, False) for caminho in planilhas]
+            for futuro in as_completed(futuros):
+                resumo = futuro.result()
+                falhas += "erro" in resumo
+                print(json.dumps(resumo, ensure_ascii=False), flush=True)
+    else:
+        for caminho in planilhas:
+            resumo = _roteirizar_com_erro(caminho, frota_df, opcoes, True)
+            falhas += "erro" in resumo
+            print(json.dumps(resumo, ensure_ascii=False), flush=True)
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
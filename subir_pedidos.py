@@ -1,52 +1,73 @@
+import os
+import hashlib
+import tempfile
+
 import streamlit as st
 import pandas as pd
 from io import BytesIO
 
+from cache_geocodificacao import obter_cache
+from normalizacao_enderecos import montar_endereco_completo
+from ingestao import ingerir_planilha
+
 REQUIRED_COLUMNS = ["Endereço de Entrega", "Bairro de Entrega", "Cidade de Entrega"]
 
 def processar_pedidos():
+    """
+    Recebe a planilha de pedidos e a ingere, uma única vez por arquivo: o Streamlit reexecuta o
+    script a cada interação, e as reexecuções reaproveitam o resultado guardado em session_state.
+
+    Retorna:
+      tuple: (pedidos_df com 'Endereço Completo', chave do arquivo enviado) ou None sem planilha.
+    """
     uploaded_pedidos = st.file_uploader("Escolha o arquivo Excel de Pedidos", type=["xlsx", "xlsm"])
     if uploaded_pedidos is None:
         st.info("Envie a planilha de pedidos para continuação.")
         return None
 
+    chave = hashlib.blake2b(uploaded_pedidos.getvalue(), digest_size=16).hexdigest()
+    carregados = st.session_state.get("pedidos_carregados")
+    if carregados is None or carregados[0] != chave:
+        carregados = _ingerir_pedidos(uploaded_pedidos)
+        if carregados is None:
+            return None
+        carregados = (chave,) + carregados
+        st.session_state["pedidos_carregados"] = carregados
+    _, pedidos_df, resumo = carregados
+    if resumo.linhas_invalidas:
+        st.warning(f"{resumo.linhas_invalidas} linha(s) inválida(s) ignorada(s): " + "; ".join(resumo.erros[:5]))
+    return pedidos_df, chave
+
+def _ingerir_pedidos(uploaded_pedidos):
+    # Lê a planilha em fluxo (somente as colunas usadas), validando linha a linha. Cada envio é
+    # gravado em um diretório temporário próprio: sessões simultâneas não sobrescrevem umas às outras
+    barra = st.progress(0.0, text="Lendo a planilha de pedidos...")
+    def atualizar_progresso(lidas, total):
+        if total:
+            barra.progress(min(lidas / total, 1.0), text=f"Lendo a planilha de pedidos... {lidas}/{total} linhas")
     try:
-        pedidos_df = pd.read_excel(uploaded_pedidos, engine='openpyxl')
+        with tempfile.TemporaryDirectory() as pasta:
+            destino = os.path.join(pasta, "pedidos.parquet")
+            resumo = ingerir_planilha(uploaded_pedidos, "pedidos", destino=destino, progresso=atualizar_progresso)
+            pedidos_df = pd.read_parquet(destino, engine="pyarrow")
+    except ValueError as e:
+        barra.empty()
+        st.error(str(e))
+        return None
     except Exception as e:
+        barra.empty()
         st.error("Erro ao ler a planilha: " + str(e))
         return None
-
-    # Verifica se as colunas necessárias estão presentes
-    missing_cols = [col for col in REQUIRED_COLUMNS if col not in pedidos_df.columns]
-    if missing_cols:
-        st.error(f"As seguintes colunas necessárias não foram encontradas: {', '.join(missing_cols)}")
-        return None
+    barra.empty()
 
     # Cria a coluna 'Endereço Completo'
-    pedidos_df['Endereço Completo'] = (
-        pedidos_df['Endereço de Entrega'].astype(str) + ', ' +
-        pedidos_df['Bairro de Entrega'].astype(str) + ', ' +
-        pedidos_df['Cidade de Entrega'].astype(str)
-    )
-    
-    # Carrega coordenadas salvas (se houver)
-    try:
-        coordenadas_salvas_df = pd.read_excel("database/coordenadas_salvas.xlsx", engine='openpyxl')
-        coordenadas_salvas = dict(zip(
-            coordenadas_salvas_df['Endereço'],
-            zip(coordenadas_salvas_df['Latitude'], coordenadas_salvas_df['Longitude'])
-        ))
-    except FileNotFoundError:
-        coordenadas_salvas = {}
-    
-    return pedidos_df, coordenadas_salvas
+    pedidos_df['Endereço Completo'] = montar_endereco_completo(pedidos_df)
+    return pedidos_df, resumo
+
+def carregar_coordenadas(enderecos):
+    # Carrega, em uma única consulta em lote, as coordenadas já salvas para os endereços
+    return obter_cache().buscar_lote(enderecos.dropna().unique().tolist())
 
 def salvar_coordenadas(coordenadas_salvas):
-    # Salva as coordenadas atualizadas num arquivo Excel
-    coordenadas_salvas_df = pd.DataFrame(coordenadas_salvas.items(), columns=['Endereço', 'Coordenadas'])
-    coordenadas_salvas_df[['Latitude','Longitude']] = pd.DataFrame(
-        coordenadas_salvas_df['Coordenadas'].tolist(),
-        index=coordenadas_salvas_df.index
-    )
-    coordenadas_salvas_df.drop(columns=['Coordenadas'], inplace=True)
-    coordenadas_salvas_df.to_excel("database/coordenadas_salvas.xlsx", index=False)
\ No newline at end of file
+    # Grava no cache de geocodificação apenas os endereços novos (os existentes não são reescritos)
+    obter_cache().salvar_lote(coordenadas_salvas)
\ No newline at end of file
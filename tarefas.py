@@ -0,0 +1,331 @@
+"""
+Módulo da fila de tarefas
+
+Executa o pipeline de roteirização (pipeline.py) fora da thread da requisição HTTP, em um
+pool de processos com concorrência limitada (JOBS_WORKERS). Cada tarefa é registrada na
+tabela `tarefas` de um banco SQLite (JOBS_DB) com situação, progresso e resultado, de modo
+que os resultados concluídos sobrevivem a reinícios do servidor.
+
+Situações: pendente -> executando -> concluida | erro | cancelada.
+O último evento de progresso dos algoritmos (progresso.py) fica na coluna `evento`, lida pelo
+endpoint SSE /jobs/<id>/eventos. Tarefas submetidas com perfilar=True gravam o perfil de tempo e
+memória (perfilamento.py) em PERFIS_DIR/<id>.
+Tarefas pendentes são canceladas na hora; as que estão executando recebem o pedido de
+cancelamento pelo banco e param na próxima atualização de progresso.
+
+Cada fila (uma por processo da API) registra na tabela `filas` um sinal de vida a cada
+JOBS_BATIMENTO_SEGUNDOS, e cada tarefa guarda a fila que a criou (`dono`). Tarefas pendentes ou
+executando cuja fila parou de dar sinal (servidor encerrado ou processo morto) são marcadas como
+interrompidas pelas filas vivas; as de outros processos ainda ativos não são tocadas.
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import sqlite3
+import threading
+import multiprocessing
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+from config import JOBS_DB, JOBS_WORKERS, JOBS_MAX_PENDENTES, JOBS_BATIMENTO_SEGUNDOS
+from metricas import incorporar, instantaneo, zerar
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluida"
+ERRO = "erro"
+CANCELADA = "cancelada"
+INTERROMPIDA = "interrompida"
+SITUACOES_FINAIS = {CONCLUIDA, ERRO, CANCELADA, INTERROMPIDA}
+
+# Intervalo mínimo, em segundos, entre gravações de eventos de progresso (e verificações de cancelamento)
+INTERVALO_PROGRESSO = 0.5
+# Sinais de vida perdidos a partir dos quais a fila é considerada encerrada
+BATIMENTOS_TOLERADOS = 3
+
+
+class TarefaCancelada(Exception):
+    """
+    Lançada dentro do processo de trabalho quando o cancelamento da tarefa é solicitado.
+    """
+
+
+class FilaCheia(Exception):
+    """
+    Lançada ao submeter uma tarefa quando já há JOBS_MAX_PENDENTES tarefas aguardando.
+    """
+
+
+def _conectar(caminho):
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    conn = sqlite3.connect(caminho, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tarefas (
+            id TEXT PRIMARY KEY,
+            tipo TEXT NOT NULL,
+            parametros TEXT NOT NULL,
+            situacao TEXT NOT NULL,
+            progresso REAL NOT NULL DEFAULT 0,
+            etapa TEXT,
+            evento TEXT,
+            cancelamento_solicitado INTEGER NOT NULL DEFAULT 0,
+            resultado TEXT,
+            erro TEXT,
+            criada_em REAL NOT NULL,
+            iniciada_em REAL,
+            concluida_em REAL,
+            dono TEXT
+        )
+    ''')
+    conn.execute("CREATE TABLE IF NOT EXISTS filas (id TEXT PRIMARY KEY, pid INTEGER, batimento REAL NOT NULL)")
+    colunas = {linha[1] for linha in conn.execute("PRAGMA table_info(tarefas)")}
+    for coluna in ("evento", "dono"):
+        if coluna not in colunas:
+            conn.execute(f"ALTER TABLE tarefas ADD COLUMN {coluna} TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tarefas_situacao ON tarefas (situacao)")
+    return conn
+
+
+def _executar_tarefa(caminho, id_tarefa, parametros, versoes=None, perfilar=False):
+    """
+    Executa uma tarefa no processo de trabalho, registrando progresso e resultado no banco.
+
+    Retorna:
+      dict: Métricas do processo de trabalho durante a tarefa (ver metricas.instantaneo).
+    """
+    from pipeline import executar_roteirizacao
+    from progresso import acompanhar, limitar
+    from perfilamento import perfilar as perfilamento
+    from logs import configurar_logging, execucao
+
+    configurar_logging()
+
+    # O processo de trabalho executa uma tarefa por vez: as métricas devolvidas são só as desta tarefa
+    zerar()
+
+    conn = _conectar(caminho)
+    try:
+        with conn:
+            atualizadas = conn.execute(
+                "UPDATE tarefas SET situacao = ?, iniciada_em = ? WHERE id = ? AND situacao = ?",
+                (EXECUTANDO, time.time(), id_tarefa, PENDENTE)).rowcount
+        if not atualizadas:
+            return  # cancelada antes de começar
+
+        def registrar_evento(evento):
+            fracao = evento.get("fracao")
+            with conn:
+                conn.execute("UPDATE tarefas SET progresso = COALESCE(?, progresso), etapa = ?, evento = ? "
+                             "WHERE id = ?", (fracao, evento.get("etapa"), json.dumps(evento, default=str),
+                                              id_tarefa))
+            cancelar, = conn.execute("SELECT cancelamento_solicitado FROM tarefas WHERE id = ?",
+                                     (id_tarefa,)).fetchone()
+            if cancelar:
+                raise TarefaCancelada()
+
+        try:
+            # Perfilada, a tarefa recalcula mesmo com resultado em cache (o perfil é o objetivo)
+            with execucao(id_tarefa), perfilamento(id_tarefa) if perfilar else nullcontext(), \
+                    acompanhar(limitar(registrar_evento, INTERVALO_PROGRESSO)):
+                resultado = executar_roteirizacao(parametros, versoes=versoes, usar_cache=not perfilar)
+        except TarefaCancelada:
+            _finalizar(conn, id_tarefa, CANCELADA)
+        except Exception as e:
+            logging.exception(f"Tarefa {id_tarefa} falhou.")
+            _finalizar(conn, id_tarefa, ERRO, erro=str(e))
+        else:
+            _finalizar(conn, id_tarefa, CONCLUIDA, resultado=json.dumps(resultado, default=str))
+    finally:
+        conn.close()
+    return instantaneo()
+
+
+def _finalizar(conn, id_tarefa, situacao, resultado=None, erro=None):
+    with conn:
+        conn.execute('''
+            UPDATE tarefas SET situacao = ?, resultado = ?, erro = ?, concluida_em = ?,
+                               progresso = CASE WHEN ? = ? THEN 1 ELSE progresso END
+            WHERE id = ?
+        ''', (situacao, resultado, erro, time.time(), situacao, CONCLUIDA, id_tarefa))
+
+
+class FilaTarefas:
+    """
+    Fila de tarefas de roteirização persistida em SQLite e executada em um pool de processos.
+    """
+
+    def __init__(self, caminho=JOBS_DB, max_workers=JOBS_WORKERS, max_pendentes=JOBS_MAX_PENDENTES):
+        self.caminho = caminho
+        self.max_workers = max(1, max_workers)
+        self.max_pendentes = max_pendentes
+        self._executor = None
+        self._futuros = {}
+        self._trava = threading.Lock()
+        self._local = threading.local()
+        self.id_fila = uuid.uuid4().hex
+        self._parar = threading.Event()
+        self._registrar_batimento()
+        self._marcar_interrompidas()
+        threading.Thread(target=self._bater, name="batimento-fila", daemon=True).start()
+
+    def _registrar_batimento(self):
+        with self._conexao() as conn:
+            conn.execute("INSERT INTO filas (id, pid, batimento) VALUES (?, ?, ?) "
+                         "ON CONFLICT (id) DO UPDATE SET batimento = excluded.batimento",
+                         (self.id_fila, os.getpid(), time.time()))
+
+    def _marcar_interrompidas(self):
+        """
+        Marca como interrompidas as tarefas pendentes ou executando cuja fila parou de dar sinal
+        de vida (ou anteriores ao registro do dono), e esquece as filas encerradas.
+        """
+        limite = time.time() - BATIMENTOS_TOLERADOS * JOBS_BATIMENTO_SEGUNDOS
+        with self._conexao() as conn:
+            interrompidas = conn.execute(
+                "UPDATE tarefas SET situacao = ?, concluida_em = ? WHERE situacao IN (?, ?) "
+                "AND (dono IS NULL OR dono NOT IN (SELECT id FROM filas WHERE batimento >= ?))",
+                (INTERROMPIDA, time.time(), PENDENTE, EXECUTANDO, limite)).rowcount
+            conn.execute("DELETE FROM filas WHERE batimento < ?", (limite,))
+        if interrompidas:
+            logging.warning(f"{interrompidas} tarefas de filas encerradas foram marcadas como interrompidas.")
+
+    def _bater(self):
+        while not self._parar.wait(JOBS_BATIMENTO_SEGUNDOS):
+            try:
+                self._registrar_batimento()
+                self._marcar_interrompidas()
+            except sqlite3.Error as e:
+                logging.warning(f"Falha ao registrar o sinal de vida da fila de tarefas: {e}")
+
+    def _conexao(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _conectar(self.caminho)
+        return conn
+
+    def _obter_executor(self):
+        if self._executor is None:
+            # "spawn" evita herdar conexões SQLite e threads do servidor no processo de trabalho
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def submeter(self, parametros=None, tipo="roteirizacao", versoes=None, perfilar=False):
+        """
+        Registra e enfileira uma tarefa de roteirização.
+
+        Parâmetros:
+          parametros (dict): Parâmetros do algoritmo genético (ver pipeline.PARAMETROS_PADRAO).
+          versoes (dict): Versões dos conjuntos a usar (ver datasets.py); os ausentes usam o conjunto atual.
+          perfilar (bool): Grava o perfil de tempo e memória da execução (ver perfilamento.py).
+
+        Retorna:
+          str: ID da tarefa.
+
+        Lança:
+          FilaCheia: Se já houver max_pendentes tarefas aguardando.
+        """
+        with self._trava:
+            conn = self._conexao()
+            pendentes, = conn.execute("SELECT COUNT(*) FROM tarefas WHERE situacao = ?", (PENDENTE,)).fetchone()
+            if pendentes >= self.max_pendentes:
+                raise FilaCheia(f"Há {pendentes} tarefas aguardando; tente novamente mais tarde.")
+            id_tarefa = uuid.uuid4().hex
+            with conn:
+                conn.execute("INSERT INTO tarefas (id, tipo, parametros, situacao, criada_em, dono) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             (id_tarefa, tipo, json.dumps({**(parametros or {}), **(versoes or {}),
+                                         **({"perfilar": True} if perfilar else {})}), PENDENTE,
+                              time.time(), self.id_fila))
+            futuro = self._obter_executor().submit(_executar_tarefa, self.caminho, id_tarefa, parametros or {},
+                                                   versoes or {}, perfilar)
+            self._futuros[id_tarefa] = futuro
+        futuro.add_done_callback(lambda f, id_tarefa=id_tarefa: self._ao_terminar(id_tarefa, f))
+        logging.info("Tarefa %s enfileirada.", id_tarefa, extra={"tarefa": id_tarefa})
+        return id_tarefa
+
+    def _ao_terminar(self, id_tarefa, futuro):
+        with self._trava:
+            self._futuros.pop(id_tarefa, None)
+        if not futuro.cancelled() and futuro.exception() is None:
+            incorporar(futuro.result())
+        elif not futuro.cancelled():
+            # Falha do próprio processo de trabalho (por exemplo, encerrado pelo sistema)
+            conn = _conectar(self.caminho)
+            try:
+                _finalizar(conn, id_tarefa, ERRO, erro=str(futuro.exception()))
+            finally:
+                conn.close()
+
+    def consultar(self, id_tarefa):
+        """
+        Retorna a tarefa como dict (situação, progresso, etapa, resultado, erro e horários), ou None.
+        """
+        conn = self._conexao()
+        conn.row_factory = sqlite3.Row
+        try:
+            linha = conn.execute("SELECT * FROM tarefas WHERE id = ?", (id_tarefa,)).fetchone()
+        finally:
+            conn.row_factory = None
+        if linha is None:
+            return None
+        tarefa = dict(linha)
+        tarefa["parametros"] = json.loads(tarefa["parametros"])
+        tarefa["resultado"] = json.loads(tarefa["resultado"]) if tarefa["resultado"] else None
+        tarefa["evento"] = json.loads(tarefa["evento"]) if tarefa["evento"] else None
+        tarefa["cancelamento_solicitado"] = bool(tarefa["cancelamento_solicitado"])
+        return tarefa
+
+    def cancelar(self, id_tarefa):
+        """
+        Cancela a tarefa: pendentes são canceladas imediatamente; em execução, o processo de
+        trabalho para na próxima atualização de progresso.
+
+        Retorna:
+          bool: False se a tarefa não existir ou já tiver terminado.
+        """
+        conn = self._conexao()
+        with conn:
+            canceladas = conn.execute(
+                "UPDATE tarefas SET situacao = ?, cancelamento_solicitado = 1, concluida_em = ? "
+                "WHERE id = ? AND situacao = ?", (CANCELADA, time.time(), id_tarefa, PENDENTE)).rowcount
+            if not canceladas:
+                canceladas = conn.execute(
+                    "UPDATE tarefas SET cancelamento_solicitado = 1 WHERE id = ? AND situacao = ?",
+                    (id_tarefa, EXECUTANDO)).rowcount
+        with self._trava:
+            futuro = self._futuros.get(id_tarefa)
+        if futuro is not None:
+            futuro.cancel()
+        return bool(canceladas)
+
+    def encerrar(self, aguardar=True):
+        """
+        Encerra o pool de processos e o sinal de vida da fila.
+        """
+        self._parar.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=aguardar, cancel_futures=not aguardar)
+            self._executor = None
+
+
+_fila = None
+_trava_modulo = threading.Lock()
+
+
+def obter_fila():
+    """
+    Retorna a fila de tarefas do processo, criada na primeira chamada.
+    """
+    global _fila
+    if _fila is None:
+        with _trava_modulo:
+            if _fila is None:
+                _fila = FilaTarefas()
+    return _fila
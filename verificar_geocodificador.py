@@ -0,0 +1,194 @@
+"""
+Verificação do geocodificador em lote contra um servidor HTTP local
+
+Sobe um servidor falso (http.server em 127.0.0.1, porta livre) que responde no formato do OpenCage
+e do Nominatim, aponta o geocodificador_lote para ele e verifica, sem acesso à internet:
+
+- deduplicação: endereços equivalentes (mesma chave canônica) geram uma única requisição;
+- limite de taxa: as requisições de um provedor chegam espaçadas por 1/limite segundos, mesmo
+  com várias threads;
+- novas tentativas: HTTP 429 respeita o Retry-After, 5xx espera e tenta de novo, e ao esgotar as
+  tentativas o endereço é informado como falha (e não como "não encontrado");
+- erros definitivos (401/402) não são repetidos.
+
+Os limites e as tentativas usados são os de config.py; se não estiverem definidos no ambiente,
+este script usa 10 requisições por segundo e 3 tentativas para terminar em poucos segundos.
+
+Uso:
+  python verificar_geocodificador.py
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from functools import partial
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+os.environ.setdefault("OPENCAGE_RPS", "10")
+os.environ.setdefault("NOMINATIM_RPS", "10")
+os.environ.setdefault("GEOCODE_TENTATIVAS", "3")
+
+from config import GEOCODE_LIMITES_POR_SEGUNDO, GEOCODE_TENTATIVAS
+from geocodificador_lote import geocodificar_lote, geocodificar_opencage, geocodificar_nominatim
+
+# Tolerância para a chegada das requisições (agendamento de threads e rede local)
+FOLGA_INTERVALO = 0.8
+RETRY_AFTER = 0.5
+
+
+class ServidorFalso:
+    """
+    Servidor HTTP local que imita OpenCage (/opencage) e Nominatim (/nominatim).
+
+    `roteiro` associa um endereço à lista de respostas (status, cabeçalhos) das requisições
+    sucessivas; a última se repete. Sem roteiro, o endereço é encontrado, exceto os que contêm
+    "inexistente", que recebem uma resposta vazia. Cada requisição é registrada em `requisicoes`
+    como (instante, provedor, endereço).
+    """
+
+    def __init__(self, roteiro=None):
+        self.roteiro = roteiro or {}
+        self.requisicoes = []
+        self._trava = threading.Lock()
+        servidor = self
+
+        class Tratador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                servidor._responder(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._http = ThreadingHTTPServer(("127.0.0.1", 0), Tratador)
+        self._http.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._http.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self._http.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._http.shutdown()
+        self._http.server_close()
+
+    def _responder(self, tratador):
+        url = urlparse(tratador.path)
+        provedor = url.path.strip("/")
+        endereco = parse_qs(url.query).get("q", [""])[0]
+        with self._trava:
+            anteriores = sum(1 for _, p, e in self.requisicoes if p == provedor and e == endereco)
+            self.requisicoes.append((time.monotonic(), provedor, endereco))
+        respostas = self.roteiro.get(endereco)
+        status, cabecalhos = respostas[min(anteriores, len(respostas) - 1)] if respostas else (200, {})
+
+        if status != 200:
+            corpo = {"status": {"code": status}}
+        elif "inexistente" in endereco.lower():
+            corpo = {"results": []} if provedor == "opencage" else []
+        elif provedor == "opencage":
+            corpo = {"results": [{"geometry": {"lat": -23.3, "lng": -47.1}, "confidence": 9}]}
+        else:
+            corpo = [{"lat": "-23.3", "lon": "-47.1", "importance": 0.5}]
+        dados = json.dumps(corpo).encode()
+        tratador.send_response(status)
+        tratador.send_header("Content-Type", "application/json")
+        tratador.send_header("Content-Length", str(len(dados)))
+        for nome, valor in cabecalhos.items():
+            tratador.send_header(nome, valor)
+        tratador.end_headers()
+        tratador.wfile.write(dados)
+
+    def instantes(self, endereco):
+        return [t for t, _, e in self.requisicoes if e == endereco]
+
+
+def verificar_deduplicacao():
+    problemas = []
+    enderecos = ["Rua das Flores, 10, Centro, Itu", "rua das flores 10  centro  ITU", "Rua das Flores, 10, Centro, Itu",
+                 "Avenida Brasil, 200, Vila Nova, Salto", "AVENIDA BRASIL, 200, VILA NOVA, SALTO"]
+    with ServidorFalso() as servidor:
+        consultar = partial(geocodificar_nominatim, url=f"{servidor.url}/nominatim")
+        resultados = geocodificar_lote(enderecos, consultar=consultar)
+    if len(servidor.requisicoes) != 2:
+        problemas.append(f"deduplicação: {len(servidor.requisicoes)} requisições para 2 endereços distintos")
+    faltantes = [e for e in dict.fromkeys(enderecos) if resultados.get(e) is None]
+    if faltantes:
+        problemas.append(f"deduplicação: sem resultado para {faltantes}")
+    return problemas
+
+
+def verificar_limite_taxa():
+    problemas = []
+    por_segundo = GEOCODE_LIMITES_POR_SEGUNDO["opencage"]
+    enderecos = [f"Rua {i}, Centro, Itu" for i in range(8)]
+    with ServidorFalso() as servidor:
+        consultar = partial(geocodificar_opencage, url=f"{servidor.url}/opencage")
+        geocodificar_lote(enderecos, consultar=consultar, max_workers=8)
+    instantes = sorted(t for t, _, _ in servidor.requisicoes)
+    intervalos = [b - a for a, b in zip(instantes, instantes[1:])]
+    minimo = FOLGA_INTERVALO / por_segundo
+    if intervalos and min(intervalos) < minimo:
+        problemas.append(f"limite de taxa: requisições a {min(intervalos):.3f} s umas das outras "
+                         f"(limite de {por_segundo:g}/s)")
+    return problemas
+
+
+def verificar_tentativas():
+    problemas = []
+    roteiro = {
+        "Rua 429, Centro, Itu": [(429, {"Retry-After": str(RETRY_AFTER)}), (200, {})],
+        "Rua 503, Centro, Itu": [(503, {}), (200, {})],
+        "Rua Sempre Fora, Centro, Itu": [(503, {})],
+        "Rua Sem Chave, Centro, Itu": [(401, {})],
+        "Rua Inexistente, Centro, Itu": [(200, {})],
+    }
+    falhas = set()
+    with ServidorFalso(roteiro) as servidor:
+        consultar = partial(geocodificar_opencage, url=f"{servidor.url}/opencage")
+        resultados = geocodificar_lote(list(roteiro), consultar=consultar, falhas=falhas)
+
+    instantes = servidor.instantes("Rua 429, Centro, Itu")
+    if resultados["Rua 429, Centro, Itu"] is None or len(instantes) != 2:
+        problemas.append(f"429: {len(instantes)} requisições, resultado {resultados['Rua 429, Centro, Itu']}")
+    elif instantes[1] - instantes[0] < FOLGA_INTERVALO * RETRY_AFTER:
+        problemas.append(f"429: nova tentativa após {instantes[1] - instantes[0]:.3f} s, "
+                         f"antes do Retry-After de {RETRY_AFTER} s")
+    if resultados["Rua 503, Centro, Itu"] is None or len(servidor.instantes("Rua 503, Centro, Itu")) != 2:
+        problemas.append("503: não resolvido na segunda tentativa")
+    tentativas = len(servidor.instantes("Rua Sempre Fora, Centro, Itu"))
+    if tentativas != GEOCODE_TENTATIVAS:
+        problemas.append(f"503 persistente: {tentativas} requisições, esperadas {GEOCODE_TENTATIVAS}")
+    if len(servidor.instantes("Rua Sem Chave, Centro, Itu")) != 1:
+        problemas.append("401: a requisição foi repetida")
+    esperadas = {"Rua Sempre Fora, Centro, Itu", "Rua Sem Chave, Centro, Itu"}
+    if falhas != esperadas:
+        problemas.append(f"falhas informadas {sorted(falhas)}, esperadas {sorted(esperadas)}")
+    if resultados["Rua Inexistente, Centro, Itu"] is not None:
+        problemas.append("resposta vazia tratada como encontrada")
+    return problemas
+
+
+VERIFICACOES = {
+    "deduplicação": verificar_deduplicacao,
+    "limite de taxa": verificar_limite_taxa,
+    "novas tentativas": verificar_tentativas,
+}
+
+
+def main():
+    problemas = []
+    for nome, verificar in VERIFICACOES.items():
+        inicio = time.perf_counter()
+        encontrados = verificar()
+        print(f"{nome:<18} {'ok' if not encontrados else 'FALHOU':<7} {time.perf_counter() - inicio:6.2f} s", flush=True)
+        problemas.extend(encontrados)
+    for problema in problemas:
+        print(f"FALHA {problema}")
+    return 1 if problemas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())